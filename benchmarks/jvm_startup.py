@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Compare the startup time of the JVM based formatters with and without the
+Class Data Sharing archives (and startup profile) used by the hooks.
+
+Usage: python benchmarks/jvm_startup.py [--repetitions N]
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import os
+import statistics
+import subprocess  # nosec: disable=B404
+import sys
+import time
+import typing
+
+from language_formatters_pre_commit_hooks import _get_default_version
+from language_formatters_pre_commit_hooks import pretty_format_java
+from language_formatters_pre_commit_hooks import pretty_format_kotlin
+from language_formatters_pre_commit_hooks.jvm import class_data_sharing_archive
+from language_formatters_pre_commit_hooks.jvm import jvm_arguments
+
+
+TEST_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test-data")
+
+
+def _tools() -> typing.List[typing.Tuple[str, str, typing.List[str]]]:
+    google_java_formatter_jar = getattr(pretty_format_java, "__download_google_java_formatter_jar")(
+        _get_default_version("google_java_formatter"),
+    )
+    ktlint_jar = getattr(pretty_format_kotlin, "__download_kotlin_formatter_jar")(_get_default_version("ktlint"))
+    return [
+        (
+            "google-java-format",
+            google_java_formatter_jar,
+            ["--dry-run", os.path.join(TEST_DATA, "pretty_format_java", "pretty-formatted.java")],
+        ),
+        (
+            "ktlint",
+            ktlint_jar,
+            ["--relative", "--", os.path.join(TEST_DATA, "pretty_format_kotlin", "pretty-formatted.kt")],
+        ),
+    ]
+
+
+def _time_command(command: typing.List[str]) -> float:
+    start = time.perf_counter()
+    subprocess.call(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)  # nosec: disable=B603
+    return time.perf_counter() - start
+
+
+def _run_scenario(jar: str, tool_args: typing.List[str], repetitions: int, cds: bool, startup_profile: bool) -> typing.List[float]:
+    timings = []
+    for _ in range(repetitions):
+        if cds:
+            with jvm_arguments(jar, startup_profile=startup_profile) as jvm_args:
+                timings.append(_time_command(["java", *jvm_args, "-jar", jar, *tool_args]))
+        else:
+            timings.append(_time_command(["java", "-XX:+IgnoreUnrecognizedVMOptions", "-Xlog:disable", "-jar", jar, *tool_args]))
+    return timings
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repetitions", type=int, default=5, help="Number of measured runs per scenario (default %(default)s)")
+    args = parser.parse_args(argv)
+
+    print("{:<20} {:<22} {:>10} {:>10} {:>10}".format("tool", "scenario", "median[s]", "min[s]", "max[s]"))
+    for tool_name, jar, tool_args in _tools():
+        archive = class_data_sharing_archive(jar)
+        if archive is not None and os.path.exists(archive):
+            os.remove(archive)
+
+        # Generates the archive, its cost is paid only once per jar and JVM
+        archive_creation = _run_scenario(jar, tool_args, repetitions=1, cds=True, startup_profile=False)[0]
+
+        scenarios = [
+            ("cold", False, False),
+            ("cds", True, False),
+            ("cds+startup-profile", True, True),
+        ]
+        for scenario_name, cds, startup_profile in scenarios:
+            timings = _run_scenario(jar, tool_args, repetitions=args.repetitions, cds=cds, startup_profile=startup_profile)
+            print(
+                "{:<20} {:<22} {:>10.3f} {:>10.3f} {:>10.3f}".format(
+                    tool_name,
+                    scenario_name,
+                    statistics.median(timings),
+                    min(timings),
+                    max(timings),
+                ),
+            )
+        print("{:<20} {:<22} {:>10.3f}".format(tool_name, "cds archive creation", archive_creation))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
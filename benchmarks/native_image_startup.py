@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Compare the duration of `pretty-format-java` and `pretty-format-kotlin` running the
+formatters via `java -jar` and via their native images (`--native-image`).
+
+With `--stubs` the real toolchains are not needed: a stub `java` executable sleeping for
+`--jvm-startup` seconds and stub native images sleeping for `--native-startup` seconds are
+used, so the benchmark measures the hooks orchestration of the two paths.
+Otherwise the real `java` on PATH is used and the native images are downloaded (ktlint does
+not publish native images, so its native path is measured only if `--ktlint-native-image-url`
+is provided).
+
+Usage: python benchmarks/native_image_startup.py [--stubs] [--repetitions N] [--google-java-formatter-version VERSION]
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import contextlib
+import io
+import os
+import stat
+import statistics
+import sys
+import tempfile
+import time
+import typing
+
+from language_formatters_pre_commit_hooks import _get_default_version
+from language_formatters_pre_commit_hooks.native_image import native_image_platform
+from language_formatters_pre_commit_hooks.pretty_format_java import pretty_format_java
+from language_formatters_pre_commit_hooks.pretty_format_kotlin import pretty_format_kotlin
+
+
+TEST_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test-data")
+
+_STUB_TOOL = """#!/bin/sh
+sleep {startup}
+"""
+
+
+class _Scenario(typing.NamedTuple):
+    hook_name: str
+    function: typing.Callable[[typing.List[str]], int]
+    arguments: typing.List[str]
+
+
+def _install_stub(path: str, startup: float) -> None:
+    with open(path, "w") as f:
+        f.write(_STUB_TOOL.format(startup=startup))
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+
+def _install_stubs(temporary_directory: str, google_java_formatter_version: str, jvm_startup: float, native_startup: float) -> None:
+    """Put the stub java on PATH and the stub jars and native images in a temporary PRE_COMMIT_HOME, so nothing is downloaded."""
+    stub_directory = os.path.join(temporary_directory, "bin")
+    pre_commit_home = os.path.join(temporary_directory, "pre-commit-home")
+    for directory in (stub_directory, pre_commit_home):
+        os.mkdir(directory)
+
+    _install_stub(os.path.join(stub_directory, "java"), jvm_startup)
+    for tool_name, version in (("google-java-formatter", google_java_formatter_version), ("ktlint", _get_default_version("ktlint"))):
+        open(os.path.join(pre_commit_home, "{}{}.jar".format(tool_name, version)), "w").close()
+        _install_stub(os.path.join(pre_commit_home, "{}{}-{}".format(tool_name, version, native_image_platform())), native_startup)
+
+    os.environ.update(
+        {
+            "PATH": os.pathsep.join((stub_directory, os.environ.get("PATH", ""))),
+            "PRE_COMMIT_HOME": pre_commit_home,
+        },
+    )
+
+
+def _time_hook(scenario: _Scenario, repetitions: int) -> typing.List[float]:
+    timings = []
+    for _ in range(repetitions):
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            start = time.perf_counter()
+            scenario.function(scenario.arguments)
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stubs", action="store_true", help="Use stub java and native images instead of the real formatters")
+    parser.add_argument("--jvm-startup", type=float, default=1.0, help="Seconds slept by the stub java (default %(default)s)")
+    parser.add_argument("--native-startup", type=float, default=0.02, help="Seconds slept by the stub native images (default %(default)s)")
+    parser.add_argument("--repetitions", type=int, default=5, help="Number of measured runs per scenario (default %(default)s)")
+    parser.add_argument(
+        "--google-java-formatter-version",
+        # Native images are published since google-java-format 1.15.0
+        default="1.15.0",
+        help="google-java-format version to use (default %(default)s)",
+    )
+    parser.add_argument("--ktlint-native-image-url", help="URL template of the ktlint native images (see --native-image-url)")
+    args = parser.parse_args(argv)
+
+    if native_image_platform() is None:
+        print("No native image is available for the running platform", file=sys.stderr)
+        return 1
+    if args.stubs and sys.platform == "win32":  # pragma: no cover
+        print("The stub tools are shell scripts, Windows is not supported", file=sys.stderr)
+        return 1
+
+    java_file = os.path.join(TEST_DATA, "pretty_format_java", "pretty-formatted.java")
+    kotlin_file = os.path.join(TEST_DATA, "pretty_format_kotlin", "pretty-formatted.kt")
+    java_arguments = ["--google-java-formatter-version", args.google_java_formatter_version, java_file]
+    scenarios = [
+        ("jar", _Scenario("pretty-format-java", pretty_format_java, java_arguments)),
+        ("native-image", _Scenario("pretty-format-java", pretty_format_java, ["--native-image", *java_arguments])),
+        ("jar", _Scenario("pretty-format-kotlin", pretty_format_kotlin, [kotlin_file])),
+    ]
+    ktlint_native_image_url = "unused://{version}/{platform}" if args.stubs else args.ktlint_native_image_url
+    if ktlint_native_image_url:
+        scenarios.append(
+            (
+                "native-image",
+                _Scenario(
+                    "pretty-format-kotlin",
+                    pretty_format_kotlin,
+                    ["--native-image", "--native-image-url", ktlint_native_image_url, kotlin_file],
+                ),
+            ),
+        )
+
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        if args.stubs:
+            _install_stubs(temporary_directory, args.google_java_formatter_version, args.jvm_startup, args.native_startup)
+
+        print("{:<22} {:<14} {:>10} {:>10} {:>10}".format("hook", "path", "median[s]", "min[s]", "max[s]"))
+        for path_name, scenario in scenarios:
+            # The first run downloads the formatter, if needed, and creates the AppCDS archive of the jar
+            _time_hook(scenario, repetitions=1)
+            timings = _time_hook(scenario, args.repetitions)
+            print(
+                "{:<22} {:<14} {:>10.3f} {:>10.3f} {:>10.3f}".format(
+                    scenario.hook_name,
+                    path_name,
+                    statistics.median(timings),
+                    min(timings),
+                    max(timings),
+                ),
+            )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
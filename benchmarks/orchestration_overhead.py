@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Measure the time spent by the hooks around the external tools (precondition checks,
+downloads, command line building, output decoding and parsing) and how it scales with
+the number of files.
+
+The real toolchains are not needed: stub `go`, `gofmt`, `java` and `cargo` executables,
+sleeping for `--latency` seconds and printing `--output-lines` lines, are put on PATH.
+The overhead of a run is its duration minus the time spent sleeping by the stubs.
+
+Usage: python benchmarks/orchestration_overhead.py [--file-counts 1,10,100,1000] [--latency SECONDS] [--output-lines N]
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import stat
+import statistics
+import sys
+import tempfile
+import time
+import typing
+
+from language_formatters_pre_commit_hooks import _get_default_version
+from language_formatters_pre_commit_hooks.pretty_format_golang import pretty_format_golang
+from language_formatters_pre_commit_hooks.pretty_format_java import pretty_format_java
+from language_formatters_pre_commit_hooks.pretty_format_kotlin import pretty_format_kotlin
+from language_formatters_pre_commit_hooks.pretty_format_rust import pretty_format_rust
+
+
+TEST_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test-data")
+
+# Stubs are shell scripts, so their own startup cost is negligible compared to the hooks one
+_STUB_TOOL = """#!/bin/sh
+echo "$0" >> "$STUB_TOOL_LOG"
+sleep "$STUB_TOOL_LATENCY"
+if [ "$STUB_TOOL_OUTPUT_LINES" -gt 0 ]; then
+    yes "stub output line emulating the report of an external formatting tool" | head -n "$STUB_TOOL_OUTPUT_LINES"
+fi
+"""
+_STUB_TOOL_NAMES = ("go", "gofmt", "java", "cargo")
+
+
+class _Hook(typing.NamedTuple):
+    name: str
+    function: typing.Callable[[typing.List[str]], int]
+    sample_file: str
+
+
+_HOOKS = (
+    _Hook("pretty-format-golang", pretty_format_golang, os.path.join(TEST_DATA, "pretty_format_golang", "pretty-formatted.go")),
+    _Hook("pretty-format-java", pretty_format_java, os.path.join(TEST_DATA, "pretty_format_java", "pretty-formatted.java")),
+    _Hook("pretty-format-kotlin", pretty_format_kotlin, os.path.join(TEST_DATA, "pretty_format_kotlin", "pretty-formatted.kt")),
+    _Hook("pretty-format-rust", pretty_format_rust, os.path.join(TEST_DATA, "pretty_format_rust", "pretty-formatted", "src", "main.rs")),
+)
+
+
+def _install_stub_tools(directory: str) -> None:
+    for tool_name in _STUB_TOOL_NAMES:
+        path = os.path.join(directory, tool_name)
+        with open(path, "w") as f:
+            f.write(_STUB_TOOL)
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+
+def _install_fake_jars(pre_commit_home: str) -> None:
+    """Create the jars looked up by the JVM based hooks, so nothing is downloaded (the stub java never reads them)."""
+    for file_name in (
+        "google-java-formatter{version}.jar".format(version=_get_default_version("google_java_formatter")),
+        "ktlint{version}.jar".format(version=_get_default_version("ktlint")),
+    ):
+        open(os.path.join(pre_commit_home, file_name), "w").close()
+
+
+def _create_files(directory: str, sample_file: str, count: int) -> typing.List[str]:
+    extension = os.path.splitext(sample_file)[1]
+    filenames = []
+    for index in range(count):
+        filename = os.path.join(directory, "file{index}{extension}".format(index=index, extension=extension))
+        shutil.copyfile(sample_file, filename)
+        filenames.append(filename)
+    return filenames
+
+
+def _run_hook(hook: _Hook, arguments: typing.List[str], log_path: str) -> typing.Tuple[float, int]:
+    """Run `hook` and return its duration and the number of stub tool invocations."""
+    open(log_path, "w").close()
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        start = time.perf_counter()
+        hook.function(arguments)
+        duration = time.perf_counter() - start
+    with open(log_path) as f:
+        return duration, len(f.readlines())
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--file-counts",
+        type=lambda value: [int(count) for count in value.split(",")],
+        default=[1, 10, 100, 1000],
+        help="Comma separated numbers of files to pass to each hook (default 1,10,100,1000)",
+    )
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds slept by each stub tool invocation (default %(default)s)")
+    parser.add_argument("--output-lines", type=int, default=0, help="Lines printed by each stub tool invocation (default %(default)s)")
+    parser.add_argument("--repetitions", type=int, default=3, help="Number of measured runs per scenario (default %(default)s)")
+    parser.add_argument("--jobs", type=int, default=1, help="Value of --jobs passed to the hooks (default %(default)s)")
+    args = parser.parse_args(argv)
+
+    if sys.platform == "win32":  # pragma: no cover
+        print("The stub tools are shell scripts, Windows is not supported", file=sys.stderr)
+        return 1
+
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        stub_directory = os.path.join(temporary_directory, "bin")
+        pre_commit_home = os.path.join(temporary_directory, "pre-commit-home")
+        for directory in (stub_directory, pre_commit_home):
+            os.mkdir(directory)
+        _install_stub_tools(stub_directory)
+        _install_fake_jars(pre_commit_home)
+
+        log_path = os.path.join(temporary_directory, "invocations.log")
+        os.environ.update(
+            {
+                "PATH": os.pathsep.join((stub_directory, os.environ.get("PATH", ""))),
+                "PRE_COMMIT_HOME": pre_commit_home,
+                "STUB_TOOL_LOG": log_path,
+                "STUB_TOOL_LATENCY": str(args.latency),
+                "STUB_TOOL_OUTPUT_LINES": str(args.output_lines),
+            },
+        )
+
+        print(
+            "{:<22} {:>7} {:>12} {:>10} {:>12} {:>18}".format(
+                "hook",
+                "files",
+                "invocations",
+                "median[s]",
+                "overhead[s]",
+                "overhead/file[ms]",
+            ),
+        )
+        for hook in _HOOKS:
+            for file_count in args.file_counts:
+                files_directory = os.path.join(temporary_directory, "{}-{}".format(hook.name, file_count))
+                os.mkdir(files_directory)
+                filenames = _create_files(files_directory, hook.sample_file, file_count)
+
+                runs = [_run_hook(hook, ["--jobs", str(args.jobs), *filenames], log_path) for _ in range(args.repetitions)]
+                duration = statistics.median(run_duration for run_duration, _ in runs)
+                invocations = runs[-1][1]
+                # Stub invocations run serially unless --jobs is used
+                overhead = max(duration - invocations * args.latency / min(args.jobs, invocations or 1), 0.0)
+                print(
+                    "{:<22} {:>7} {:>12} {:>10.3f} {:>12.3f} {:>18.3f}".format(
+                        hook.name,
+                        file_count,
+                        invocations,
+                        duration,
+                        overhead,
+                        overhead / file_count * 1000,
+                    ),
+                )
+                shutil.rmtree(files_directory)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -26,3 +26,14 @@ def _get_default_version(tool_name: str) -> str:  # pragma: no cover
             return f.readline().split()[0]
     except:  # noqa: E722 (allow usage of bare 'except')
         raise RuntimeError("No default version found for {tool_name}".format(tool_name=tool_name))
+
+
+def _get_library_version(distribution_name: str) -> typing.Optional[str]:
+    """
+    Read the installed version of a python library (ie. the library used to format the files).
+    The method will return None in case the library is not installed as a distribution.
+    """
+    try:
+        return typing.cast(str, pkg_resources.get_distribution(distribution_name).version)
+    except pkg_resources.DistributionNotFound:  # pragma: no cover
+        return None
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import os
+import typing
+
+from language_formatters_pre_commit_hooks.failure_limit import FailureLimit
+from language_formatters_pre_commit_hooks.file_selection import drop_skipped_files
+from language_formatters_pre_commit_hooks.file_selection import expand_file_lists
+from language_formatters_pre_commit_hooks.file_selection import parse_shard
+from language_formatters_pre_commit_hooks.file_selection import parse_size
+from language_formatters_pre_commit_hooks.file_selection import prioritize_recently_changed
+from language_formatters_pre_commit_hooks.file_selection import select_shard
+from language_formatters_pre_commit_hooks.file_selection import Shard
+from language_formatters_pre_commit_hooks.file_tree import tree_files
+from language_formatters_pre_commit_hooks.formatting import DEFAULT_IO_MEMORY_BUDGET
+from language_formatters_pre_commit_hooks.formatting import IO_THREADS_ENVIRONMENT_VARIABLE
+from language_formatters_pre_commit_hooks.git_utils import file_attributes
+from language_formatters_pre_commit_hooks.result_cache import RESULT_CACHE_ENVIRONMENT_VARIABLE
+from language_formatters_pre_commit_hooks.time_budget import TIME_BUDGET_EXHAUSTED_EXIT_CODE
+from language_formatters_pre_commit_hooks.time_budget import TimeBudget
+from language_formatters_pre_commit_hooks.utils import COMMAND_TIMEOUT_EXIT_CODE
+from language_formatters_pre_commit_hooks.utils import MAX_CONCURRENT_TOOLS_ENVIRONMENT_VARIABLE
+
+
+# Git attributes honored by the hooks: files with `-format` are skipped, `eol` selects the new line written by the fixes
+GIT_ATTRIBUTES = ("format", "eol")
+
+
+def _shard_type(value: str) -> Shard:
+    try:
+        return parse_shard(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def _size_type(value: str) -> int:
+    try:
+        return parse_size(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def positive_int_type(value: str) -> int:
+    """Argument type of the options expecting a positive number (ie. concurrency levels)."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("expected a positive number, received {}".format(value))
+    return number
+
+
+def add_common_arguments(parser: argparse.ArgumentParser, file_extensions: typing.Tuple[str, ...] = ()) -> None:
+    """
+    Register the command line arguments supported by all the hooks.
+    `file_extensions` are the extensions of the files processed by the hook, which enable `--tree`.
+    """
+    if file_extensions:
+        parser.set_defaults(tree_file_extensions=file_extensions)
+        parser.add_argument(
+            "--tree",
+            action="append",
+            metavar="PATH",
+            help="Process all the {} files within PATH (can be repeated). Files are listed via `git ls-files` within git repositories "
+            "and by walking PATH, skipping the files ignored by .gitignore, otherwise".format("/".join(file_extensions)),
+        )
+    parser.add_argument(
+        "--record-run-history",
+        action="store_true",
+        dest="record_run_history",
+        help="Record the performance metrics of the run into a local database (inspect them via pretty-format-stats)",
+    )
+    parser.add_argument(
+        "--memory-report",
+        dest="memory_report",
+        metavar="PATH",
+        help="Profile the memory usage (per file, per phase and of the external tools) and write the report, as JSON, into PATH",
+    )
+    parser.add_argument(
+        "--shard",
+        type=_shard_type,
+        metavar="INDEX/COUNT",
+        help="Process only the files belonging to the INDEX-th (1-based) of COUNT deterministic partitions of the filenames",
+    )
+    parser.add_argument(
+        "--shard-balance-by-size",
+        action="store_true",
+        dest="shard_balance_by_size",
+        help="Partition the filenames such that all the shards have a similar amount of bytes to process. "
+        "NOTE: all the shards should receive the same filenames",
+    )
+    parser.add_argument(
+        "--max-file-size",
+        type=_size_type,
+        dest="max_file_size",
+        metavar="SIZE",
+        help="Skip files bigger than SIZE bytes (K, M and G suffixes are supported, ie. 512K)",
+    )
+    parser.add_argument(
+        "--skip-generated",
+        action="store_true",
+        dest="skip_generated",
+        help="Skip lockfiles and generated files (ie. files containing `Code generated ... DO NOT EDIT.` or `@generated` in their first KBs)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=positive_int_type,
+        default=1,
+        metavar="N",
+        help="Format up to N files in parallel, or run up to N concurrent invocations of the external tool (default: %(default)s). "
+        "Work is scheduled longest-expected-first, estimating the cost of each file from its size and from the timings "
+        "recorded by earlier runs (see --record-run-history)",
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        dest="time_budget_seconds",
+        metavar="SECONDS",
+        help="Stop checking files once SECONDS are elapsed. Files changed relatively to HEAD, and most recently modified ones, "
+        "are checked first. If not all the files are checked the hook exits with status {}".format(TIME_BUDGET_EXHAUSTED_EXIT_CODE),
+    )
+    parser.add_argument(
+        "--fail-fast",
+        action="store_const",
+        const=1,
+        dest="max_failures",
+        help="Stop at the first not pretty-formatted, or not valid, file (same as --max-failures 1). It can not be combined with --autofix",
+    )
+    parser.add_argument(
+        "--max-failures",
+        type=positive_int_type,
+        dest="max_failures",
+        metavar="N",
+        help="Stop once N not pretty-formatted, or not valid, files are found: in-process workers and running tool invocations "
+        "are cancelled. It can not be combined with --autofix",
+    )
+
+
+def add_tool_invocation_arguments(parser: argparse.ArgumentParser) -> None:
+    """Register the command line arguments needed by the hooks running external tools (ie. gofmt)."""
+    parser.add_argument(
+        "--tool-timeout",
+        type=float,
+        dest="tool_timeout",
+        metavar="SECONDS",
+        help="Kill the tool invocations running for more than SECONDS (reported with exit status {})".format(COMMAND_TIMEOUT_EXIT_CODE),
+    )
+    parser.add_argument(
+        "--max-files-per-invocation",
+        type=positive_int_type,
+        dest="max_files_per_invocation",
+        metavar="N",
+        help="Pass at most N files to each tool invocation",
+    )
+    parser.add_argument(
+        "--max-bytes-per-invocation",
+        type=_size_type,
+        dest="max_bytes_per_invocation",
+        metavar="SIZE",
+        help="Pass at most SIZE bytes of files to each tool invocation (K, M and G suffixes are supported, ie. 4M)",
+    )
+
+
+def add_max_concurrent_tools_argument(parser: argparse.ArgumentParser) -> None:
+    """Register the command line arguments needed by the hooks running heavyweight tools (ie. JVMs and cargo)."""
+    parser.add_argument(
+        "--max-concurrent-tools",
+        type=positive_int_type,
+        dest="max_concurrent_tools",
+        default=os.environ.get(MAX_CONCURRENT_TOOLS_ENVIRONMENT_VARIABLE),
+        metavar="N",
+        help="Run at most N heavyweight tools (JVMs and cargo) at the same time on the machine, across all the hook processes "
+        "(default: ${} environment variable, or no limit)".format(MAX_CONCURRENT_TOOLS_ENVIRONMENT_VARIABLE),
+    )
+
+
+def add_native_image_arguments(parser: argparse.ArgumentParser, default_url_template: typing.Optional[str] = None) -> None:
+    """Register the command line arguments needed by the hooks able to run a native image of their JVM based formatter."""
+    parser.add_argument(
+        "--native-image",
+        action="store_true",
+        dest="native_image",
+        help="Run the native executable of the formatter, which skips the JVM startup, if it exists for the requested version "
+        "and platform (the jar, run via java, is used otherwise)",
+    )
+    parser.add_argument(
+        "--native-image-url",
+        dest="native_image_url",
+        default=default_url_template,
+        metavar="URL_TEMPLATE",
+        help="URL of the native executables, where {{version}} and {{platform}} (ie. linux-x86-64) are replaced{}".format(
+            " (default %(default)s)" if default_url_template else "",
+        ),
+    )
+
+
+def add_changed_lines_only_argument(parser: argparse.ArgumentParser) -> None:
+    """Register the command line arguments needed by the hooks able to format only some line ranges."""
+    parser.add_argument(
+        "--changed-lines-only",
+        action="store_true",
+        dest="changed_lines_only",
+        help="Format and check only the lines changed in the git index (staged) relatively to HEAD",
+    )
+
+
+def add_diff_argument(parser: argparse.ArgumentParser) -> None:
+    """Register the command line arguments needed by the hooks able to report the formatting differences."""
+    parser.add_argument(
+        "--diff",
+        action="store_true",
+        dest="diff",
+        help="Print the unified diff between the original and the pretty-formatted content of the not-pretty-formatted files",
+    )
+
+
+def add_from_index_argument(parser: argparse.ArgumentParser) -> None:
+    """Register the command line arguments needed by the hooks able to check the content staged in the git index."""
+    parser.add_argument(
+        "--from-index",
+        action="store_true",
+        dest="from_index",
+        help="Check the content of the files staged in the git index instead of the working tree content (not compatible with --autofix)",
+    )
+
+
+def add_result_cache_argument(parser: argparse.ArgumentParser) -> None:
+    """Register the command line arguments needed by the hooks supporting the result cache."""
+    parser.add_argument(
+        "--result-cache",
+        dest="result_cache",
+        default=os.environ.get(RESULT_CACHE_ENVIRONMENT_VARIABLE),
+        metavar="URL_OR_PATH",
+        help="Cache of the formatting results, shareable across machines. It could be a directory (ie. on NFS) "
+        "or an HTTP store supporting GET/PUT requests (default: ${} environment variable)".format(RESULT_CACHE_ENVIRONMENT_VARIABLE),
+    )
+
+
+def add_io_threads_arguments(parser: argparse.ArgumentParser) -> None:
+    """Register the command line arguments needed by the hooks able to read and write the files in background threads."""
+    parser.add_argument(
+        "--io-threads",
+        type=positive_int_type,
+        dest="io_threads",
+        default=os.environ.get(IO_THREADS_ENVIRONMENT_VARIABLE),
+        metavar="N",
+        help="Read the following files, and write the fixed ones, via N background threads while formatting, "
+        "which hides the latency of network file systems (default: ${} environment variable, or no background I/O)".format(
+            IO_THREADS_ENVIRONMENT_VARIABLE,
+        ),
+    )
+    parser.add_argument(
+        "--io-memory-budget",
+        type=_size_type,
+        dest="io_memory_budget",
+        default=DEFAULT_IO_MEMORY_BUDGET,
+        metavar="SIZE",
+        help="Stop reading ahead while SIZE bytes of content are waiting to be formatted or written "
+        "(K, M and G suffixes are supported, default 64M)",
+    )
+
+
+def parse_arguments(parser: argparse.ArgumentParser, argv: typing.Optional[typing.List[str]]) -> argparse.Namespace:
+    """
+    Parse the command line arguments and select the files that the hook should process.
+    `@path` and `@-` filenames are expanded to the NUL-separated (or line-separated) list of files in `path` or in the standard input.
+    The files within the `--tree` paths are added to the received ones.
+    `filenames` is replaced by the selected files while the received ones are available in `input_filenames`.
+    The time budget of the run is available in `time_budget`, and the limit of the failures to report in `failure_limit`.
+    The git attributes of the selected files (see `GIT_ATTRIBUTES`) are available in `git_attributes` (filename -> attribute -> value),
+    files with the `format` attribute unset are not selected.
+    """
+    args = parser.parse_args(argv)
+    if getattr(args, "from_index", False) and args.autofix:
+        parser.error("--from-index and --autofix are mutually exclusive, as fixes would overwrite not staged changes")
+    if args.max_failures is not None and getattr(args, "autofix", False):
+        parser.error("--fail-fast and --max-failures can not be combined with --autofix, as files would be left partially fixed")
+    args.time_budget = TimeBudget(args.time_budget_seconds)
+    args.failure_limit = FailureLimit(args.max_failures)
+
+    try:
+        args.filenames = expand_file_lists(args.filenames)
+    except OSError as e:
+        parser.error("Unable to read the list of files: {}".format(e))
+    for tree in getattr(args, "tree", None) or ():
+        if not os.path.isdir(tree):
+            parser.error("--tree {} is not a directory".format(tree))
+        args.filenames.extend(tree_files(tree, args.tree_file_extensions))
+    args.input_filenames = args.filenames
+    if args.shard is not None:
+        args.filenames = select_shard(args.filenames, args.shard, balance_by_size=args.shard_balance_by_size)
+    args.git_attributes = file_attributes(args.filenames, GIT_ATTRIBUTES, cached=getattr(args, "from_index", False))
+    unformatted_files = {filename for filename in args.filenames if args.git_attributes.get(filename, {}).get("format") == "unset"}
+    if unformatted_files:
+        for filename in dict.fromkeys(args.filenames):
+            if filename in unformatted_files:
+                print("Skipping {filename}: format git attribute is unset".format(filename=filename))
+        args.filenames = [filename for filename in args.filenames if filename not in unformatted_files]
+    if args.max_file_size is not None or args.skip_generated:
+        args.filenames, skipped_files = drop_skipped_files(args.filenames, args.max_file_size, args.skip_generated)
+        for filename, reason in skipped_files.items():
+            print("Skipping {filename}: {reason}".format(filename=filename, reason=reason))
+    if args.time_budget_seconds is not None:
+        args.filenames = prioritize_recently_changed(args.filenames)
+
+    return args
+
+
+def has_no_selected_files(args: argparse.Namespace) -> bool:
+    """
+    Check if all the received files have been filtered out.
+    External tools should not be invoked in this case as, without files, they would process the whole project.
+    """
+    return bool(args.input_filenames) and not args.filenames
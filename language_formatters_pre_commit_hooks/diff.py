@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import bisect
+import collections
+import typing
+
+
+# Maximum number of lines printed for a single file diff
+DIFF_MAX_LINES = 1000
+# Upper bound of the work (compared lines) performed by the Myers algorithm on a single region.
+# Regions that would require more work are reported as fully replaced, the diff is still correct but not minimal.
+_MYERS_MAX_COST = 1000000
+_MYERS_MIN_EDIT_DISTANCE = 64
+
+
+class _MatchingBlock(typing.NamedTuple):
+    a_start: int
+    b_start: int
+    size: int
+
+
+def _split_lines(content: str) -> typing.List[str]:
+    lines = [line + "\n" for line in content.split("\n")]
+    lines[-1] = lines[-1][:-1]
+    if not lines[-1]:
+        lines.pop()
+    return lines
+
+
+def _unique_anchors(a: typing.List[int], a_lo: int, a_hi: int, b: typing.List[int], b_lo: int, b_hi: int) -> typing.List[_MatchingBlock]:
+    """
+    Longest increasing sequence of the lines that are unique in both regions (patience diff).
+    Consecutive unique lines are merged into a single block, so unchanged regions cost one anchor.
+    """
+    a_counts = collections.Counter(a[a_lo:a_hi])
+    b_counts = collections.Counter(b[b_lo:b_hi])
+    b_positions = {b[j]: j for j in range(b_lo, b_hi) if b_counts[b[j]] == 1}
+
+    candidates: typing.List[typing.List[int]] = []  # [a_start, b_start, size]
+    for i in range(a_lo, a_hi):
+        j = b_positions.get(a[i], -1) if a_counts[a[i]] == 1 else -1
+        if j == -1:
+            continue
+        if candidates and candidates[-1][0] + candidates[-1][2] == i and candidates[-1][1] + candidates[-1][2] == j:
+            candidates[-1][2] += 1
+        else:
+            candidates.append([i, j, 1])
+
+    # Patience sorting: tails[k] is the smallest b position ending an increasing sequence of length k + 1
+    tails: typing.List[int] = []
+    tail_indexes: typing.List[int] = []
+    predecessors: typing.List[int] = []
+    for candidate_index, (_, j, _) in enumerate(candidates):
+        k = bisect.bisect_left(tails, j)
+        if k == len(tails):
+            tails.append(j)
+            tail_indexes.append(candidate_index)
+        else:
+            tails[k] = j
+            tail_indexes[k] = candidate_index
+        predecessors.append(tail_indexes[k - 1] if k > 0 else -1)
+
+    anchors = []
+    candidate_index = tail_indexes[-1] if tail_indexes else -1
+    while candidate_index != -1:
+        anchors.append(_MatchingBlock(*candidates[candidate_index]))
+        candidate_index = predecessors[candidate_index]
+    return anchors[::-1]
+
+
+def _myers(
+    a: typing.List[int], a_lo: int, a_hi: int, b: typing.List[int], b_lo: int, b_hi: int
+) -> typing.Optional[typing.List[_MatchingBlock]]:
+    """
+    Myers' O((N+M)D) shortest edit script, returning None if the edit distance exceeds the work budget.
+    """
+    n, m = a_hi - a_lo, b_hi - b_lo
+    max_distance = min(n + m, max(_MYERS_MIN_EDIT_DISTANCE, _MYERS_MAX_COST // (n + m)))
+    offset = max_distance + 1
+    furthest = [0] * (2 * max_distance + 3)
+    trace = []
+
+    for distance in range(max_distance + 1):
+        # Only the diagonals reachable within `distance` edits are needed to backtrack
+        trace.append(furthest[offset - distance - 1 : offset + distance + 2])
+        for k in range(-distance, distance + 1, 2):
+            if k == -distance or (k != distance and furthest[offset + k - 1] < furthest[offset + k + 1]):
+                x = furthest[offset + k + 1]
+            else:
+                x = furthest[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[a_lo + x] == b[b_lo + y]:
+                x += 1
+                y += 1
+            furthest[offset + k] = x
+            if x >= n and y >= m:
+                return _myers_backtrack(trace, n, m, a_lo, b_lo)
+
+    return None
+
+
+def _myers_backtrack(trace: typing.List[typing.List[int]], n: int, m: int, a_lo: int, b_lo: int) -> typing.List[_MatchingBlock]:
+    blocks = []
+    x, y = n, m
+    for distance in range(len(trace) - 1, -1, -1):
+        furthest = trace[distance]
+        offset = distance + 1
+        k = x - y
+        if distance == 0:
+            previous_x = previous_y = 0
+            start_x = start_y = 0
+        else:
+            if k == -distance or (k != distance and furthest[offset + k - 1] < furthest[offset + k + 1]):
+                previous_k = k + 1
+            else:
+                previous_k = k - 1
+            previous_x = furthest[offset + previous_k]
+            previous_y = previous_x - previous_k
+            start_x, start_y = (previous_x, previous_y + 1) if previous_k == k + 1 else (previous_x + 1, previous_y)
+        if x > start_x:
+            blocks.append(_MatchingBlock(a_lo + start_x, b_lo + start_y, x - start_x))
+        x, y = previous_x, previous_y
+    return blocks[::-1]
+
+
+def matching_blocks(a: typing.List[int], b: typing.List[int]) -> typing.List[_MatchingBlock]:
+    """
+    Compute the blocks of lines that `a` and `b` have in common (sorted by position).
+
+    Common prefixes and suffixes are trimmed first, then the regions are split by the lines that
+    are unique in both sides (patience diff) and the remaining regions are compared via Myers'
+    algorithm, whose work is bounded. As a result the running time stays close to linear even for
+    huge inputs, while the diff of small, localized changes is minimal.
+    """
+    blocks = []
+    regions = [(0, len(a), 0, len(b))]
+    while regions:
+        a_lo, a_hi, b_lo, b_hi = regions.pop()
+
+        prefix = 0
+        while a_lo + prefix < a_hi and b_lo + prefix < b_hi and a[a_lo + prefix] == b[b_lo + prefix]:
+            prefix += 1
+        if prefix:
+            blocks.append(_MatchingBlock(a_lo, b_lo, prefix))
+            a_lo, b_lo = a_lo + prefix, b_lo + prefix
+
+        suffix = 0
+        while a_hi - suffix > a_lo and b_hi - suffix > b_lo and a[a_hi - suffix - 1] == b[b_hi - suffix - 1]:
+            suffix += 1
+        if suffix:
+            blocks.append(_MatchingBlock(a_hi - suffix, b_hi - suffix, suffix))
+            a_hi, b_hi = a_hi - suffix, b_hi - suffix
+
+        if a_lo == a_hi or b_lo == b_hi:
+            continue
+
+        anchors = _unique_anchors(a, a_lo, a_hi, b, b_lo, b_hi)
+        if anchors:
+            blocks.extend(anchors)
+            for anchor in anchors:
+                regions.append((a_lo, anchor.a_start, b_lo, anchor.b_start))
+                a_lo, b_lo = anchor.a_start + anchor.size, anchor.b_start + anchor.size
+            regions.append((a_lo, a_hi, b_lo, b_hi))
+        else:
+            blocks.extend(_myers(a, a_lo, a_hi, b, b_lo, b_hi) or ())
+
+    return sorted(blocks)
+
+
+def _format_range(start: int, stop: int) -> str:
+    length = stop - start
+    if length == 1:
+        return str(start + 1)
+    return "{},{}".format(start + 1 if length else start, length)
+
+
+def _diff_lines(prefix: str, lines: typing.List[str]) -> typing.Iterator[str]:
+    for line in lines:
+        if line.endswith("\n"):
+            yield prefix + line
+        else:
+            yield prefix + line + "\n"
+            yield "\\ No newline at end of file\n"
+
+
+def unified_diff(
+    original: str,
+    pretty: str,
+    filename: str,
+    context_lines: int = 3,
+    max_lines: int = DIFF_MAX_LINES,
+) -> typing.Iterator[str]:
+    """
+    Generate the unified diff (applicable via `git apply`) between the original and the pretty-formatted content.
+    Lines are compared via their hashes and the output is truncated after `max_lines` lines.
+    """
+    a_lines, b_lines = _split_lines(original), _split_lines(pretty)
+    line_ids: typing.Dict[str, int] = {}
+    a = [line_ids.setdefault(line, len(line_ids)) for line in a_lines]
+    b = [line_ids.setdefault(line, len(line_ids)) for line in b_lines]
+
+    # Group the differences separated by less than 2 * context_lines common lines into hunks
+    hunks: typing.List[typing.List[typing.Tuple[int, int, int, int]]] = []
+    a_position = b_position = 0
+    for block in matching_blocks(a, b) + [_MatchingBlock(len(a), len(b), 0)]:
+        if block.a_start > a_position or block.b_start > b_position:
+            change = (a_position, block.a_start, b_position, block.b_start)
+            if hunks and a_position - hunks[-1][-1][1] <= 2 * context_lines:
+                hunks[-1].append(change)
+            else:
+                hunks.append([change])
+        a_position, b_position = block.a_start + block.size, block.b_start + block.size
+
+    def _lines() -> typing.Iterator[str]:
+        yield "--- a/{}\n".format(filename)
+        yield "+++ b/{}\n".format(filename)
+        for hunk in hunks:
+            a_start = max(hunk[0][0] - context_lines, 0)
+            a_stop = min(hunk[-1][1] + context_lines, len(a_lines))
+            b_start = hunk[0][2] - (hunk[0][0] - a_start)
+            b_stop = hunk[-1][3] + (a_stop - hunk[-1][1])
+            yield "@@ -{} +{} @@\n".format(_format_range(a_start, a_stop), _format_range(b_start, b_stop))
+
+            a_position = a_start
+            for change_a_start, change_a_stop, change_b_start, change_b_stop in hunk:
+                yield from _diff_lines(" ", a_lines[a_position:change_a_start])
+                yield from _diff_lines("-", a_lines[change_a_start:change_a_stop])
+                yield from _diff_lines("+", b_lines[change_b_start:change_b_stop])
+                a_position = change_a_stop
+            yield from _diff_lines(" ", a_lines[a_position:a_stop])
+
+    for line_number, line in enumerate(_lines()):
+        if line_number == max_lines:
+            yield "... diff truncated after {} lines\n".format(max_lines)
+            return
+        yield line
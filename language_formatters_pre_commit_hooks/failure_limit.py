@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import typing
+
+from language_formatters_pre_commit_hooks.utils import COMMAND_CANCELLED_EXIT_CODE
+
+
+# Maximum number of files passed to each tool invocation if a failure limit is set (unless the limit is higher), so that
+# the hooks running external tools can stop between invocations even if a single invocation would check all the files
+FILES_PER_INVOCATION_WITH_LIMIT = 32
+
+
+class FailureLimit(object):
+    """
+    Maximum number of failures (not pretty-formatted, or not valid, files) that a hook should report before stopping.
+    A limit of None represents an unlimited number of failures.
+    """
+
+    def __init__(self, max_failures: typing.Optional[int]) -> None:
+        self.max_failures = max_failures
+        self.failures = 0
+        self.reported_failures = 0
+        self.unchecked_files: typing.List[str] = []
+
+    def record(self, failures: int = 1) -> bool:
+        """Record `failures` new failures and check if the limit is reached."""
+        self.failures += failures
+        return self.is_reached()
+
+    def is_reached(self) -> bool:
+        return self.max_failures is not None and self.failures >= self.max_failures
+
+    def max_files_per_invocation(self, max_files: typing.Optional[int]) -> typing.Optional[int]:
+        """Bound `max_files` (files per tool invocation, None if unbounded) so that the hooks can stop between invocations."""
+        if self.max_failures is None:
+            return max_files
+        bound = max(self.max_failures, FILES_PER_INVOCATION_WITH_LIMIT)
+        return bound if max_files is None else min(max_files, bound)
+
+    def truncate(self, failures: typing.List[str]) -> typing.List[str]:
+        """
+        Failures to report, so that at most `max_failures` failures are reported across the calls.
+        The failures found by the same tool invocations, beyond the limit, are not reported (so they are counted as not checked).
+        """
+        if self.max_failures is None:
+            return failures
+        reported = failures[: max(self.max_failures - self.reported_failures, 0)]
+        self.reported_failures += len(reported)
+        self.skip(failures[len(reported) :])
+        return reported
+
+    def skip(self, filenames: typing.Iterable[str]) -> None:
+        """Record files that have not been checked due to the reached limit."""
+        self.unchecked_files.extend(filenames)
+
+    def skip_cancelled(
+        self,
+        invocations: typing.Iterable[typing.Tuple[typing.List[str], typing.Tuple[int, str]]],
+    ) -> typing.List[typing.Tuple[typing.List[str], typing.Tuple[int, str]]]:
+        """Record the files of the cancelled tool invocations (files and result, see `run_commands`) and return the completed ones."""
+        completed = []
+        for files, result in invocations:
+            if result[0] == COMMAND_CANCELLED_EXIT_CODE:
+                self.skip(files)
+            else:
+                completed.append((files, result))
+        return completed
+
+    def exit_status(self, status: int) -> int:
+        """Report the files that have not been checked and determine the exit status of the hook."""
+        if not self.unchecked_files:
+            return status
+
+        print(
+            "Stopped after {failures} failures (see --fail-fast and --max-failures), {count} files have not been checked".format(
+                failures=self.failures if self.max_failures is None else min(self.failures, self.max_failures),
+                count=len(self.unchecked_files),
+            ),
+        )
+        # Files are skipped only once failures are found
+        return status or 1
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import hashlib
+import os
+import re
+import sys
+import typing
+
+from language_formatters_pre_commit_hooks.utils import run_command
+
+
+# Number of bytes, at the beginning of each file, inspected to detect generated files
+GENERATED_MARKER_READ_SIZE = 4096
+
+# Markers of generated files, ie. https://golang.org/s/generatedcode and https://generated.at
+# `DO NOT EDIT` alone is not a marker, as it is used by hand-written files too: it has to follow a generator phrase on the same line
+_GENERATED_MARKERS = re.compile(
+    rb"^// Code generated .* DO NOT EDIT\.$|\b[Gg]enerated\b.*\bDO NOT EDIT\b|@generated\b|<auto-generated",
+    re.MULTILINE,
+)
+
+_LOCKFILE_NAMES = frozenset(
+    (
+        "Cargo.lock",
+        "Gemfile.lock",
+        "Pipfile.lock",
+        "Podfile.lock",
+        "composer.lock",
+        "go.sum",
+        "package-lock.json",
+        "pdm.lock",
+        "pnpm-lock.yaml",
+        "poetry.lock",
+        "uv.lock",
+        "yarn.lock",
+    ),
+)
+
+_SIZE_SUFFIXES = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3}
+
+
+def _read_file_list(path: str) -> typing.List[str]:
+    if path == "-":
+        content = sys.stdin.buffer.read()
+    else:
+        with open(path, "rb") as f:
+            content = f.read()
+    # Lists generated via `git ls-files -z`, `find -print0` and alike are NUL-separated, other lists are line-separated
+    entries = content.split(b"\0") if b"\0" in content else content.splitlines()
+    return [os.fsdecode(entry) for entry in entries if entry]
+
+
+def expand_file_lists(filenames: typing.Iterable[str]) -> typing.List[str]:
+    """
+    Replace the `@path` arguments by the files listed in `path` (`@-` reads the list from the standard input).
+    Arguments are kept as they are if a file with the literal name exists (ie. a file named `@types.yaml`).
+    Raises OSError if a list can not be read.
+    """
+    expanded = []
+    for filename in filenames:
+        if filename.startswith("@") and len(filename) > 1 and not os.path.lexists(filename):
+            expanded.extend(_read_file_list(filename[1:]))
+        else:
+            expanded.append(filename)
+    return expanded
+
+
+class Shard(typing.NamedTuple):
+    number: int  # 1-based index of the shard
+    total: int
+
+
+def parse_shard(value: str) -> Shard:
+    """
+    Parse a shard definition formatted as `INDEX/COUNT` (ie. `1/4` is the first of 4 shards).
+    The method raises ValueError in case of invalid definition.
+    """
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ValueError("Shard definition should be formatted as INDEX/COUNT (ie. 1/4), {value} provided".format(value=value))
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError("Shard index should be between 1 and {count}, {value} provided".format(count=max(count, 1), value=value))
+    return Shard(number=index, total=count)
+
+
+def _path_hash(filename: str) -> int:
+    """Hash of the file path that is stable across machines, processes and operating systems."""
+    normalized_path = os.path.normpath(filename).replace(os.sep, "/")
+    return int(hashlib.sha256(normalized_path.encode("utf-8")).hexdigest()[:16], 16)
+
+
+def _file_size(filename: str) -> int:
+    try:
+        return os.path.getsize(filename)
+    except OSError:
+        return 0
+
+
+def select_shard(filenames: typing.Iterable[str], shard: Shard, balance_by_size: bool = False) -> typing.List[str]:
+    """
+    Deterministically select the files belonging to `shard`.
+
+    By default files are assigned to shards by their path hash, so the assignment of a file
+    does not depend on the other files to process.
+    If `balance_by_size` is set, files are assigned (largest first) to the shard with the least
+    amount of bytes. The assignment is still deterministic as long as all the shards are
+    processing the same files.
+    """
+    unique_filenames = list(dict.fromkeys(filenames))
+
+    if not balance_by_size:
+        return [filename for filename in unique_filenames if _path_hash(filename) % shard.total == shard.number - 1]
+
+    shard_sizes = [0] * shard.total
+    selected = set()
+    for size, _, filename in sorted(((_file_size(filename), _path_hash(filename), filename) for filename in unique_filenames), reverse=True):
+        lightest_shard = shard_sizes.index(min(shard_sizes))
+        shard_sizes[lightest_shard] += size
+        if lightest_shard == shard.number - 1:
+            selected.add(filename)
+
+    return [filename for filename in unique_filenames if filename in selected]
+
+
+def _changed_files() -> typing.Set[str]:
+    """Files (relative to the current directory) that are modified relatively to HEAD, staged or not."""
+    try:
+        status_code, output = run_command("git", "diff", "--name-only", "--relative", "-z", "HEAD", "--")
+    except OSError:  # pragma: no cover
+        return set()
+    if status_code != 0:
+        return set()
+    return {os.path.normpath(filename) for filename in output.split("\0") if filename}
+
+
+def _modification_time(filename: str) -> float:
+    try:
+        return os.path.getmtime(filename)
+    except OSError:
+        return 0
+
+
+def prioritize_recently_changed(filenames: typing.Iterable[str]) -> typing.List[str]:
+    """
+    Sort the files such that files changed relatively to HEAD come first, followed by the other files.
+    Within each group, the most recently modified files come first.
+    """
+    changed_files = _changed_files()
+    return sorted(
+        dict.fromkeys(filenames),
+        key=lambda filename: (os.path.normpath(filename) not in changed_files, -_modification_time(filename), filename),
+    )
+
+
+def parse_size(value: str) -> int:
+    """
+    Parse a size in bytes, optionally followed by a K, M or G (binary) suffix (ie. `512K`).
+    The method raises ValueError in case of invalid size.
+    """
+    match = re.match(r"^(\d+)([KMG]?)B?$", value.strip().upper())
+    if not match:
+        raise ValueError(
+            "Size should be a number of bytes optionally followed by K, M or G (ie. 512K), {value} provided".format(value=value)
+        )
+    return int(match.group(1)) * _SIZE_SUFFIXES[match.group(2)]
+
+
+def skip_reason(filename: str, max_file_size: typing.Optional[int], skip_generated: bool) -> typing.Optional[str]:
+    """
+    Determine why `filename` should not be processed (None if the file should be processed).
+    The decision is based on the file metadata and on the first GENERATED_MARKER_READ_SIZE bytes only.
+    """
+    if max_file_size is not None:
+        try:
+            file_size = os.stat(filename).st_size
+        except OSError:
+            file_size = 0
+        if file_size > max_file_size:
+            return "size of {} bytes exceeds --max-file-size".format(file_size)
+
+    if skip_generated:
+        if os.path.basename(filename) in _LOCKFILE_NAMES:
+            return "lockfile"
+        try:
+            with open(filename, "rb") as f:
+                header = f.read(GENERATED_MARKER_READ_SIZE)
+        except OSError:
+            header = b""
+        marker = _GENERATED_MARKERS.search(header)
+        if marker:
+            return "generated file marker `{}`".format(marker.group(0).decode("utf-8", "replace").strip())
+
+    return None
+
+
+def drop_skipped_files(
+    filenames: typing.Iterable[str],
+    max_file_size: typing.Optional[int],
+    skip_generated: bool,
+) -> typing.Tuple[typing.List[str], typing.Dict[str, str]]:
+    """
+    Split `filenames` into the files to process and the skipped ones (filename -> skip reason).
+    """
+    selected = []
+    skipped = {}
+    for filename in filenames:
+        reason = skip_reason(filename, max_file_size, skip_generated)
+        if reason is None:
+            selected.append(filename)
+        else:
+            skipped[filename] = reason
+    return selected, skipped
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import re
+import subprocess  # nosec: disable=B404
+import typing
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+
+
+# Number of directories scanned concurrently by the walker (os.scandir releases the GIL while listing a directory)
+WALKER_THREADS = 8
+# Maximum number of directories scanned by a single walker task, before handing the remaining ones back to the pool
+_DIRECTORIES_PER_TASK = 64
+# Size of the chunks read from the `git ls-files` output
+_GIT_OUTPUT_CHUNK_SIZE = 64 * 1024
+
+
+class _IgnoreRule(typing.NamedTuple):
+    # Directory containing the .gitignore file (prefix of the paths, including the trailing separator)
+    base: str
+    pattern: typing.Pattern[str]
+    negated: bool
+    directory_only: bool
+
+
+def _translate_glob(glob: str) -> str:
+    """Translate a .gitignore glob (without leading `!` and trailing `/`) into a regular expression on `/` separated paths."""
+    anchored = "/" in glob
+    glob = glob.lstrip("/")
+
+    regex = []
+    index = 0
+    while index < len(glob):
+        if glob.startswith("**/", index):
+            regex.append("(?:.*/)?")
+            index += 3
+        elif glob.startswith("/**", index) and index + 3 == len(glob):
+            regex.append("/.*")
+            index += 3
+        elif glob[index] == "*":
+            regex.append(".*" if glob.startswith("**", index) else "[^/]*")
+            index += 2 if glob.startswith("**", index) else 1
+        elif glob[index] == "?":
+            regex.append("[^/]")
+            index += 1
+        elif glob[index] == "[" and "]" in glob[index + 2 :]:
+            end = glob.index("]", index + 2)
+            content = glob[index + 1 : end]
+            if content.startswith("!"):
+                content = "^" + content[1:]
+            regex.append("[{}]".format(content.replace("\\", "\\\\")))
+            index = end + 1
+        elif glob[index] == "\\" and index + 1 < len(glob):
+            regex.append(re.escape(glob[index + 1]))
+            index += 2
+        else:
+            regex.append(re.escape(glob[index]))
+            index += 1
+
+    # Globs without slashes match at any depth, the others are relative to the .gitignore directory
+    return "{}{}$".format("" if anchored else "(?:.*/)?", "".join(regex))
+
+
+def _parse_gitignore(base: str, content: str) -> typing.List[_IgnoreRule]:
+    rules = []
+    for line in content.splitlines():
+        # Trailing spaces are ignored unless escaped
+        line = re.sub(r"(?<!\\) +$", "", line)
+        if not line or line.startswith("#"):
+            continue
+        negated = line.startswith("!")
+        if negated:
+            line = line[1:]
+        directory_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            continue
+        rules.append(_IgnoreRule(base=base, pattern=re.compile(_translate_glob(line)), negated=negated, directory_only=directory_only))
+    return rules
+
+
+def _is_ignored(path: str, is_directory: bool, rules: typing.List[_IgnoreRule]) -> bool:
+    """Check `path` against the rules, the last matching rule wins (rules of the deeper .gitignore files come last)."""
+    for rule in reversed(rules):
+        if rule.directory_only and not is_directory:
+            continue
+        if rule.pattern.match(path[len(rule.base) :].replace(os.sep, "/")):
+            return not rule.negated
+    return False
+
+
+def _scan_directory(
+    directory: str,
+    extensions: typing.Tuple[str, ...],
+    rules: typing.List[_IgnoreRule],
+) -> typing.Tuple[typing.List[str], typing.List[str], typing.List[_IgnoreRule]]:
+    """Scan `directory` and return the matching files, the subdirectories to scan and the ignore rules applying to them."""
+    # Paths are relative to the current directory if the walked root is the current directory
+    prefix = "" if directory == os.curdir else os.path.join(directory, "")
+    try:
+        with open(os.path.join(directory, ".gitignore")) as f:
+            rules = rules + _parse_gitignore(prefix, f.read())
+    except OSError:
+        pass
+
+    files, subdirectories = [], []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            path = prefix + entry.name
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name != ".git" and not _is_ignored(path, True, rules):
+                    subdirectories.append(path)
+            elif entry.name.endswith(extensions) and entry.is_file() and not _is_ignored(path, False, rules):
+                files.append(path)
+    return files, subdirectories, rules
+
+
+_Directories = typing.List[typing.Tuple[str, typing.List[_IgnoreRule]]]
+
+
+def _scan_directories(directories: _Directories, extensions: typing.Tuple[str, ...]) -> typing.Tuple[typing.List[str], _Directories]:
+    """Scan (depth-first) up to `_DIRECTORIES_PER_TASK` directories and return the matching files and the directories left to scan."""
+    files: typing.List[str] = []
+    for _ in range(_DIRECTORIES_PER_TASK):
+        if not directories:
+            break
+        directory, rules = directories.pop()
+        directory_files, subdirectories, subdirectories_rules = _scan_directory(directory, extensions, rules)
+        files.extend(directory_files)
+        directories.extend((subdirectory, subdirectories_rules) for subdirectory in subdirectories)
+    return files, directories
+
+
+def walk_tree(root: str, extensions: typing.Tuple[str, ...], threads: int = WALKER_THREADS) -> typing.Iterator[str]:
+    """
+    Yield the files within `root` whose name ends with one of `extensions`, skipping the ones ignored by .gitignore files.
+    Directories are scanned concurrently and files are yielded as soon as their task completes (so they are not sorted).
+    Each task scans multiple directories, which amortizes the scheduling cost on trees with many small directories.
+    """
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        pending = {executor.submit(_scan_directories, [(root, [])], extensions)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, directories = future.result()
+                yield from files
+                # The directories left to scan are split among the idle threads
+                tasks = max(min(threads - len(pending), len(directories)), 1) if directories else 0
+                pending.update(executor.submit(_scan_directories, directories[index::tasks], extensions) for index in range(tasks))
+
+
+def _git_ls_files(root: str, extensions: typing.Tuple[str, ...]) -> typing.Optional[typing.Iterator[str]]:
+    """
+    Yield the files within `root` tracked by git, or untracked and not ignored, whose name ends with one of `extensions`.
+    None is returned if `root` is not within a git working tree.
+    """
+    if subprocess.call(("git", "-C", root, "rev-parse", "--is-inside-work-tree"), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL):
+        return None
+
+    def _files() -> typing.Iterator[str]:
+        process = subprocess.Popen(  # nosec: disable=B603
+            ("git", "-C", root, "ls-files", "-z", "--cached", "--others", "--exclude-standard"),
+            stdout=subprocess.PIPE,
+        )
+        output = typing.cast(typing.IO[bytes], process.stdout)
+        try:
+            remainder = b""
+            for chunk in iter(lambda: output.read(_GIT_OUTPUT_CHUNK_SIZE), b""):
+                entries = (remainder + chunk).split(b"\0")
+                remainder = entries.pop()
+                for entry in entries:
+                    path = os.fsdecode(entry)
+                    if path.endswith(extensions):
+                        path = path if root == os.curdir else os.path.join(root, path)
+                        # Files deleted from the working tree are still listed, until the deletion is staged
+                        if os.path.isfile(path):
+                            yield path
+        finally:
+            output.close()
+            process.wait()
+
+    return _files()
+
+
+def tree_files(root: str, extensions: typing.Tuple[str, ...]) -> typing.Iterator[str]:
+    """
+    Yield the files within `root` whose name ends with one of `extensions` and that are not ignored by git.
+    Files are listed via `git ls-files` within git working trees, and via a .gitignore aware directory walker otherwise.
+    """
+    return _git_ls_files(root, extensions) or walk_tree(root, extensions)
@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import collections
+import io
+import threading
+import time
+import typing
+from concurrent.futures import Executor
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from language_formatters_pre_commit_hooks.diff import unified_diff
+from language_formatters_pre_commit_hooks.failure_limit import FailureLimit
+from language_formatters_pre_commit_hooks.git_utils import IndexReader
+from language_formatters_pre_commit_hooks.result_cache import cache_backend_from_url
+from language_formatters_pre_commit_hooks.result_cache import FormatResult
+from language_formatters_pre_commit_hooks.result_cache import ResultCache
+from language_formatters_pre_commit_hooks.run_history import RunRecorder
+from language_formatters_pre_commit_hooks.scheduler import CostModel
+from language_formatters_pre_commit_hooks.scheduler import longest_first
+from language_formatters_pre_commit_hooks.time_budget import TimeBudget
+
+
+# Number of files read, and looked up in the result cache, at once
+BATCH_SIZE = 256
+# Environment variable providing the default --io-threads value
+IO_THREADS_ENVIRONMENT_VARIABLE = "LANGUAGE_FORMATTERS_IO_THREADS"
+# Default memory budget (bytes) of the content read ahead, and written in background, by the --io-threads threads
+DEFAULT_IO_MEMORY_BUDGET = 64 * 1024 * 1024
+# Maximum number of files being read at the same time by each --io-threads thread (reads are queued ahead to hide the latency)
+_READS_AHEAD_PER_IO_THREAD = 4
+
+
+def _batches(filenames: typing.Iterable[str], batch_size: int) -> typing.Iterator[typing.List[str]]:
+    batch: typing.List[str] = []
+    for filename in filenames:
+        batch.append(filename)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _read_file(filename: str) -> str:
+    with open(filename) as input_file:
+        return "".join(input_file.readlines())
+
+
+def _write_file(filename: str, content: str, newline: typing.Optional[str]) -> None:
+    with io.open(filename, "w", encoding="UTF-8", newline=newline) as output_file:
+        output_file.write(content)
+
+
+def _read_files(filenames: typing.List[str], index_reader: typing.Optional[IndexReader]) -> typing.Dict[str, str]:
+    if index_reader is None:
+        return {filename: _read_file(filename) for filename in filenames}
+
+    # Staged contents are decoded as the working tree files would be (universal newlines)
+    return {
+        filename: content.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+        for filename, content in index_reader.read_many(filenames).items()
+    }
+
+
+class _PipelinedIO(object):
+    """
+    Overlap the file system accesses with the formatting (ie. for source trees on network file systems).
+
+    While a batch is processed the files of the following batches are read, in order, by the I/O threads, and the fixed
+    files are written back asynchronously. Reading ahead pauses while the content read, and not processed yet, plus the
+    content waiting to be written exceed `memory_budget` bytes. The budget is soft: the reads already started still complete.
+    Batches have to be read, or skipped, in the order they are provided.
+    """
+
+    def __init__(self, executor: ThreadPoolExecutor, threads: int, batches: typing.List[typing.List[str]], memory_budget: int) -> None:
+        self._executor = executor
+        self._max_reading = threads * _READS_AHEAD_PER_IO_THREAD
+        self._memory_budget = memory_budget
+        self._lock = threading.Lock()
+        self._unread: typing.Deque[str] = collections.deque(filename for batch in batches for filename in batch)
+        self._reads: typing.Dict[str, "Future[str]"] = {}
+        # Size of the files read and not released yet
+        self._sizes: typing.Dict[str, int] = {}
+        # Files skipped while they were being read
+        self._dropped: typing.Set[str] = set()
+        self._writes: typing.List["Future[None]"] = []
+        self._reading = 0
+        self._buffered_bytes = 0
+        self._previous_batch: typing.List[str] = []
+
+    def _read(self, filename: str) -> str:
+        content = ""
+        try:
+            content = _read_file(filename)
+            return content
+        finally:
+            with self._lock:
+                self._reading -= 1
+                if filename in self._dropped:
+                    self._dropped.discard(filename)
+                else:
+                    self._sizes[filename] = len(content)
+                    self._buffered_bytes += len(content)
+            self._read_ahead()
+
+    def _submit_read(self, filename: str) -> None:
+        """Start reading `filename`, the lock has to be held."""
+        self._reading += 1
+        self._reads[filename] = self._executor.submit(self._read, filename)
+
+    def _read_ahead(self) -> None:
+        with self._lock:
+            while self._unread and self._reading < self._max_reading and self._buffered_bytes < self._memory_budget:
+                self._submit_read(self._unread.popleft())
+
+    def _release(self, batch: typing.List[str]) -> None:
+        """Stop buffering the files of `batch`, the lock has to be held."""
+        pending = set(batch)
+        # The files not read yet are the first ones of the queue, as batches are processed in order
+        while self._unread and self._unread[0] in pending:
+            self._unread.popleft()
+        for filename in batch:
+            if self._reads.pop(filename, None) is None:
+                continue
+            if filename in self._sizes:
+                self._buffered_bytes -= self._sizes.pop(filename)
+            else:
+                self._dropped.add(filename)
+
+    def read(self, batch: typing.List[str]) -> typing.Dict[str, str]:
+        """Content of the files of `batch`, the files of the previously read batch are released."""
+        with self._lock:
+            self._release(self._previous_batch)
+            self._previous_batch = batch
+            # The batch is needed right away, whatever the budget is
+            pending = set(batch)
+            while self._unread and self._unread[0] in pending:
+                self._submit_read(self._unread.popleft())
+            reads = {filename: self._reads[filename] for filename in batch}
+        self._read_ahead()
+        return {filename: future.result() for filename, future in reads.items()}
+
+    def skip(self, batch: typing.List[str]) -> None:
+        """Release the files of `batch` without reading them."""
+        with self._lock:
+            self._release(batch)
+        self._read_ahead()
+
+    def _release_write(self, size: int) -> None:
+        with self._lock:
+            self._buffered_bytes -= size
+        self._read_ahead()
+
+    def write(self, filename: str, content: str, newline: typing.Optional[str]) -> None:
+        """Write `content` into `filename` in background, errors are raised by `wait_writes`."""
+        with self._lock:
+            self._buffered_bytes += len(content)
+        future = self._executor.submit(_write_file, filename, content, newline)
+        future.add_done_callback(lambda _: self._release_write(len(content)))
+        self._writes.append(future)
+
+    def wait_writes(self) -> None:
+        for future in self._writes:
+            future.result()
+
+    def stop(self) -> None:
+        """Stop reading ahead (ie. before shutting down the executor)."""
+        with self._lock:
+            self._unread.clear()
+
+
+def _start_pipelined_io(
+    args: argparse.Namespace, batches: typing.List[typing.List[str]], exit_stack: ExitStack
+) -> typing.Optional[_PipelinedIO]:
+    """Start reading `batches` ahead if `--io-threads` is used. The I/O threads are shut down when `exit_stack` is closed."""
+    io_threads = getattr(args, "io_threads", None)
+    # The staged content is read via a single `git cat-file` process, so it is not pipelined
+    if not io_threads or args.from_index:
+        return None
+    executor = exit_stack.enter_context(ThreadPoolExecutor(max_workers=io_threads))
+    pipelined_io = _PipelinedIO(executor, io_threads, batches, args.io_memory_budget)
+    # Stop reading ahead before the I/O threads are shut down (ie. if the failure limit is reached)
+    exit_stack.callback(pipelined_io.stop)
+    return pipelined_io
+
+
+def _newline(git_attributes: typing.Dict[str, str]) -> typing.Optional[str]:
+    """New line to write according to the `eol` git attribute (None writes the platform default)."""
+    return {"crlf": "\r\n", "lf": "\n"}.get(git_attributes.get("eol", ""))
+
+
+def _format_content(
+    format_content: typing.Callable[[str], str],
+    parse_errors: typing.Tuple[typing.Type[Exception], ...],
+    string_content: str,
+) -> typing.Tuple[FormatResult, float]:
+    """Format `string_content` and measure how long it took. It runs in the worker processes if `--jobs` is used."""
+    start = time.perf_counter()
+    try:
+        pretty_content = format_content(string_content)
+        result = FormatResult(valid=True, pretty_content=pretty_content if string_content != pretty_content else None)
+    except parse_errors:
+        result = FormatResult(valid=False)
+    return result, time.perf_counter() - start
+
+
+def _format_in_parallel(
+    executor: Executor,
+    format_content: typing.Callable[[str], str],
+    parse_errors: typing.Tuple[typing.Type[Exception], ...],
+    contents: typing.Dict[str, str],
+    cost_model: CostModel,
+) -> typing.Dict[str, "Future[typing.Tuple[FormatResult, float]]"]:
+    # Workers pick the submitted files in order, so submitting them longest-expected-first
+    # prevents an expensive file from being started last, while the other workers are idle
+    costs = {filename: cost_model.estimate(filename, size=len(string_content)) for filename, string_content in contents.items()}
+    return {
+        filename: executor.submit(_format_content, format_content, parse_errors, contents[filename]) for filename in longest_first(costs)
+    }
+
+
+def _report_failure(
+    args: argparse.Namespace,
+    filename: str,
+    string_content: str,
+    result: FormatResult,
+    invalid_file_message: str,
+    run_recorder: RunRecorder,
+    pipelined_io: typing.Optional[_PipelinedIO] = None,
+) -> None:
+    """
+    Report a not valid, or not pretty-formatted, file. Not pretty-formatted files are fixed if `args.autofix` is set.
+    Fixed files are written in background if `pipelined_io` is provided.
+    """
+    if not result.valid or result.pretty_content is None:
+        print(invalid_file_message.format(filename=filename))
+        return
+
+    print("File {} is not pretty-formatted".format(filename))
+
+    if args.diff:
+        with run_recorder.phase("diff"):
+            print("".join(unified_diff(string_content, result.pretty_content, filename)), end="")
+
+    if args.autofix:
+        print("Fixing file {}".format(filename))
+        with run_recorder.phase("write"):
+            newline = _newline(args.git_attributes.get(filename, {}))
+            if pipelined_io is None:
+                _write_file(filename, result.pretty_content, newline)
+            else:
+                pipelined_io.write(filename, result.pretty_content, newline)
+
+
+def format_files(
+    args: argparse.Namespace,
+    format_content: typing.Callable[[str], str],
+    parse_errors: typing.Tuple[typing.Type[Exception], ...],
+    invalid_file_message: str,
+    run_recorder: RunRecorder,
+    cache_options: typing.Optional[typing.Dict[str, typing.Any]] = None,
+) -> int:
+    """
+    Pretty format `args.filenames` via `format_content`.
+    This is the common logic of the hooks that format files via a python library.
+
+    Args:
+        args: parsed command line arguments (`filenames`, `autofix`, `diff`, `failure_limit`, `from_index`, `git_attributes`, `jobs`,
+            `result_cache` and `time_budget` are expected, `io_threads` and `io_memory_budget` are optional). Fixed files are written with the new line selected by their `eol` git attribute.
+        format_content: method returning the pretty-formatted content of a file. It has to be picklable if `args.jobs` is greater than 1.
+        parse_errors: exceptions raised by `format_content` if the content is not valid.
+        invalid_file_message: message to print if a file is not valid (`{filename}` is replaced).
+        run_recorder: collector of the performance metrics of the run.
+        cache_options: hook options affecting `format_content` output, used as part of the result cache key.
+    Returns:
+        The hook exit status (int), 1 if any file is not pretty-formatted or not valid.
+        `TIME_BUDGET_EXHAUSTED_EXIT_CODE` is returned if the time budget is exhausted before checking all the files.
+        Once the failure limit is reached the remaining files are not checked, and the pending workers are cancelled.
+    """
+    result_cache = None
+    if args.result_cache:
+        result_cache = ResultCache(
+            backend=cache_backend_from_url(args.result_cache),
+            hook_name=run_recorder.hook_name,
+            tool_version=run_recorder.tool_version,
+            options=cache_options,
+        )
+
+    status = 0
+
+    time_budget: TimeBudget = args.time_budget
+    failure_limit: FailureLimit = args.failure_limit
+    cost_model = CostModel(run_recorder.hook_name)
+    # Nothing is spawned unless the staged content is read
+    with IndexReader() as index_reader, ExitStack() as exit_stack:
+        executor = exit_stack.enter_context(ProcessPoolExecutor(max_workers=args.jobs)) if args.jobs > 1 else None
+        batches = list(_batches(dict.fromkeys(args.filenames), BATCH_SIZE))
+        pipelined_io = _start_pipelined_io(args, batches, exit_stack)
+
+        for batch in batches:
+            if time_budget.is_exhausted() or failure_limit.is_reached():
+                if time_budget.is_exhausted():
+                    time_budget.skip(batch)
+                else:
+                    failure_limit.skip(batch)
+                if pipelined_io is not None:
+                    pipelined_io.skip(batch)
+                continue
+
+            with run_recorder.phase("read"):
+                contents = (
+                    pipelined_io.read(batch) if pipelined_io is not None else _read_files(batch, index_reader if args.from_index else None)
+                )
+
+            cached_results: typing.Dict[str, FormatResult] = {}
+            if result_cache is not None:
+                with run_recorder.phase("cache-lookup"):
+                    cached_results = result_cache.get_many(contents)
+
+            formatting: typing.Dict[str, "Future[typing.Tuple[FormatResult, float]]"] = {}
+            if executor is not None:
+                formatting = _format_in_parallel(
+                    executor=executor,
+                    format_content=format_content,
+                    parse_errors=parse_errors,
+                    contents={filename: content for filename, content in contents.items() if filename not in cached_results},
+                    cost_model=cost_model,
+                )
+
+            new_results: typing.Dict[str, FormatResult] = {}
+            for index, (filename, string_content) in enumerate(contents.items()):
+                if time_budget.is_exhausted():
+                    time_budget.skip(batch[index:])
+                    break
+                if failure_limit.is_reached():
+                    failure_limit.skip(batch[index:])
+                    break
+
+                result = cached_results.get(filename)
+                if result_cache is not None:
+                    run_recorder.record_cache_lookup(hit=result is not None)
+
+                if result is None:
+                    if filename in formatting:
+                        with run_recorder.phase("format"):
+                            result, duration = formatting[filename].result()
+                    else:
+                        with run_recorder.file(filename), run_recorder.phase("format"):
+                            result, duration = _format_content(format_content, parse_errors, string_content)
+                    run_recorder.record_file_timing(filename, len(string_content), duration)
+                    new_results[filename] = result
+
+                if not result.valid or result.pretty_content is not None:
+                    _report_failure(args, filename, string_content, result, invalid_file_message, run_recorder, pipelined_io)
+                    status = 1
+                    failure_limit.record()
+
+            # The files not processed yet (ie. the failure limit is reached) are not formatted by the workers
+            for future in formatting.values():
+                future.cancel()
+
+            if result_cache is not None:
+                with run_recorder.phase("cache-store"):
+                    result_cache.put_many(contents, new_results)
+
+        if pipelined_io is not None:
+            with run_recorder.phase("write"):
+                pipelined_io.wait_writes()
+
+    return time_budget.exit_status(failure_limit.exit_status(status))
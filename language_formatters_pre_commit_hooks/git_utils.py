@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import contextlib
+import os
+import re
+import subprocess  # nosec: disable=B404
+import sys
+import tempfile
+import threading
+import types
+import typing
+
+from language_formatters_pre_commit_hooks.utils import run_command
+
+
+_HUNK_HEADER = re.compile(r"^@@ -\d+(?:,\d+)? \+(?P<start>\d+)(?:,(?P<count>\d+))? @@")
+# Escape sequences of the paths quoted by git (see `core.quotePath`)
+_QUOTED_PATH_ESCAPE = re.compile(r"\\(?:([0-7]{3})|(.))")
+_QUOTED_PATH_ESCAPES = {"a": "\a", "b": "\b", "t": "\t", "n": "\n", "v": "\v", "f": "\f", "r": "\r", '"': '"', "\\": "\\"}
+
+
+class LineRange(typing.NamedTuple):
+    # 1-based, inclusive, line numbers
+    start: int
+    end: int
+
+
+def _unquote_path(path: str) -> str:
+    """
+    Path reported by git in a diff header.
+    Git appends a tab to the paths containing spaces, and C-quotes the paths containing special characters
+    (and, unless `core.quotePath=false`, non-ASCII characters as octal escaped bytes).
+    """
+    if path.endswith("\t"):
+        path = path[:-1]
+    if len(path) < 2 or not path.startswith('"') or not path.endswith('"'):
+        return path
+
+    def _unescape(match: typing.Match[str]) -> bytes:
+        if match.group(1) is not None:
+            return bytes((int(match.group(1), 8),))
+        return _QUOTED_PATH_ESCAPES.get(match.group(2), match.group(2)).encode("utf-8")
+
+    content = path[1:-1]
+    unquoted = b""
+    position = 0
+    for match in _QUOTED_PATH_ESCAPE.finditer(content):
+        unquoted += content[position : match.start()].encode("utf-8") + _unescape(match)
+        position = match.end()
+    unquoted += content[position:].encode("utf-8")
+    return unquoted.decode("utf-8", "surrogateescape")
+
+
+def _parse_changed_line_ranges(diff_output: str) -> typing.Dict[str, typing.List[LineRange]]:
+    changed_line_ranges: typing.Dict[str, typing.List[LineRange]] = {}
+    current_ranges: typing.Optional[typing.List[LineRange]] = None
+    for line in diff_output.splitlines():
+        if line.startswith("+++ "):
+            path = _unquote_path(line[4:])
+            if path == "/dev/null":
+                # The file has been removed
+                current_ranges = None
+            else:
+                current_ranges = changed_line_ranges.setdefault(os.path.abspath(path[2:] if path.startswith("b/") else path), [])
+            continue
+
+        hunk_header = _HUNK_HEADER.match(line)
+        if hunk_header and current_ranges is not None:
+            start = int(hunk_header.group("start"))
+            count = int(hunk_header.group("count") or 1)
+            if count > 0:
+                # Hunks with no lines are pure deletions, there is nothing to format in the new content
+                current_ranges.append(LineRange(start=start, end=start + count - 1))
+
+    return changed_line_ranges
+
+
+def staged_changed_line_ranges(filenames: typing.Iterable[str]) -> typing.Optional[typing.Dict[str, typing.List[LineRange]]]:
+    """
+    Retrieve the line ranges of `filenames` that are modified in the git index relatively to HEAD.
+    The ranges are extracted from a single `git diff --cached -U0` call.
+
+    Files without changed lines are not present in the returned dictionary (filename -> line ranges).
+    None is returned if the ranges could not be retrieved (ie. not in a git repository).
+    """
+    status_code, output = run_command(
+        "git",
+        "-c",
+        "core.quotePath=false",
+        "diff",
+        "--cached",
+        "--relative",
+        "--no-color",
+        "--no-ext-diff",
+        "-U0",
+    )
+    if status_code != 0:
+        print("Unable to retrieve the changed lines via `git diff`: {output}".format(output=output), file=sys.stderr)
+        return None
+
+    changed_line_ranges = _parse_changed_line_ranges(output)
+    return {
+        filename: changed_line_ranges[os.path.abspath(filename)]
+        for filename in dict.fromkeys(filenames)
+        if changed_line_ranges.get(os.path.abspath(filename))
+    }
+
+
+def file_attributes(
+    filenames: typing.Sequence[str],
+    attributes: typing.Sequence[str],
+    cached: bool = False,
+) -> typing.Dict[str, typing.Dict[str, str]]:
+    """
+    Resolve the git `attributes` of `filenames` (filename -> attribute -> value) via a single `git check-attr --stdin` process.
+    Values are `set`, `unset`, `unspecified` or the assigned value (ie. `crlf` for `eol`).
+    If `cached` is set the `.gitattributes` files are read from the git index.
+
+    Files whose attributes could not be resolved (ie. outside of a git repository) are not present in the returned dictionary.
+    """
+    if not filenames:
+        return {}
+
+    command = ["git", "check-attr", "-z", "--stdin"]
+    if cached:
+        command.append("--cached")
+    try:
+        process = subprocess.run(  # nosec: disable=B603
+            command + list(attributes),
+            input=b"".join(os.fsencode(filename) + b"\0" for filename in filenames),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+    except OSError as e:
+        print("Unable to resolve the git attributes: {error}".format(error=e), file=sys.stderr)
+        return {}
+
+    # Expected output: "<filename>\0<attribute>\0<value>\0" for each file and attribute.
+    # Git stops at the first failing file (ie. outside of the repository), the attributes resolved so far are returned.
+    fields = process.stdout.split(b"\0")
+    resolved: typing.Dict[str, typing.Dict[str, str]] = {}
+    for index in range(0, len(fields) - 2, 3):
+        path, attribute, value = (os.fsdecode(field) for field in fields[index : index + 3])
+        resolved.setdefault(path, {})[attribute] = value
+    return {filename: resolved[filename] for filename in filenames if filename in resolved}
+
+
+class IndexReader(object):
+    """
+    Reader of the content of the files staged in the git index.
+
+    All the paths are resolved via a single `git ls-files --stage` call and the staged blobs are
+    streamed through a single, long-lived, `git cat-file --batch` process.
+    Files that are not present in the index are read from the working tree.
+    """
+
+    def __init__(self) -> None:
+        self._blob_ids: typing.Optional[typing.Dict[str, str]] = None
+        self._cat_file: typing.Optional["subprocess.Popen[bytes]"] = None
+
+    def __enter__(self) -> "IndexReader":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: typing.Optional[typing.Type[BaseException]],
+        exc_value: typing.Optional[BaseException],
+        traceback: typing.Optional[types.TracebackType],
+    ) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._cat_file is not None:
+            typing.cast(typing.IO[bytes], self._cat_file.stdin).close()
+            self._cat_file.wait()
+            typing.cast(typing.IO[bytes], self._cat_file.stdout).close()
+            self._cat_file = None
+
+    def _load_blob_ids(self) -> typing.Dict[str, str]:
+        if self._blob_ids is None:
+            # `:/` selects the whole repository, paths are reported relative to the current directory
+            output = subprocess.check_output(("git", "ls-files", "--stage", "-z", "--", ":/"))  # nosec: disable=B603
+            self._blob_ids = {}
+            for entry in output.split(b"\0"):
+                if not entry:
+                    continue
+                metadata, path = entry.split(b"\t", 1)
+                _, blob_id, stage = metadata.split(b" ")
+                # Only merged entries (stage 0) represent the content to commit
+                if stage == b"0":
+                    self._blob_ids[os.path.abspath(os.fsdecode(path))] = blob_id.decode("ascii")
+        return self._blob_ids
+
+    @staticmethod
+    def _request_blobs(requests: typing.IO[bytes], blob_ids: typing.List[str]) -> None:
+        requests.write("".join("{}\n".format(blob_id) for blob_id in blob_ids).encode("ascii"))
+        requests.flush()
+
+    def read_many(self, filenames: typing.Iterable[str]) -> typing.Dict[str, bytes]:
+        """Read the staged content of `filenames` (filename -> content)."""
+        blob_ids = self._load_blob_ids()
+
+        contents: typing.Dict[str, bytes] = {}
+        staged_filenames = []
+        for filename in dict.fromkeys(filenames):
+            if os.path.abspath(filename) in blob_ids:
+                staged_filenames.append(filename)
+            else:
+                print("{} is not present in the git index, reading it from the working tree".format(filename), file=sys.stderr)
+                with open(filename, "rb") as f:
+                    contents[filename] = f.read()
+
+        if not staged_filenames:
+            return contents
+
+        if self._cat_file is None:
+            self._cat_file = subprocess.Popen(  # nosec: disable=B603
+                ("git", "cat-file", "--batch"),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+            )
+
+        # Requests are written by a separate thread, so the pipes are never filled on both sides
+        writer = threading.Thread(
+            target=self._request_blobs,
+            args=(self._cat_file.stdin, [blob_ids[os.path.abspath(filename)] for filename in staged_filenames]),
+        )
+        writer.start()
+        try:
+            output = typing.cast(typing.IO[bytes], self._cat_file.stdout)
+            for filename in staged_filenames:
+                header = output.readline().split()
+                if len(header) != 3:
+                    raise RuntimeError("Unable to read the staged content of {}: {}".format(filename, b" ".join(header).decode("utf-8")))
+                contents[filename] = output.read(int(header[2]))
+                output.read(1)
+        finally:
+            writer.join()
+
+        return contents
+
+
+@contextlib.contextmanager
+def staged_files(filenames: typing.Sequence[str]) -> typing.Iterator[typing.Dict[str, str]]:
+    """
+    Write the staged content of `filenames` into a temporary directory, so it could be processed by external tools.
+    The context yields the path of the temporary copy of each file (filename -> temporary path).
+    File names are preserved, as tools might depend on them.
+    """
+    with IndexReader() as index_reader, tempfile.TemporaryDirectory() as temporary_directory:
+        paths = {}
+        for index, (filename, content) in enumerate(index_reader.read_many(filenames).items()):
+            path = os.path.join(temporary_directory, str(index), os.path.basename(filename))
+            os.mkdir(os.path.dirname(path))
+            with open(path, "wb") as f:
+                f.write(content)
+            paths[filename] = path
+        yield paths
+
+
+@contextlib.contextmanager
+def paths_to_check(filenames: typing.Sequence[str], from_index: bool) -> typing.Iterator[typing.Dict[str, str]]:
+    """
+    Paths that external tools should process for each file (filename -> path).
+    If `from_index` is set the paths refer to temporary copies of the staged content, otherwise they are the filenames.
+    """
+    if from_index:
+        with staged_files(filenames) as paths:
+            yield paths
+    else:
+        yield {filename: filename for filename in filenames}
+
+
+def restore_filenames(output: str, paths: typing.Dict[str, str]) -> str:
+    """Replace, within a tool output, the paths returned by `paths_to_check` with the original filenames."""
+    for filename, path in paths.items():
+        if path != filename:
+            output = output.replace(path, filename)
+    return output
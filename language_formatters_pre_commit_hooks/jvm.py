@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import hashlib
+import os
+import shutil
+import typing
+from contextlib import contextmanager
+
+
+# Flags tuned for short-lived JVMs, like the ones spawned by the formatters.
+# The formatters run for few seconds at most, so the JIT warm-up of the C2 compiler
+# and the setup of a parallel garbage collector are not worth their cost.
+STARTUP_PROFILE_ARGUMENTS = (
+    "-XX:TieredStopAtLevel=1",
+    "-XX:+UseSerialGC",
+)
+_ARCHIVE_DUMP_ARGUMENT_PREFIX = "-XX:ArchiveClassesAtExit="
+# Temporary archives of the active `jvm_arguments` contexts that no JVM has been asked to dump yet
+_unclaimed_archive_dumps: typing.Set[str] = set()
+
+
+def _java_identity() -> typing.Optional[str]:
+    """
+    Identify the JVM available on PATH without starting it.
+    The identity changes if the java executable is updated, which is needed as
+    Class Data Sharing archives are valid only for the JVM that created them.
+    """
+    java_executable = shutil.which("java")
+    if java_executable is None:
+        return None
+
+    java_executable = os.path.realpath(java_executable)
+    try:
+        stat = os.stat(java_executable)
+    except OSError:  # pragma: no cover
+        return None
+
+    return hashlib.sha256(
+        "{path}:{size}:{mtime}".format(path=java_executable, size=stat.st_size, mtime=stat.st_mtime).encode("utf-8"),
+    ).hexdigest()[:16]
+
+
+def class_data_sharing_archive(jar_path: str) -> typing.Optional[str]:
+    """
+    Path of the AppCDS archive associated to `jar_path` and to the JVM on PATH.
+    The method will return None in case the JVM cannot be identified.
+    """
+    java_identity = _java_identity()
+    if java_identity is None:
+        return None
+    return "{jar_path}.{java_identity}.jsa".format(jar_path=jar_path, java_identity=java_identity)
+
+
+@contextmanager
+def jvm_arguments(jar_path: str, startup_profile: bool = False) -> typing.Generator[typing.List[str], None, None]:
+    """
+    Provide the JVM arguments to use while running `java -jar jar_path`.
+
+    If an AppCDS archive exists for the jar it will be used, otherwise the JVM is asked to
+    dump one on exit (JDK 13+) so that the following runs will skip most of the class loading.
+    The archive is dumped on a temporary path and moved in place once the JVM terminated, so
+    concurrent runs never observe partially written archives. If the arguments are used by
+    multiple JVMs (ie. `--jobs`) their commands have to go through `claim_archive_dump`, so that
+    a single JVM dumps the archive.
+
+    NOTE: `-XX:+IgnoreUnrecognizedVMOptions` allows older JVMs (that do not support dynamic
+    archives) to keep working, while `-Xlog:disable` prevents CDS warnings (ie. archive created
+    by a different JVM) from polluting the output that the hooks are parsing.
+    """
+    arguments = ["-XX:+IgnoreUnrecognizedVMOptions", "-Xlog:disable", "-Xshare:auto"]
+    if startup_profile:
+        arguments.extend(STARTUP_PROFILE_ARGUMENTS)
+
+    archive = class_data_sharing_archive(jar_path)
+    temporary_archive = None
+    if archive is not None:
+        if os.path.exists(archive):
+            arguments.append("-XX:SharedArchiveFile={archive}".format(archive=archive))
+        else:
+            temporary_archive = "{archive}.{pid}.tmp".format(archive=archive, pid=os.getpid())
+            arguments.append("{prefix}{archive}".format(prefix=_ARCHIVE_DUMP_ARGUMENT_PREFIX, archive=temporary_archive))
+            _unclaimed_archive_dumps.add(temporary_archive)
+
+    try:
+        yield arguments
+    finally:
+        if temporary_archive is not None:
+            _unclaimed_archive_dumps.discard(temporary_archive)
+            if os.path.exists(temporary_archive):
+                os.replace(temporary_archive, typing.cast(str, archive))
+
+
+def claim_archive_dump(command: typing.List[str]) -> typing.List[str]:
+    """
+    Return `command`, built from the `jvm_arguments` arguments, keeping the AppCDS archive dump only if no other
+    command of the same context kept it before. JVMs dumping to the same path would corrupt each other's archive.
+    """
+    dump_arguments = [argument for argument in command if argument.startswith(_ARCHIVE_DUMP_ARGUMENT_PREFIX)]
+    if not dump_arguments:
+        return command
+    temporary_archive = dump_arguments[0][len(_ARCHIVE_DUMP_ARGUMENT_PREFIX) :]
+    if temporary_archive in _unclaimed_archive_dumps:
+        _unclaimed_archive_dumps.discard(temporary_archive)
+        return command
+    return [argument for argument in command if not argument.startswith(_ARCHIVE_DUMP_ARGUMENT_PREFIX)]
+
+
+@contextmanager
+def formatter_command(executable_path: str, startup_profile: bool = False) -> typing.Generator[typing.List[str], None, None]:
+    """
+    Provide the command running a JVM based formatter, which is either a jar (run via `java -jar` with `jvm_arguments`)
+    or a native image of the formatter, which is run directly.
+    """
+    if not executable_path.endswith(".jar"):
+        yield [executable_path]
+        return
+
+    with jvm_arguments(executable_path, startup_profile=startup_profile) as arguments:
+        yield ["java", *arguments, "-jar", executable_path]
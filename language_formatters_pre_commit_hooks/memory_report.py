@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+import os
+import sys
+import threading
+import tracemalloc
+import typing
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # pragma: no cover (resource is not available on Windows)
+    resource = None  # type: ignore[assignment]
+
+
+# Interval, in seconds, between two samples of the memory usage
+SAMPLING_INTERVAL = 0.02
+# Number of allocation sites reported
+TOP_ALLOCATIONS_COUNT = 10
+# Snapshots of the allocations are taken every time the traced memory grows by this factor
+_SNAPSHOT_GROWTH_FACTOR = 1.1
+
+
+def _children(pid: int) -> typing.List[int]:
+    """Children of the process `pid`, raises OSError if /proc/<pid>/task/<tid>/children is not supported."""
+    children: typing.List[int] = []
+    for task in os.listdir("/proc/{}/task".format(pid)):
+        with open("/proc/{}/task/{}/children".format(pid, task)) as f:
+            children.extend(int(child) for child in f.read().split())
+    return children
+
+
+def _descendants_rss(pid: int) -> int:
+    """Sum of the resident set size of all the descendants of `pid` (ie. java, or cargo and rustfmt)."""
+    rss = 0
+    pending = _children(pid)
+    while pending:
+        child = pending.pop()
+        try:
+            with open("/proc/{}/statm".format(child)) as f:
+                rss += int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+            pending.extend(_children(child))
+        except (OSError, IndexError, ValueError):
+            # The process terminated while being inspected
+            pass
+    return rss
+
+
+def _children_max_rss() -> typing.Optional[int]:
+    """Maximum resident set size of the terminated children, used if /proc can not be sampled."""
+    if resource is None:  # pragma: no cover
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on the other platforms
+    return int(max_rss if sys.platform == "darwin" else max_rss * 1024)
+
+
+class _Measurement(object):
+    def __init__(self, traced_memory: int) -> None:
+        self.start = traced_memory
+        self.peak = traced_memory
+        self.children_peak_rss: typing.Optional[int] = None
+
+
+class MemoryProfiler(object):
+    """
+    Collect the memory usage of a hook run and write it, as JSON, into `report_path`.
+
+    The python allocations are traced via tracemalloc: the peak is recorded for each file and phase
+    (as increase relative to the memory in use when the file, or phase, processing started) together
+    with the top allocation sites observed at the highest traced memory.
+    The resident set size of the child processes (ie. java, gofmt, cargo) is sampled during each phase.
+    """
+
+    def __init__(self, hook_name: str, report_path: str) -> None:
+        self.hook_name = hook_name
+        self.report_path = report_path
+        self.files: typing.Dict[str, int] = {}
+        self.phases: typing.Dict[str, typing.Dict[str, typing.Optional[int]]] = {}
+        self._active: typing.List[_Measurement] = []
+        self._peak = 0
+        self._lock = threading.Lock()
+        self._snapshot: typing.Optional[tracemalloc.Snapshot] = None
+        self._snapshot_size = 0
+        self._sample_children = True
+
+        tracemalloc.start()
+        self._stopped = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name="memory-profiler")
+        self._sampler.daemon = True
+        self._sampler.start()
+
+    def _sample(self) -> None:
+        while not self._stopped.wait(SAMPLING_INTERVAL):
+            traced_memory = tracemalloc.get_traced_memory()[0]
+            if traced_memory > self._snapshot_size * _SNAPSHOT_GROWTH_FACTOR:
+                self._snapshot = tracemalloc.take_snapshot()
+                self._snapshot_size = traced_memory
+
+            if not self._sample_children:
+                continue
+            try:
+                children_rss = _descendants_rss(os.getpid())
+            except OSError:
+                self._sample_children = False
+                continue
+            with self._lock:
+                for measurement in self._active:
+                    measurement.children_peak_rss = max(measurement.children_peak_rss or 0, children_rss)
+
+    def _fold_peak(self) -> None:
+        """Account the traced memory peak to all the active measurements, as it is going to be reset."""
+        peak = tracemalloc.get_traced_memory()[1]
+        self._peak = max(self._peak, peak)
+        for measurement in self._active:
+            measurement.peak = max(measurement.peak, peak)
+        reset_peak = getattr(tracemalloc, "reset_peak", None)  # Available since python 3.9
+        if reset_peak is not None:
+            reset_peak()
+
+    @contextmanager
+    def _measure(self) -> typing.Iterator[_Measurement]:
+        with self._lock:
+            self._fold_peak()
+            measurement = _Measurement(tracemalloc.get_traced_memory()[0])
+            self._active.append(measurement)
+        try:
+            yield measurement
+        finally:
+            with self._lock:
+                self._fold_peak()
+                self._active.remove(measurement)
+
+    @contextmanager
+    def file(self, filename: str) -> typing.Iterator[None]:
+        with self._measure() as measurement:
+            yield
+        self.files[filename] = max(self.files.get(filename, 0), measurement.peak - measurement.start)
+
+    @contextmanager
+    def phase(self, name: str) -> typing.Iterator[None]:
+        with self._measure() as measurement:
+            yield
+        children_peak_rss = measurement.children_peak_rss if self._sample_children else _children_max_rss()
+        phase = self.phases.setdefault(name, {"peak_increase": 0, "children_peak_rss": None})
+        phase["peak_increase"] = max(phase["peak_increase"] or 0, measurement.peak - measurement.start)
+        if children_peak_rss is not None:
+            phase["children_peak_rss"] = max(phase["children_peak_rss"] or 0, children_peak_rss)
+
+    def _top_allocations(self) -> typing.List[typing.Dict[str, typing.Any]]:
+        if self._snapshot is None:
+            return []
+        snapshot = self._snapshot.filter_traces((tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)))
+        return [
+            {
+                "site": "{}:{}".format(statistic.traceback[0].filename, statistic.traceback[0].lineno),
+                "size": statistic.size,
+                "count": statistic.count,
+            }
+            for statistic in snapshot.statistics("lineno")[:TOP_ALLOCATIONS_COUNT]
+        ]
+
+    def save(self) -> None:
+        """Stop the profiling and write the report. Failures are reported but they never affect the hook outcome."""
+        self._stopped.set()
+        self._sampler.join()
+        with self._lock:
+            self._fold_peak()
+        if self._snapshot is None:
+            # The run was shorter than the sampling interval
+            self._snapshot = tracemalloc.take_snapshot()
+        report = {
+            "hook": self.hook_name,
+            "peak_traced_memory": self._peak,
+            "files": self.files,
+            "phases": self.phases,
+            "top_allocations": self._top_allocations(),
+        }
+        tracemalloc.stop()
+
+        try:
+            with open(self.report_path, "w") as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+        except OSError as e:
+            print("Unable to write memory report into {path}: {error}".format(path=self.report_path, error=e), file=sys.stderr)
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import platform
+import stat
+import sys
+import typing
+
+import requests
+
+from language_formatters_pre_commit_hooks.utils import _base_directory
+from language_formatters_pre_commit_hooks.utils import download_url
+
+
+# Platform names used by the native images published by google-java-format (ie. google-java-format_linux-x86-64)
+_PLATFORM_SYSTEMS = {"Linux": "linux", "Darwin": "darwin", "Windows": "windows"}
+_PLATFORM_MACHINES = {"x86_64": "x86-64", "amd64": "x86-64", "aarch64": "arm64", "arm64": "arm64"}
+
+
+def native_image_platform() -> typing.Optional[str]:
+    """Platform of the running machine (ie. linux-x86-64), None if no native image can be built for it."""
+    system = _PLATFORM_SYSTEMS.get(platform.system())
+    machine = _PLATFORM_MACHINES.get(platform.machine().lower())
+    if system is None or machine is None:
+        return None
+    return "{}-{}".format(system, machine)
+
+
+def _unavailable_marker(native_image_path: str) -> str:
+    return "{}.unavailable".format(native_image_path)
+
+
+def download_native_image(tool_name: str, version: str, url_template: str) -> typing.Optional[str]:
+    """
+    Download, and cache, the native executable of `tool_name` from `url_template` (formatted with `version` and `platform`).
+
+    None is returned, so that the caller falls back to the jar, if no native image exists for the version and the platform.
+    Versions without native image (HTTP 404) are remembered, so that the following runs do not query the server again.
+    """
+    native_platform = native_image_platform()
+    if native_platform is None:
+        print(
+            "No native image of {tool_name} is available for {system}/{machine}, falling back to the jar".format(
+                tool_name=tool_name,
+                system=platform.system(),
+                machine=platform.machine(),
+            ),
+            file=sys.stderr,
+        )
+        return None
+
+    file_name = "{tool_name}{version}-{platform}{suffix}".format(
+        tool_name=tool_name,
+        version=version,
+        platform=native_platform,
+        suffix=".exe" if sys.platform == "win32" else "",
+    )
+    native_image_path = os.path.join(_base_directory(), file_name)
+    if os.path.exists(_unavailable_marker(native_image_path)):
+        return None
+
+    url = url_template.format(version=version, platform=native_platform)
+    try:
+        native_image_path = download_url(url, file_name)
+    except Exception as e:  # The jar is used whatever the failure is
+        print(
+            "Unable to download the native image of {tool_name} {version} from {url}, falling back to the jar: {error}".format(
+                tool_name=tool_name,
+                version=version,
+                url=url,
+                error=e,
+            ),
+            file=sys.stderr,
+        )
+        if isinstance(e, requests.HTTPError) and e.response is not None and e.response.status_code == 404:
+            open(_unavailable_marker(native_image_path), "w").close()
+        return None
+
+    mode = os.stat(native_image_path).st_mode
+    if not mode & stat.S_IXUSR:
+        os.chmod(native_image_path, mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return native_image_path
@@ -43,15 +43,18 @@ class _ToolRequired(object):
     def is_tool_installed(self) -> bool:
         return self.check_command()
 
+    def ensure_installed(self) -> None:
+        """Raise ToolNotInstalled if the tool is not installed (ie. for hooks needing the tool only in some configurations)."""
+        if not self.is_tool_installed():
+            raise ToolNotInstalled(
+                tool_name=self.tool_name,
+                download_install_url=self.download_install_url,
+            )
+
     def __call__(self, f: F) -> F:
         @wraps(f)
         def wrapper(*args: typing.Any, **kwargs: typing.Any) -> int:
-            if not self.is_tool_installed():
-                raise ToolNotInstalled(
-                    tool_name=self.tool_name,
-                    download_install_url=self.download_install_url,
-                )
-
+            self.ensure_installed()
             return f(*args, **kwargs)
 
         return wrapper  # type: ignore
@@ -7,31 +7,36 @@ import argparse
 import sys
 import typing
 
+from language_formatters_pre_commit_hooks.cli import add_common_arguments
+from language_formatters_pre_commit_hooks.cli import add_from_index_argument
+from language_formatters_pre_commit_hooks.cli import add_result_cache_argument
+from language_formatters_pre_commit_hooks.cli import add_tool_invocation_arguments
+from language_formatters_pre_commit_hooks.cli import has_no_selected_files
+from language_formatters_pre_commit_hooks.cli import parse_arguments
+from language_formatters_pre_commit_hooks.git_utils import paths_to_check
+from language_formatters_pre_commit_hooks.git_utils import restore_filenames
 from language_formatters_pre_commit_hooks.pre_conditions import golang_required
-from language_formatters_pre_commit_hooks.utils import run_command
+from language_formatters_pre_commit_hooks.result_cache import clean_files_cache
+from language_formatters_pre_commit_hooks.result_cache import executable_identity
+from language_formatters_pre_commit_hooks.run_history import RunRecorder
+from language_formatters_pre_commit_hooks.scheduler import CostModel
+from language_formatters_pre_commit_hooks.scheduler import invocation_chunks
+from language_formatters_pre_commit_hooks.utils import COMMAND_CANCELLED_EXIT_CODE
+from language_formatters_pre_commit_hooks.utils import run_commands
 
 
-def _get_eol_attribute() -> typing.Optional[str]:
+def _needs_eol_hint(filenames: typing.Iterable[str], git_attributes: typing.Dict[str, typing.Dict[str, str]]) -> bool:
     """
-    Retrieve eol attribute defined for golang files
-    The method will return None in case of any error interacting with git
+    Check if any of the not pretty-formatted files is not forced to use LF via the `eol` git attribute.
+    Files whose attributes could not be resolved (ie. not in a git repository) are ignored.
     """
-    status_code, output = run_command("git", "check-attr", "-z", "eol", "--", "filename.go")
-    if status_code != 0:
-        return None
-
-    try:
-        # Expected output: "filename.go\0eol\0lf\0"
-        _, _, eol, _ = output.split("\0")
-        return eol
-    except:  # noqa: E722 (allow usage of bare 'except')
-        print(
-            "`git check-attr` output is not consistent to `<filename>\0<key>\0<value>\0` format: {output}".format(
-                output=output,
-            ),
-            file=sys.stderr,
-        )
-        return None
+    return any(git_attributes[filename].get("eol") != "lf" for filename in filenames if filename in git_attributes)
+
+
+def _gofmt_failures(result: typing.Tuple[int, str]) -> int:
+    """Number of files failing in a gofmt invocation, which lists the not pretty-formatted files (or reports an error)."""
+    status, output = result
+    return len(output.splitlines()) if status == 0 else 1
 
 
 @golang_required
@@ -43,18 +48,67 @@ def pretty_format_golang(argv: typing.Optional[typing.List[str]] = None) -> int:
         dest="autofix",
         help="Automatically fixes encountered not-pretty-formatted files",
     )
+    add_common_arguments(parser, file_extensions=(".go",))
+    add_from_index_argument(parser)
+    add_result_cache_argument(parser)
+    add_tool_invocation_arguments(parser)
 
     parser.add_argument("filenames", nargs="*", help="Filenames to fix")
-    args = parser.parse_args(argv)
+    args = parse_arguments(parser, argv)
+
+    gofmt_identity = executable_identity("gofmt")
+    run_recorder = RunRecorder(
+        "pretty-format-golang", tool_version=gofmt_identity, enabled=args.record_run_history, memory_report=args.memory_report
+    )
+    run_recorder.add_files(args.filenames)
+
+    if has_no_selected_files(args):
+        return run_recorder.save(0)
 
     cmd_args = ["gofmt", "-l"]
     if args.autofix:
         cmd_args.append("-w")
-    status, output = run_command(*(cmd_args + args.filenames))
+    gofmt_cache = clean_files_cache(args.result_cache, run_recorder.hook_name, tool_version=gofmt_identity)
+    cost_model = CostModel(run_recorder.hook_name)
+    with paths_to_check(args.filenames, from_index=args.from_index) as paths:
+        filenames = args.filenames
+        if gofmt_cache is not None:
+            with run_recorder.phase("cache-lookup"):
+                filenames = gofmt_cache.drop_clean_files(args.filenames, paths)
+            run_recorder.record_cache_lookups(lookups=len(args.filenames), hits=len(args.filenames) - len(filenames))
+
+        output = ""
+        checked_files: typing.List[str] = []
+        # gofmt would read the standard input if no file is passed
+        for batch in args.time_budget.batches(filenames) if filenames else ():
+            if args.failure_limit.is_reached():
+                args.failure_limit.skip(batch)
+                continue
+            chunks = invocation_chunks(args, cmd_args, batch, cost_model, paths=paths)
+            with run_recorder.phase("gofmt"):
+                results = run_commands(
+                    [cmd_args + [paths[filename] for filename in chunk] for chunk in chunks],
+                    concurrency=args.jobs,
+                    timeout=args.tool_timeout,
+                    stop=lambda _, result: args.failure_limit.record(_gofmt_failures(result)),
+                )
+
+            for chunk, (status, chunk_output) in zip(chunks, results):
+                if status == COMMAND_CANCELLED_EXIT_CODE:
+                    args.failure_limit.skip(chunk)
+                    continue
+                chunk_output = restore_filenames(chunk_output, {filename: paths[filename] for filename in chunk})
+                if status != 0:  # pragma: no cover
+                    print(chunk_output)
+                    return run_recorder.save(1)
+                output += chunk_output
+                checked_files.extend(chunk)
 
-    if status != 0:  # pragma: no cover
-        print(output)
-        return 1
+    if gofmt_cache is not None:
+        # gofmt lists only the not pretty-formatted (or fixed) files
+        not_pretty_formatted_files = set(output.splitlines())
+        with run_recorder.phase("cache-store"):
+            gofmt_cache.store_clean_files(filename for filename in checked_files if filename not in not_pretty_formatted_files)
 
     status = 0
     if output:
@@ -62,12 +116,12 @@ def pretty_format_golang(argv: typing.Optional[typing.List[str]] = None) -> int:
         print(
             "{}: {}".format(
                 "The following files have been fixed by gofmt" if args.autofix else "The following files are not properly formatted",
-                ", ".join(output.splitlines()),
+                # At most --max-failures files are reported (--autofix has no failure limit)
+                ", ".join(args.failure_limit.truncate(output.splitlines())),
             ),
         )
         if sys.platform == "win32":  # pragma: no cover
-            eol_attribute = _get_eol_attribute()
-            if eol_attribute and eol_attribute != "lf":
+            if _needs_eol_hint(output.splitlines(), args.git_attributes):
                 print(
                     "Hint: gofmt uses LF (aka `\\n`) as new line, but on Windows the default new line is CRLF (aka `\\r\\n`). "
                     "You might want to ensure that go files are forced to use LF via `.gitattributes`. "
@@ -75,7 +129,7 @@ def pretty_format_golang(argv: typing.Optional[typing.List[str]] = None) -> int:
                     file=sys.stderr,
                 )
 
-    return status
+    return run_recorder.save(args.time_budget.exit_status(args.failure_limit.exit_status(status)))
 
 
 if __name__ == "__main__":
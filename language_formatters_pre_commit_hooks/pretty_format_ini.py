@@ -12,9 +12,30 @@ from configparser import Error
 
 from iniparse import INIConfig
 
+from language_formatters_pre_commit_hooks import _get_library_version
+from language_formatters_pre_commit_hooks.cli import add_common_arguments
+from language_formatters_pre_commit_hooks.cli import add_diff_argument
+from language_formatters_pre_commit_hooks.cli import add_from_index_argument
+from language_formatters_pre_commit_hooks.cli import add_io_threads_arguments
+from language_formatters_pre_commit_hooks.cli import add_result_cache_argument
+from language_formatters_pre_commit_hooks.cli import parse_arguments
+from language_formatters_pre_commit_hooks.formatting import format_files
+from language_formatters_pre_commit_hooks.run_history import RunRecorder
 from language_formatters_pre_commit_hooks.utils import remove_trailing_whitespaces_and_set_new_line_ending
 
 
+def _format_ini(string_content: str) -> str:
+    # INIConfig only supports strict mode for throwing errors
+    config_parser = ConfigParser()
+    config_parser.read_string(string_content)
+
+    ini_config = INIConfig(io.StringIO(str(string_content)), parse_exc=False)
+
+    return remove_trailing_whitespaces_and_set_new_line_ending(
+        str(ini_config),
+    )
+
+
 def pretty_format_ini(argv: typing.Optional[typing.List[str]] = None) -> int:
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -23,41 +44,28 @@ def pretty_format_ini(argv: typing.Optional[typing.List[str]] = None) -> int:
         dest="autofix",
         help="Automatically fixes encountered not-pretty-formatted files",
     )
+    add_common_arguments(parser, file_extensions=(".ini",))
+    add_diff_argument(parser)
+    add_from_index_argument(parser)
+    add_io_threads_arguments(parser)
+    add_result_cache_argument(parser)
 
     parser.add_argument("filenames", nargs="*", help="Filenames to fix")
-    args = parser.parse_args(argv)
-
-    status = 0
-
-    for ini_file in set(args.filenames):
-        with open(ini_file) as input_file:
-            string_content = "".join(input_file.readlines())
-
-        try:
-            # INIConfig only supports strict mode for throwing errors
-            config_parser = ConfigParser()
-            config_parser.read_string(string_content)
+    args = parse_arguments(parser, argv)
 
-            ini_config = INIConfig(io.StringIO(str(string_content)), parse_exc=False)
-
-            pretty_content_str = remove_trailing_whitespaces_and_set_new_line_ending(
-                str(ini_config),
-            )
-
-            if string_content != pretty_content_str:
-                print("File {} is not pretty-formatted".format(ini_file))
-
-                if args.autofix:
-                    print("Fixing file {}".format(ini_file))
-                    with io.open(ini_file, "w", encoding="UTF-8") as output_file:
-                        output_file.write(str(pretty_content_str))
-
-                status = 1
-        except Error:
-            print("Input File {} is not a valid INI file".format(ini_file))
-            return 1
-
-    return status
+    run_recorder = RunRecorder(
+        "pretty-format-ini", tool_version=_get_library_version("iniparse"), enabled=args.record_run_history, memory_report=args.memory_report
+    )
+    run_recorder.add_files(args.filenames)
+
+    status = format_files(
+        args,
+        format_content=_format_ini,
+        parse_errors=(Error,),
+        invalid_file_message="Input File {filename} is not a valid INI file",
+        run_recorder=run_recorder,
+    )
+    return run_recorder.save(status)
 
 
 if __name__ == "__main__":
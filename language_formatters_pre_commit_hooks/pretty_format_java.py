@@ -4,13 +4,49 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import argparse
+import os
+import re
 import sys
+import tempfile
 import typing
+from contextlib import contextmanager
+from contextlib import ExitStack
 
 from language_formatters_pre_commit_hooks import _get_default_version
+from language_formatters_pre_commit_hooks.cli import add_changed_lines_only_argument
+from language_formatters_pre_commit_hooks.cli import add_common_arguments
+from language_formatters_pre_commit_hooks.cli import add_from_index_argument
+from language_formatters_pre_commit_hooks.cli import add_max_concurrent_tools_argument
+from language_formatters_pre_commit_hooks.cli import add_native_image_arguments
+from language_formatters_pre_commit_hooks.cli import add_result_cache_argument
+from language_formatters_pre_commit_hooks.cli import add_tool_invocation_arguments
+from language_formatters_pre_commit_hooks.cli import has_no_selected_files
+from language_formatters_pre_commit_hooks.cli import parse_arguments
+from language_formatters_pre_commit_hooks.git_utils import LineRange
+from language_formatters_pre_commit_hooks.git_utils import paths_to_check
+from language_formatters_pre_commit_hooks.git_utils import restore_filenames
+from language_formatters_pre_commit_hooks.git_utils import staged_changed_line_ranges
+from language_formatters_pre_commit_hooks.jvm import claim_archive_dump
+from language_formatters_pre_commit_hooks.jvm import formatter_command
+from language_formatters_pre_commit_hooks.native_image import download_native_image
 from language_formatters_pre_commit_hooks.pre_conditions import java_required
+from language_formatters_pre_commit_hooks.result_cache import clean_files_cache
+from language_formatters_pre_commit_hooks.run_history import RunRecorder
+from language_formatters_pre_commit_hooks.scheduler import CostModel
+from language_formatters_pre_commit_hooks.scheduler import invocation_chunks
+from language_formatters_pre_commit_hooks.time_budget import TimeBudget
+from language_formatters_pre_commit_hooks.utils import COMMAND_TIMEOUT_EXIT_CODE
+from language_formatters_pre_commit_hooks.utils import command_line_chunks
 from language_formatters_pre_commit_hooks.utils import download_url
-from language_formatters_pre_commit_hooks.utils import run_command
+from language_formatters_pre_commit_hooks.utils import fits_command_line
+from language_formatters_pre_commit_hooks.utils import isolate_failures
+from language_formatters_pre_commit_hooks.utils import run_commands
+from language_formatters_pre_commit_hooks.utils import ToolSlots
+
+# Native executables are published since google-java-format 1.15.0 (ie. google-java-format_linux-x86-64)
+GOOGLE_JAVA_FORMATTER_NATIVE_IMAGE_URL = (
+    "https://github.com/google/google-java-format/releases/download/v{version}/google-java-format_{platform}"
+)
 
 
 def __download_google_java_formatter_jar(version: str) -> str:  # pragma: no cover
@@ -36,7 +72,81 @@ def __download_google_java_formatter_jar(version: str) -> str:  # pragma: no cov
         )
 
 
-@java_required
+def _google_java_formatter_arguments(
+    time_budget: TimeBudget,
+    filenames: typing.List[str],
+    changed_line_ranges: typing.Optional[typing.Dict[str, typing.List[LineRange]]],
+) -> typing.Iterator[typing.Tuple[typing.List[str], typing.List[str]]]:
+    """Line ranges arguments and files to pass to each google-java-formatter invocation, honouring the time budget."""
+    if changed_line_ranges is None:
+        for batch in time_budget.batches(filenames):
+            yield [], batch
+        return
+
+    # google-java-formatter supports line ranges only if a single file is formatted
+    changed_filenames = list(changed_line_ranges)
+    for index, filename in enumerate(changed_filenames):
+        if time_budget.is_exhausted():
+            time_budget.skip(changed_filenames[index:])
+            return
+        line_arguments = []
+        for line_range in changed_line_ranges[filename]:
+            line_arguments.extend(["--lines", "{}:{}".format(line_range.start, line_range.end)])
+        yield line_arguments, [filename]
+
+
+def _clean_files(filenames: typing.List[str], status: int, output: str, autofix: bool) -> typing.List[str]:
+    """
+    Files verified as pretty-formatted by a google-java-formatter invocation.
+    In dry-run mode the tool lists the not pretty-formatted files, any other output (ie. a syntax error) makes the result unknown.
+    """
+    if status == 0:
+        return filenames
+    reported_files = set(output.splitlines())
+    if autofix or not reported_files.issubset(filenames):
+        return []
+    return [filename for filename in filenames if filename not in reported_files]
+
+
+def _is_attributable(result: typing.Tuple[int, str], paths: typing.List[str]) -> bool:
+    """
+    Check if the failures of a google-java-formatter invocation on `paths` are attributed to specific files.
+    In dry-run mode the tool lists the not pretty-formatted files only, any other output (ie. a syntax error) is not attributable.
+    """
+    status, output = result
+    return status in (0, COMMAND_TIMEOUT_EXIT_CODE) or set(output.splitlines()).issubset(paths)
+
+
+@contextmanager
+def _parameters_file(arguments: typing.List[str]) -> typing.Iterator[str]:
+    fd, path = tempfile.mkstemp(prefix="google-java-formatter-", suffix=".params")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write("\n".join(arguments))
+        yield path
+    finally:
+        os.remove(path)
+
+
+def _google_java_formatter_commands(
+    cmd_args: typing.List[str],
+    files_paths: typing.Dict[str, str],
+    exit_stack: ExitStack,
+) -> typing.List[typing.Tuple[typing.List[str], typing.List[str]]]:
+    """
+    Commands, and the files checked by each of them, running google-java-formatter on `files_paths` (filename -> path to check).
+    Files not fitting the command line are passed via a parameters file (`@path`), registered on `exit_stack`, so that a single JVM
+    processes them. Parameters files are split on whitespaces, so paths containing whitespaces are passed on multiple command lines instead.
+    """
+    paths = list(files_paths.values())
+    if not fits_command_line(cmd_args, paths) and not any(re.search(r"\s", path) for path in paths):
+        parameters_file = exit_stack.enter_context(_parameters_file(paths))
+        return [(cmd_args + ["@{}".format(parameters_file)], list(files_paths))]
+
+    filenames = {path: filename for filename, path in files_paths.items()}
+    return [(cmd_args + chunk, [filenames[path] for path in chunk]) for chunk in command_line_chunks(cmd_args, paths)]
+
+
 def pretty_format_java(argv: typing.Optional[typing.List[str]] = None) -> int:
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -57,34 +167,169 @@ def pretty_format_java(argv: typing.Optional[typing.List[str]] = None) -> int:
         dest="aosp",
         help="Formats Java code into AOSP format",
     )
+    parser.add_argument(
+        "--jvm-startup-profile",
+        action="store_true",
+        dest="jvm_startup_profile",
+        help="Run the JVM with flags tuned for fast startup (C1 only compilation and serial GC)",
+    )
+    add_changed_lines_only_argument(parser)
+    add_common_arguments(parser, file_extensions=(".java",))
+    add_from_index_argument(parser)
+    add_result_cache_argument(parser)
+    add_tool_invocation_arguments(parser)
+    add_max_concurrent_tools_argument(parser)
+    add_native_image_arguments(parser, default_url_template=GOOGLE_JAVA_FORMATTER_NATIVE_IMAGE_URL)
 
     parser.add_argument("filenames", nargs="*", help="Filenames to fix")
-    args = parser.parse_args(argv)
+    args = parse_arguments(parser, argv)
+
+    run_recorder = RunRecorder(
+        "pretty-format-java",
+        tool_version=args.google_java_formatter_version,
+        enabled=args.record_run_history,
+        memory_report=args.memory_report,
+    )
+    run_recorder.add_files(args.filenames)
+    tool_slots = ToolSlots(args.max_concurrent_tools)
+
+    if has_no_selected_files(args):
+        return run_recorder.save(0)
 
-    google_java_formatter_jar = __download_google_java_formatter_jar(
-        args.google_java_formatter_version,
+    changed_line_ranges = staged_changed_line_ranges(args.filenames) if args.changed_lines_only else None
+    if changed_line_ranges is not None and not changed_line_ranges:
+        return run_recorder.save(0)
+
+    # Line ranges are checked only on the changed lines, so the results are not cached in such case
+    google_java_formatter_cache = (
+        clean_files_cache(
+            args.result_cache,
+            run_recorder.hook_name,
+            tool_version=args.google_java_formatter_version,
+            options={"aosp": args.aosp},
+        )
+        if changed_line_ranges is None
+        else None
     )
 
-    cmd_args = ["java", "-jar", google_java_formatter_jar, "--set-exit-if-changed"]
-    if args.aosp:  # pragma: no cover
-        cmd_args.append("--aosp")
-    if args.autofix:
-        cmd_args.append("--replace")
-    else:
-        cmd_args.append("--dry-run")
-    status, output = run_command(*(cmd_args + args.filenames))
+    status, output = 0, ""
+    verified_files: typing.List[str] = []
+    not_valid_files: typing.List[str] = []
+    with paths_to_check(args.filenames, from_index=args.from_index) as paths:
+        filenames = args.filenames
+        if google_java_formatter_cache is not None:
+            with run_recorder.phase("cache-lookup"):
+                filenames = google_java_formatter_cache.drop_clean_files(args.filenames, paths)
+            run_recorder.record_cache_lookups(lookups=len(args.filenames), hits=len(args.filenames) - len(filenames))
+            if not filenames:
+                return run_recorder.save(0)
+
+        with run_recorder.phase("download"):
+            google_java_formatter = (
+                download_native_image("google-java-formatter", args.google_java_formatter_version, args.native_image_url)
+                if args.native_image
+                else None
+            )
+            if google_java_formatter is None:
+                java_required.ensure_installed()
+                google_java_formatter = __download_google_java_formatter_jar(
+                    args.google_java_formatter_version,
+                )
+
+        with formatter_command(google_java_formatter, startup_profile=args.jvm_startup_profile) as google_java_formatter_command:
+            cmd_args = [*google_java_formatter_command, "--set-exit-if-changed"]
+            if args.aosp:  # pragma: no cover
+                cmd_args.append("--aosp")
+            if args.autofix:
+                cmd_args.append("--replace")
+            else:
+                cmd_args.append("--dry-run")
+            cost_model = CostModel(run_recorder.hook_name)
+            for line_arguments, batch in _google_java_formatter_arguments(args.time_budget, filenames, changed_line_ranges):
+                if args.failure_limit.is_reached():
+                    args.failure_limit.skip(batch)
+                    continue
+                command = cmd_args + line_arguments
+                with ExitStack() as parameters_files:
+                    invocations = [
+                        invocation
+                        for chunk in invocation_chunks(args, command, batch, cost_model, split_command_line=False)
+                        for invocation in _google_java_formatter_commands(
+                            command,
+                            {filename: paths[filename] for filename in chunk},
+                            parameters_files,
+                        )
+                    ]
+
+                    def _stop(index: int, result: typing.Tuple[int, str]) -> bool:
+                        files = invocations[index][1]
+                        output = restore_filenames(result[1], {filename: paths[filename] for filename in files})
+                        return typing.cast(
+                            bool, args.failure_limit.record(len(files) - len(_clean_files(files, result[0], output, args.autofix)))
+                        )
+
+                    with run_recorder.phase("google-java-formatter"):
+                        results = run_commands(
+                            [claim_archive_dump(command) for command, _ in invocations],
+                            concurrency=args.jobs,
+                            timeout=args.tool_timeout,
+                            tool_slots=tool_slots,
+                            stop=_stop,
+                        )
+
+                    def _isolation_command(files: typing.List[str]) -> typing.List[str]:
+                        # The files of each invocation fit a single command, so do their subsets
+                        ((isolation_command, _),) = _google_java_formatter_commands(
+                            command,
+                            {filename: paths[filename] for filename in files},
+                            parameters_files,
+                        )
+                        return claim_archive_dump(isolation_command)
+
+                    checked = args.failure_limit.skip_cancelled((files, result) for (_, files), result in zip(invocations, results))
+                    # Once the failure limit is reached the invocations failing due to not valid files are not bisected
+                    if not args.failure_limit.is_reached():
+                        with run_recorder.phase("google-java-formatter-isolate"):
+                            checked = isolate_failures(
+                                checked,
+                                command=_isolation_command,
+                                is_attributable=lambda files, result: _is_attributable(result, [paths[filename] for filename in files]),
+                                concurrency=args.jobs,
+                                timeout=args.tool_timeout,
+                                tool_slots=tool_slots,
+                            )
+
+                for files, result in checked:
+                    if len(files) == 1 and not _is_attributable(result, [paths[files[0]]]):
+                        not_valid_files.extend(files)
+                        continue
+                    invocation_status, invocation_output = result
+                    invocation_output = restore_filenames(invocation_output, {filename: paths[filename] for filename in files})
+                    status = status or invocation_status
+                    output += invocation_output
+                    verified_files.extend(_clean_files(files, invocation_status, invocation_output, autofix=args.autofix))
+
+    if google_java_formatter_cache is not None:
+        with run_recorder.phase("cache-store"):
+            google_java_formatter_cache.store_clean_files(verified_files)
 
-    if output:
+    # At most --max-failures files are reported (--autofix has no failure limit)
+    reported_not_valid_files = args.failure_limit.truncate(sorted(not_valid_files))
+    if reported_not_valid_files:
+        print("The following files are not valid java source files: {}".format(", ".join(reported_not_valid_files)))
+    reported_output_lines = args.failure_limit.truncate(output.splitlines())
+    if reported_output_lines:
         print(
             "{}: {}".format(
                 "The following files have been fixed by google-java-formatter"
                 if args.autofix
                 else "The following files are not properly formatted",  # noqa
-                ", ".join(output.splitlines()),
+                ", ".join(reported_output_lines),
             ),
         )
 
-    return 0 if status == 0 else 1
+    run_recorder.record_tool_slots_wait(tool_slots)
+    return run_recorder.save(args.time_budget.exit_status(args.failure_limit.exit_status(0 if status == 0 and not not_valid_files else 1)))
 
 
 if __name__ == "__main__":
@@ -4,13 +4,32 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import argparse
+import os
 import sys
 import typing
 
 from language_formatters_pre_commit_hooks import _get_default_version
+from language_formatters_pre_commit_hooks.cli import add_common_arguments
+from language_formatters_pre_commit_hooks.cli import add_max_concurrent_tools_argument
+from language_formatters_pre_commit_hooks.cli import add_native_image_arguments
+from language_formatters_pre_commit_hooks.cli import add_result_cache_argument
+from language_formatters_pre_commit_hooks.cli import add_tool_invocation_arguments
+from language_formatters_pre_commit_hooks.cli import has_no_selected_files
+from language_formatters_pre_commit_hooks.cli import parse_arguments
+from language_formatters_pre_commit_hooks.jvm import claim_archive_dump
+from language_formatters_pre_commit_hooks.jvm import formatter_command
+from language_formatters_pre_commit_hooks.native_image import download_native_image
 from language_formatters_pre_commit_hooks.pre_conditions import java_required
+from language_formatters_pre_commit_hooks.result_cache import clean_files_cache
+from language_formatters_pre_commit_hooks.run_history import RunRecorder
+from language_formatters_pre_commit_hooks.scheduler import CostModel
+from language_formatters_pre_commit_hooks.scheduler import invocation_chunks
+from language_formatters_pre_commit_hooks.utils import COMMAND_TIMEOUT_EXIT_CODE
 from language_formatters_pre_commit_hooks.utils import download_url
-from language_formatters_pre_commit_hooks.utils import run_command
+from language_formatters_pre_commit_hooks.utils import isolate_failures
+from language_formatters_pre_commit_hooks.utils import run_command_in_chunks
+from language_formatters_pre_commit_hooks.utils import run_commands
+from language_formatters_pre_commit_hooks.utils import ToolSlots
 
 
 def __download_kotlin_formatter_jar(version: str) -> str:  # pragma: no cover
@@ -33,7 +52,22 @@ def __download_kotlin_formatter_jar(version: str) -> str:  # pragma: no cover
         )
 
 
-@java_required
+def _ktlint_failures(result: typing.Tuple[int, str]) -> int:
+    """Number of files failing in a ktlint invocation, which reports the violations as `<file>:<line>:<column>: <message>`."""
+    status, output = result
+    return len({line.split(":", 1)[0] for line in output.splitlines()}) or (1 if status != 0 else 0)
+
+
+def _is_attributable(files: typing.List[str], result: typing.Tuple[int, str]) -> bool:
+    """
+    Check if the failures of a ktlint invocation are attributed to its files, which are reported as `<file>:<line>:<column>: <message>`
+    (relatively to the working directory). Any other output (ie. a crash) is not attributable.
+    """
+    status, output = result
+    reported_paths = {os.path.abspath(line.split(":", 1)[0]) for line in output.splitlines()}
+    return status in (0, COMMAND_TIMEOUT_EXIT_CODE) or reported_paths.issubset(os.path.abspath(filename) for filename in files)
+
+
 def pretty_format_kotlin(argv: typing.Optional[typing.List[str]] = None) -> int:
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -48,19 +82,93 @@ def pretty_format_kotlin(argv: typing.Optional[typing.List[str]] = None) -> int:
         default=_get_default_version("ktlint"),
         help="KTLint version to use (default %(default)s)",
     )
+    parser.add_argument(
+        "--jvm-startup-profile",
+        action="store_true",
+        dest="jvm_startup_profile",
+        help="Run the JVM with flags tuned for fast startup (C1 only compilation and serial GC)",
+    )
+    add_common_arguments(parser, file_extensions=(".kt", ".kts"))
+    add_result_cache_argument(parser)
+    add_tool_invocation_arguments(parser)
+    add_max_concurrent_tools_argument(parser)
+    # ktlint does not publish native images, they have to be built (via GraalVM native-image) and hosted by the users
+    add_native_image_arguments(parser)
 
     parser.add_argument("filenames", nargs="*", help="Filenames to fix")
-    args = parser.parse_args(argv)
+    args = parse_arguments(parser, argv)
+    if args.native_image and not args.native_image_url:
+        parser.error("--native-image requires --native-image-url, as ktlint does not publish native images")
 
-    ktlint_jar = __download_kotlin_formatter_jar(
-        args.ktlint_version,
+    run_recorder = RunRecorder(
+        "pretty-format-kotlin", tool_version=args.ktlint_version, enabled=args.record_run_history, memory_report=args.memory_report
     )
+    run_recorder.add_files(args.filenames)
+    tool_slots = ToolSlots(args.max_concurrent_tools)
+
+    if has_no_selected_files(args):
+        return run_recorder.save(0)
+
+    # ktlint rules are configured via .editorconfig files
+    ktlint_cache = clean_files_cache(
+        args.result_cache, run_recorder.hook_name, tool_version=args.ktlint_version, config_file_names=(".editorconfig",)
+    )
+    filenames = args.filenames
+    if ktlint_cache is not None:
+        with run_recorder.phase("cache-lookup"):
+            filenames = ktlint_cache.drop_clean_files(args.filenames)
+        run_recorder.record_cache_lookups(lookups=len(args.filenames), hits=len(args.filenames) - len(filenames))
+        if not filenames:
+            return run_recorder.save(0)
+
+    with run_recorder.phase("download"):
+        ktlint = download_native_image("ktlint", args.ktlint_version, args.native_image_url) if args.native_image else None
+        if ktlint is None:
+            java_required.ensure_installed()
+            ktlint = __download_kotlin_formatter_jar(
+                args.ktlint_version,
+            )
 
     # ktlint does not return exit-code!=0 if we're formatting them.
     # To workaround this limitation we do run ktlint in check mode only,
     # which provides the expected exit status and we run it again in format
     # mode if autofix flag is enabled
-    check_status, check_output = run_command("java", "-jar", ktlint_jar, "--verbose", "--relative", "--", *args.filenames)
+    cost_model = CostModel(run_recorder.hook_name)
+    check_status, check_output = 0, ""
+    checked_files: typing.List[str] = []
+    not_valid_files: typing.List[str] = []
+    for batch in args.time_budget.batches(filenames):
+        if args.failure_limit.is_reached():
+            args.failure_limit.skip(batch)
+            continue
+        with run_recorder.phase("ktlint"), formatter_command(ktlint, startup_profile=args.jvm_startup_profile) as ktlint_command:
+            cmd_args = [*ktlint_command, "--verbose", "--relative", "--"]
+            chunks = invocation_chunks(args, cmd_args, batch, cost_model)
+            results = run_commands(
+                [claim_archive_dump(cmd_args + chunk) for chunk in chunks],
+                concurrency=args.jobs,
+                timeout=args.tool_timeout,
+                tool_slots=tool_slots,
+                stop=lambda _, result: args.failure_limit.record(_ktlint_failures(result)),
+            )
+            invocations = args.failure_limit.skip_cancelled(zip(chunks, results))
+            # Once the failure limit is reached the invocations failing due to not valid files are not bisected
+            if not args.failure_limit.is_reached():
+                invocations = isolate_failures(
+                    invocations,
+                    command=lambda files: claim_archive_dump(cmd_args + files),
+                    is_attributable=_is_attributable,
+                    concurrency=args.jobs,
+                    timeout=args.tool_timeout,
+                    tool_slots=tool_slots,
+                )
+        for files, result in invocations:
+            if len(files) == 1 and not _is_attributable(files, result):
+                not_valid_files.extend(files)
+            else:
+                checked_files.extend(files)
+                check_status = check_status or result[0]
+                check_output += result[1]
 
     not_pretty_formatted_files: typing.Set[str] = set()
     if check_status != 0:
@@ -68,19 +176,34 @@ def pretty_format_kotlin(argv: typing.Optional[typing.List[str]] = None) -> int:
 
         if args.autofix:
             print("Running ktlint format on {}".format(not_pretty_formatted_files))
-            run_command("java", "-jar", ktlint_jar, "--verbose", "--relative", "--format", "--", *not_pretty_formatted_files)
-
-    status = 0
-    if not_pretty_formatted_files:
-        status = 1
+            with run_recorder.phase("ktlint-format"), formatter_command(ktlint, startup_profile=args.jvm_startup_profile) as ktlint_command:
+                run_command_in_chunks(
+                    [*ktlint_command, "--verbose", "--relative", "--format", "--"],
+                    sorted(not_pretty_formatted_files),
+                    tool_slots=tool_slots,
+                )
+
+    # Violations are reported as `<file>:<line>:<column>: <message>`, any other output makes the results unknown
+    if ktlint_cache is not None and not_pretty_formatted_files.issubset(checked_files):
+        with run_recorder.phase("cache-store"):
+            ktlint_cache.store_clean_files(filename for filename in checked_files if filename not in not_pretty_formatted_files)
+
+    status = 1 if not_valid_files or not_pretty_formatted_files else 0
+    # At most --max-failures files are reported (--autofix has no failure limit)
+    reported_not_valid_files = args.failure_limit.truncate(sorted(not_valid_files))
+    if reported_not_valid_files:
+        print("The following files are not valid kotlin source files: {}".format(", ".join(reported_not_valid_files)))
+    reported_not_pretty_formatted_files = args.failure_limit.truncate(sorted(not_pretty_formatted_files))
+    if reported_not_pretty_formatted_files:
         print(
             "{}: {}".format(
                 "The following files have been fixed by ktlint" if args.autofix else "The following files are not properly formatted",
-                ", ".join(sorted(not_pretty_formatted_files)),
+                ", ".join(reported_not_pretty_formatted_files),
             ),
         )
 
-    return status
+    run_recorder.record_tool_slots_wait(tool_slots)
+    return run_recorder.save(args.time_budget.exit_status(args.failure_limit.exit_status(status)))
 
 
 if __name__ == "__main__":
@@ -4,12 +4,121 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import argparse
+import glob
+import json
+import os
+import re
 import sys
 import typing
 from os import getenv
 
+from language_formatters_pre_commit_hooks.cli import add_changed_lines_only_argument
+from language_formatters_pre_commit_hooks.cli import add_common_arguments
+from language_formatters_pre_commit_hooks.cli import add_max_concurrent_tools_argument
+from language_formatters_pre_commit_hooks.cli import add_result_cache_argument
+from language_formatters_pre_commit_hooks.cli import add_tool_invocation_arguments
+from language_formatters_pre_commit_hooks.cli import has_no_selected_files
+from language_formatters_pre_commit_hooks.cli import parse_arguments
+from language_formatters_pre_commit_hooks.git_utils import LineRange
+from language_formatters_pre_commit_hooks.git_utils import staged_changed_line_ranges
 from language_formatters_pre_commit_hooks.pre_conditions import rust_required
-from language_formatters_pre_commit_hooks.utils import run_command
+from language_formatters_pre_commit_hooks.result_cache import clean_files_cache
+from language_formatters_pre_commit_hooks.result_cache import executable_identity
+from language_formatters_pre_commit_hooks.run_history import RunRecorder
+from language_formatters_pre_commit_hooks.scheduler import CostModel
+from language_formatters_pre_commit_hooks.scheduler import invocation_chunks
+from language_formatters_pre_commit_hooks.utils import COMMAND_TIMEOUT_EXIT_CODE
+from language_formatters_pre_commit_hooks.utils import isolate_failures
+from language_formatters_pre_commit_hooks.utils import run_command_in_chunks
+from language_formatters_pre_commit_hooks.utils import run_commands
+from language_formatters_pre_commit_hooks.utils import ToolSlots
+
+
+_DIFF_HEADER = re.compile(r"^Diff in (.+?)(?: at line \d+|:\d+):$")
+_ERROR_LOCATION = re.compile(r"^\s*--> (.+?):\d+:\d+$")
+
+
+def _file_lines_arguments(changed_line_ranges: typing.Optional[typing.Dict[str, typing.List[LineRange]]]) -> typing.List[str]:
+    """rustfmt arguments restricting the formatting to the given line ranges (`--file-lines` requires a nightly toolchain)."""
+    if changed_line_ranges is None:
+        return []
+    file_lines = [
+        {"file": filename, "range": [line_range.start, line_range.end]}
+        for filename, line_ranges in changed_line_ranges.items()
+        for line_range in line_ranges
+    ]
+    return ["--unstable-features", "--file-lines", json.dumps(file_lines)]
+
+
+def _rustfmt_identity(toolchain: str) -> typing.Optional[str]:
+    """Identity of the rustfmt executable of `toolchain`, looked up within the rustup installation without running cargo."""
+    toolchains_directory = os.path.join(getenv("RUSTUP_HOME") or os.path.expanduser("~/.rustup"), "toolchains")
+    # Toolchain directories are named after the toolchain and the host triple (ie. stable-x86_64-unknown-linux-gnu)
+    executables = sorted(
+        glob.glob(os.path.join(toolchains_directory, toolchain, "bin", "rustfmt*"))
+        + glob.glob(os.path.join(toolchains_directory, "{}-*".format(toolchain), "bin", "rustfmt*")),
+    )
+    identities = [executable_identity(executable) for executable in executables]
+    if not identities or None in identities:
+        return None
+    return "|".join(typing.cast(typing.List[str], identities))
+
+
+def _not_well_formatted_paths(output: str) -> typing.Optional[typing.Set[str]]:
+    """
+    Real paths of the files reported by `cargo fmt --check` (`Diff in <path>:<line>:` or `Diff in <path> at line <line>:`).
+    None is returned if the output can not be fully interpreted, ie. not valid files are reported via `error: ...` messages.
+    """
+    paths = set()
+    for line in output.splitlines():
+        if line.startswith("error"):
+            return None
+        if line.startswith("Diff in "):
+            match = _DIFF_HEADER.match(line)
+            if match is None or not os.path.isabs(match.group(1)):
+                return None
+            paths.add(os.path.realpath(match.group(1)))
+    return paths
+
+
+def _error_paths(output: str) -> typing.Optional[typing.List[str]]:
+    """
+    Paths of the files reported by the `error: ...` messages of `cargo fmt`, located by the following ` --> <path>:<line>:<column>` line.
+    None is returned if any error is not located.
+    """
+    lines = output.splitlines()
+    paths = []
+    for line, next_line in zip(lines, lines[1:] + [""]):
+        if line.startswith("error"):
+            match = _ERROR_LOCATION.match(next_line)
+            if match is None:
+                return None
+            paths.append(match.group(1))
+    return paths
+
+
+def _is_attributable(files: typing.List[str], result: typing.Tuple[int, str]) -> bool:
+    """
+    Check if the failures of a `cargo fmt` invocation are attributed to specific files, which is the case if all the errors are located.
+    `cargo fmt` checks the package targets too, so a not valid target fails every invocation but it is located as well.
+    """
+    status, output = result
+    return status in (0, COMMAND_TIMEOUT_EXIT_CODE) or _error_paths(output) is not None
+
+
+def _not_valid_files(files: typing.List[str], output: str) -> typing.Set[str]:
+    """Files reported as not valid by a `cargo fmt` invocation on `files` (the located files are reported as passed to the tool)."""
+    error_paths = _error_paths(output)
+    if error_paths is None:
+        return set(files)
+    files_by_path = {os.path.realpath(filename): filename for filename in files}
+    return {files_by_path.get(os.path.realpath(path), path) for path in error_paths}
+
+
+def _cargo_fmt_check_failures(result: typing.Tuple[int, str]) -> int:
+    """Number of files failing in a `cargo fmt --check` invocation (not valid files are reported as a single failure)."""
+    status, output = result
+    return len({line.split()[2] for line in output.splitlines() if line.startswith("Diff in ")}) or (1 if status != 0 else 0)
 
 
 @rust_required
@@ -21,27 +130,127 @@ def pretty_format_rust(argv: typing.Optional[typing.List[str]] = None) -> int:
         dest="autofix",
         help="Automatically fixes encountered not-pretty-formatted files",
     )
+    add_changed_lines_only_argument(parser)
+    add_common_arguments(parser, file_extensions=(".rs",))
+    add_result_cache_argument(parser)
+    add_tool_invocation_arguments(parser)
+    add_max_concurrent_tools_argument(parser)
 
     parser.add_argument("filenames", nargs="*", help="Filenames to fix")
-    args = parser.parse_args(argv)
+    args = parse_arguments(parser, argv)
 
     rust_toolchain_version = getenv("RUST_TOOLCHAIN", "stable")
+    # The toolchain name (ie. stable) does not identify the rustfmt version, so the runs are attributed to the rustfmt executable
+    rustfmt_identity = _rustfmt_identity(rust_toolchain_version)
+    run_recorder = RunRecorder(
+        "pretty-format-rust", tool_version=rustfmt_identity, enabled=args.record_run_history, memory_report=args.memory_report
+    )
+    run_recorder.add_files(args.filenames)
+    tool_slots = ToolSlots(args.max_concurrent_tools)
+
+    if has_no_selected_files(args):
+        return run_recorder.save(0)
+
+    changed_line_ranges = staged_changed_line_ranges(args.filenames) if args.changed_lines_only else None
+    if changed_line_ranges is not None and not changed_line_ranges:
+        return run_recorder.save(0)
+    filenames = args.filenames if changed_line_ranges is None else list(changed_line_ranges)
+    file_lines_arguments = _file_lines_arguments(changed_line_ranges)
+
+    # Line ranges are checked only on the changed lines, so the results are not cached in such case
+    rustfmt_cache = (
+        clean_files_cache(
+            args.result_cache,
+            run_recorder.hook_name,
+            tool_version=rustfmt_identity,
+            config_file_names=("rustfmt.toml", ".rustfmt.toml", "Cargo.toml"),
+        )
+        if changed_line_ranges is None
+        else None
+    )
+    if rustfmt_cache is not None:
+        with run_recorder.phase("cache-lookup"):
+            filenames = rustfmt_cache.drop_clean_files(args.filenames)
+        run_recorder.record_cache_lookups(lookups=len(args.filenames), hits=len(args.filenames) - len(filenames))
+        if not filenames:
+            return run_recorder.save(0)
+
     # Check
-    status_code, output = run_command("cargo", "+{}".format(rust_toolchain_version), "fmt", "--", "--check", *args.filenames)
+    cost_model = CostModel(run_recorder.hook_name)
+    status_code, output = 0, ""
+    checked_files: typing.List[str] = []
+    not_valid_files: typing.Set[str] = set()
+    for batch in args.time_budget.batches(filenames):
+        if args.failure_limit.is_reached():
+            args.failure_limit.skip(batch)
+            continue
+        cmd_args = ["cargo", "+{}".format(rust_toolchain_version), "fmt", "--", "--check", *file_lines_arguments]
+        chunks = invocation_chunks(args, cmd_args, batch, cost_model)
+        with run_recorder.phase("cargo-fmt-check"):
+            results = run_commands(
+                [cmd_args + chunk for chunk in chunks],
+                concurrency=args.jobs,
+                timeout=args.tool_timeout,
+                tool_slots=tool_slots,
+                stop=lambda _, result: args.failure_limit.record(_cargo_fmt_check_failures(result)),
+            )
+        invocations = args.failure_limit.skip_cancelled(zip(chunks, results))
+        # Once the failure limit is reached the invocations failing due to not valid files are not bisected
+        if not args.failure_limit.is_reached():
+            with run_recorder.phase("cargo-fmt-isolate"):
+                invocations = isolate_failures(
+                    invocations,
+                    command=lambda files: cmd_args + files,
+                    is_attributable=_is_attributable,
+                    concurrency=args.jobs,
+                    timeout=args.tool_timeout,
+                    tool_slots=tool_slots,
+                )
+        for files, result in invocations:
+            if len(files) == 1 and not _is_attributable(files, result):
+                not_valid_files.update(files)
+                continue
+            invocation_not_valid_files = _not_valid_files(files, result[1]) if _is_attributable(files, result) else set()
+            not_valid_files.update(invocation_not_valid_files)
+            checked_files.extend(filename for filename in files if filename not in invocation_not_valid_files)
+            status_code = status_code or result[0]
+            output += result[1]
     not_well_formatted_files = sorted(line.split()[2] for line in output.splitlines() if line.startswith("Diff in "))
-    if not_well_formatted_files:
+
+    if rustfmt_cache is not None:
+        not_well_formatted_paths = _not_well_formatted_paths(output)
+        if not_well_formatted_paths is not None:
+            with run_recorder.phase("cache-store"):
+                rustfmt_cache.store_clean_files(
+                    filename for filename in checked_files if os.path.realpath(filename) not in not_well_formatted_paths
+                )
+
+    # At most --max-failures files are reported (--autofix has no failure limit)
+    reported_not_valid_files = args.failure_limit.truncate(sorted(not_valid_files))
+    if reported_not_valid_files:
+        print("The following files are not valid rust source files: {}".format(", ".join(reported_not_valid_files)))
+    reported_not_well_formatted_files = args.failure_limit.truncate(not_well_formatted_files)
+    if reported_not_well_formatted_files:
         print(
             "{}: {}".format(
                 "The following files have been fixed by cargo format" if args.autofix else "The following files are not properly formatted",
-                ", ".join(not_well_formatted_files),
+                ", ".join(reported_not_well_formatted_files),
             ),
         )
-        if args.autofix:
-            run_command("cargo", "+{}".format(rust_toolchain_version), "fmt", "--", *not_well_formatted_files)
-    elif status_code != 0:
-        print("Detected not valid rust source files among {}".format("\n".join(sorted(args.filenames))))
+    if not_well_formatted_files and args.autofix:
+        with run_recorder.phase("cargo-fmt"):
+            run_command_in_chunks(
+                ["cargo", "+{}".format(rust_toolchain_version), "fmt", "--", *file_lines_arguments],
+                not_well_formatted_files,
+                tool_slots=tool_slots,
+            )
 
-    return 1 if status_code != 0 or not_well_formatted_files else 0
+    run_recorder.record_tool_slots_wait(tool_slots)
+    return run_recorder.save(
+        args.time_budget.exit_status(
+            args.failure_limit.exit_status(1 if status_code != 0 or not_well_formatted_files or not_valid_files else 0)
+        ),
+    )
 
 
 if __name__ == "__main__":
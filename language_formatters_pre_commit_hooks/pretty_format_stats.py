@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import statistics
+import sys
+import typing
+
+from language_formatters_pre_commit_hooks.run_history import load_runs
+from language_formatters_pre_commit_hooks.run_history import RunRecord
+
+
+def _percentile(values: typing.Sequence[float], percentile: float) -> float:
+    """Percentile of `values` via linear interpolation between the closest ranks."""
+    sorted_values = sorted(values)
+    position = (len(sorted_values) - 1) * percentile / 100
+    lower_index = int(position)
+    upper_index = min(lower_index + 1, len(sorted_values) - 1)
+    return sorted_values[lower_index] + (sorted_values[upper_index] - sorted_values[lower_index]) * (position - lower_index)
+
+
+def _time_per_file(run: RunRecord) -> float:
+    return run.wall_time / max(run.file_count, 1)
+
+
+def _group_by_tool_version(runs: typing.Iterable[RunRecord]) -> typing.Dict[str, typing.List[RunRecord]]:
+    """Group runs by tool version, preserving the order in which versions have been used first."""
+    groups: typing.Dict[str, typing.List[RunRecord]] = {}
+    for run in runs:
+        groups.setdefault(run.tool_version or "unknown", []).append(run)
+    return groups
+
+
+def _find_regressions(
+    hook_name: str,
+    runs_by_tool_version: typing.Dict[str, typing.List[RunRecord]],
+    threshold: float,
+) -> typing.List[str]:
+    """
+    Compare the median wall time per file of consecutive tool versions.
+    The time is normalized by the number of files so that growing repositories do not report false positives.
+    """
+    regressions = []
+    versions = list(runs_by_tool_version)
+    for previous_version, version in zip(versions, versions[1:]):
+        previous_median = statistics.median(_time_per_file(run) for run in runs_by_tool_version[previous_version])
+        median = statistics.median(_time_per_file(run) for run in runs_by_tool_version[version])
+        if previous_median > 0 and median > previous_median * (1 + threshold):
+            regressions.append(
+                "{hook_name}: median time per file went from {previous:.4f}s ({previous_version}) to {current:.4f}s ({version}), "
+                "+{increase:.0%}".format(
+                    hook_name=hook_name,
+                    previous=previous_median,
+                    previous_version=previous_version,
+                    current=median,
+                    version=version,
+                    increase=median / previous_median - 1,
+                ),
+            )
+    return regressions
+
+
+def pretty_format_stats(argv: typing.Optional[typing.List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Summarize the run history recorded via --record-run-history")
+    parser.add_argument(
+        "--hook",
+        dest="hook_name",
+        help="Report only the runs of the given hook (ie. pretty-format-kotlin)",
+    )
+    parser.add_argument(
+        "--regression-threshold",
+        type=float,
+        default=0.2,
+        help="Relative increase of the median time per file that is reported as regression (default %(default)s)",
+    )
+    args = parser.parse_args(argv)
+
+    runs = load_runs(hook_name=args.hook_name)
+    if not runs:
+        print("No run history recorded. Run the hooks with --record-run-history to collect it.")
+        return 0
+
+    runs_by_hook: typing.Dict[str, typing.List[RunRecord]] = {}
+    for run in runs:
+        runs_by_hook.setdefault(run.hook_name, []).append(run)
+
+    print(
+        "{:<22} {:<14} {:>5} {:>8} {:>10} {:>10} {:>10} {:>12} {:>10}".format(
+            "hook",
+            "tool version",
+            "runs",
+            "files",
+            "p50[s]",
+            "p90[s]",
+            "p99[s]",
+            "p50/file[s]",
+            "cache hit",
+        ),
+    )
+
+    regressions = []
+    for hook_name, hook_runs in sorted(runs_by_hook.items()):
+        runs_by_tool_version = _group_by_tool_version(hook_runs)
+        for tool_version, version_runs in runs_by_tool_version.items():
+            wall_times = [run.wall_time for run in version_runs]
+            cache_hit_rates = [run.cache_hit_rate for run in version_runs if run.cache_hit_rate is not None]
+            print(
+                "{:<22} {:<14} {:>5} {:>8} {:>10.3f} {:>10.3f} {:>10.3f} {:>12.4f} {:>10}".format(
+                    hook_name,
+                    tool_version,
+                    len(version_runs),
+                    int(statistics.median(run.file_count for run in version_runs)),
+                    _percentile(wall_times, 50),
+                    _percentile(wall_times, 90),
+                    _percentile(wall_times, 99),
+                    statistics.median(_time_per_file(run) for run in version_runs),
+                    "{:.0%}".format(statistics.mean(cache_hit_rates)) if cache_hit_rates else "-",
+                ),
+            )
+            phases = sorted({phase for run in version_runs for phase in run.phase_durations})
+            for phase in phases:
+                print(
+                    "    phase {phase:<30} p50={p50:.3f}s p90={p90:.3f}s".format(
+                        phase=phase,
+                        p50=_percentile([run.phase_durations.get(phase, 0) for run in version_runs], 50),
+                        p90=_percentile([run.phase_durations.get(phase, 0) for run in version_runs], 90),
+                    ),
+                )
+        regressions.extend(_find_regressions(hook_name, runs_by_tool_version, args.regression_threshold))
+
+    if regressions:
+        print("\nPerformance regressions between tool versions:")
+        for regression in regressions:
+            print("  {}".format(regression))
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(pretty_format_stats())
@@ -4,16 +4,29 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import argparse
-import io
 import sys
 import typing
 
 from toml_sort import TomlSort
 from tomlkit.exceptions import ParseError
 
+from language_formatters_pre_commit_hooks import _get_library_version
+from language_formatters_pre_commit_hooks.cli import add_common_arguments
+from language_formatters_pre_commit_hooks.cli import add_diff_argument
+from language_formatters_pre_commit_hooks.cli import add_from_index_argument
+from language_formatters_pre_commit_hooks.cli import add_io_threads_arguments
+from language_formatters_pre_commit_hooks.cli import add_result_cache_argument
+from language_formatters_pre_commit_hooks.cli import parse_arguments
+from language_formatters_pre_commit_hooks.formatting import format_files
+from language_formatters_pre_commit_hooks.run_history import RunRecorder
 from language_formatters_pre_commit_hooks.utils import remove_trailing_whitespaces_and_set_new_line_ending
 
 
+def _format_toml(string_content: str) -> str:
+    prettified_content = TomlSort(string_content, only_sort_tables=True).sorted()
+    return remove_trailing_whitespaces_and_set_new_line_ending(prettified_content)
+
+
 def pretty_format_toml(argv: typing.Optional[typing.List[str]] = None) -> int:
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -22,33 +35,31 @@ def pretty_format_toml(argv: typing.Optional[typing.List[str]] = None) -> int:
         dest="autofix",
         help="Automatically fixes encountered not-pretty-formatted files",
     )
+    add_common_arguments(parser, file_extensions=(".toml",))
+    add_diff_argument(parser)
+    add_from_index_argument(parser)
+    add_io_threads_arguments(parser)
+    add_result_cache_argument(parser)
 
     parser.add_argument("filenames", nargs="*", help="Filenames to fix")
-    args = parser.parse_args(argv)
-
-    status = 0
-
-    for toml_file in set(args.filenames):
-        with open(toml_file) as input_file:
-            string_content = "".join(input_file.readlines())
+    args = parse_arguments(parser, argv)
 
-        try:
-            prettified_content = TomlSort(string_content, only_sort_tables=True).sorted()
-            prettified_content = remove_trailing_whitespaces_and_set_new_line_ending(prettified_content)
-            if string_content != prettified_content:
-                print("File {} is not pretty-formatted".format(toml_file))
-
-                if args.autofix:
-                    print("Fixing file {}".format(toml_file))
-                    with io.open(toml_file, "w", encoding="UTF-8") as output_file:
-                        output_file.write(prettified_content)
-
-                status = 1
-        except ParseError:
-            print("Input File {} is not a valid TOML file".format(toml_file))
-            return 1
+    run_recorder = RunRecorder(
+        "pretty-format-toml",
+        tool_version=_get_library_version("toml-sort"),
+        enabled=args.record_run_history,
+        memory_report=args.memory_report,
+    )
+    run_recorder.add_files(args.filenames)
 
-    return status
+    status = format_files(
+        args,
+        format_content=_format_toml,
+        parse_errors=(ParseError,),
+        invalid_file_message="Input File {filename} is not a valid TOML file",
+        run_recorder=run_recorder,
+    )
+    return run_recorder.save(status)
 
 
 if __name__ == "__main__":
@@ -4,17 +4,202 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import argparse
+import functools
 import io
 import re
 import sys
 import typing
+from concurrent.futures import Executor
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
 from sys import maxsize
 
 from ruamel.yaml import YAML
 from ruamel.yaml.error import YAMLError
+from ruamel.yaml.nodes import ScalarNode
 
+from language_formatters_pre_commit_hooks import _get_library_version
+from language_formatters_pre_commit_hooks.cli import add_common_arguments
+from language_formatters_pre_commit_hooks.cli import add_diff_argument
+from language_formatters_pre_commit_hooks.cli import add_from_index_argument
+from language_formatters_pre_commit_hooks.cli import add_io_threads_arguments
+from language_formatters_pre_commit_hooks.cli import add_result_cache_argument
+from language_formatters_pre_commit_hooks.cli import parse_arguments
+from language_formatters_pre_commit_hooks.cli import positive_int_type
+from language_formatters_pre_commit_hooks.formatting import format_files
+from language_formatters_pre_commit_hooks.run_history import RunRecorder
 
-def _process_single_document(document: str, yaml: YAML) -> str:
+
+# Characters that could be part of a plain scalar without changing its meaning or requiring quotes.
+# The set is intentionally restricted, scalars containing other characters are checked via the full round-trip.
+# Scalars starting like document markers (`...` and `---`) are quoted by the dumper, so they are excluded as well.
+_PLAIN_SCALAR_CHARACTERS = r"A-Za-z0-9_./$()@%+=,;^~-"
+_PLAIN_SCALAR = r"(?!\.\.\.|---)[A-Za-z0-9_/.$(](?:[{characters}]|[: ](?=[{characters}]))*".format(characters=_PLAIN_SCALAR_CHARACTERS)
+# Quoted scalars are considered only if --preserve-quotes is set and if they have no escape sequences
+_QUOTED_SCALAR = r"'[^'\n]*'|\"[^\"\\\n]*\""
+_COMMENT = r"(?: +#.*)?"
+# Files smaller than this are formatted serially even if --document-jobs is used, as they are faster to format than to transfer
+PARALLEL_DOCUMENTS_MIN_SIZE = 64 * 1024
+# Number of chunks of documents submitted to each --document-jobs worker, more chunks balance the load better
+_CHUNKS_PER_DOCUMENT_WORKER = 4
+
+
+class _Token(typing.NamedTuple):
+    column: int
+    kind: str  # "-" (sequence entry), "key" (mapping entry) or "scalar" (sequence item)
+    key: typing.Optional[str] = None
+    has_value: bool = False
+
+
+class _PrettyFormattedDocumentScanner(object):
+    """
+    Fast check of the YAML documents that are already pretty-formatted.
+
+    The scanner tokenizes the document lines and validates the properties enforced by the
+    `ruamel.yaml` dumper: block style only, indentation width, sequence dash offset (0),
+    spacing after `-` and `:`, no trailing whitespaces, no quotes (unless preserved) and no
+    scalars whose representation would be normalized (ie. `~`, `True`, `+1`).
+
+    The scanner is conservative: if it cannot guarantee that the dumper would output the
+    document unmodified (or if the document might be not valid, ie. duplicated keys) it
+    reports the document as not pretty-formatted, so the full round-trip is performed.
+    """
+
+    def __init__(self, yaml: YAML, indent: int) -> None:
+        self.indent = indent
+        self.resolver = yaml.resolver
+        scalar = "{plain}|{quoted}".format(plain=_PLAIN_SCALAR, quoted=_QUOTED_SCALAR) if yaml.preserve_quotes else _PLAIN_SCALAR
+        self._key_line = re.compile(r"(?P<key>{scalar}):(?: (?P<value>{scalar}))?{comment}$".format(scalar=scalar, comment=_COMMENT))
+        self._scalar_line = re.compile(r"(?P<value>{scalar}){comment}$".format(scalar=scalar, comment=_COMMENT))
+        self._dash = "-" + " " * (indent - 1)
+
+    def _is_stable_scalar(self, value: str, is_key: bool) -> bool:
+        """Check that the dumper would represent `value` exactly as it is."""
+        if value[0] in "'\"":
+            return True
+        tag = self.resolver.resolve(ScalarNode, value, (True, False))
+        if tag == "tag:yaml.org,2002:str":
+            return True
+        elif is_key:
+            return False
+        elif tag == "tag:yaml.org,2002:bool":
+            return value in ("true", "false")
+        elif tag == "tag:yaml.org,2002:int":
+            return re.match(r"^(0|[1-9][0-9]*)$", value) is not None
+        elif tag == "tag:yaml.org,2002:float":
+            return re.match(r"^[0-9]+\.[0-9]+$", value) is not None and value == repr(float(value))
+        return False
+
+    @staticmethod
+    def _scalar_value(scalar: str) -> str:
+        """Value of a plain or quoted scalar (quoted scalars with escape sequences are never tokenized), used to detect duplicated keys."""
+        if scalar[0] == "'":
+            return scalar[1:-1].replace("''", "'")
+        elif scalar[0] == '"':
+            return scalar[1:-1]
+        return scalar
+
+    def _tokenize(self, document: str) -> typing.Optional[typing.List[_Token]]:
+        if not document.endswith("\n") or document.startswith("\n"):
+            return None
+
+        tokens = []
+        for line in document[:-1].split("\n"):
+            content = line.lstrip(" ")
+            if not content or content[0] == "#":
+                # Blank lines and comments are preserved by the dumper
+                if line != line.rstrip():
+                    return None
+                continue
+
+            column = len(line) - len(content)
+            is_sequence_item = False
+            while content[0] == "-":
+                if not content.startswith(self._dash) or len(content) <= self.indent or content[self.indent] == " ":
+                    return None
+                tokens.append(_Token(column=column, kind="-"))
+                column += self.indent
+                content = content[self.indent :]
+                is_sequence_item = True
+
+            key_match = self._key_line.match(content)
+            if key_match:
+                key, value = key_match.group("key"), key_match.group("value")
+                if not self._is_stable_scalar(key, is_key=True) or (value is not None and not self._is_stable_scalar(value, is_key=False)):
+                    return None
+                tokens.append(_Token(column=column, kind="key", key=self._scalar_value(key), has_value=value is not None))
+                continue
+
+            scalar_match = self._scalar_line.match(content)
+            if is_sequence_item and scalar_match and self._is_stable_scalar(scalar_match.group("value"), is_key=False):
+                tokens.append(_Token(column=column, kind="scalar"))
+                continue
+
+            return None
+
+        return tokens
+
+    def _scan_mapping(self, tokens: typing.List[_Token], position: int, column: int) -> typing.Optional[int]:
+        keys = set()
+        while position < len(tokens) and tokens[position].column == column and tokens[position].kind == "key":
+            token = tokens[position]
+            if token.key in keys:
+                return None
+            keys.add(token.key)
+            position += 1
+
+            if not token.has_value and position < len(tokens):
+                next_token = tokens[position]
+                if next_token.kind == "-" and next_token.column == column:
+                    next_position = self._scan_sequence(tokens, position, column)
+                elif next_token.kind == "key" and next_token.column == column + self.indent:
+                    next_position = self._scan_mapping(tokens, position, column + self.indent)
+                elif next_token.column > column:
+                    return None
+                else:
+                    # Empty value
+                    next_position = position
+
+                if next_position is None:
+                    return None
+                position = next_position
+
+        return position
+
+    def _scan_sequence(self, tokens: typing.List[_Token], position: int, column: int) -> typing.Optional[int]:
+        while position < len(tokens) and tokens[position].column == column and tokens[position].kind == "-":
+            # Sequence entries are always followed by a token on the same line
+            item = tokens[position + 1]
+            if item.kind == "scalar":
+                next_position: typing.Optional[int] = position + 2
+            elif item.kind == "-":
+                next_position = self._scan_sequence(tokens, position + 1, item.column)
+            else:
+                next_position = self._scan_mapping(tokens, position + 1, item.column)
+
+            if next_position is None:
+                return None
+            position = next_position
+
+        return position
+
+    def is_pretty_formatted(self, document: str) -> bool:
+        tokens = self._tokenize(document)
+        if not tokens:
+            return False
+
+        if tokens[0].kind == "-":
+            position = self._scan_sequence(tokens, 0, 0)
+        else:
+            position = self._scan_mapping(tokens, 0, 0)
+        return position == len(tokens)
+
+
+def _process_single_document(
+    document: str,
+    yaml: YAML,
+    scanner: typing.Optional[_PrettyFormattedDocumentScanner] = None,
+) -> str:
     """Pretty format one YAML document.
 
     This is needed in order to prevent `ruamel.yaml` to interfere with documents that have primitive types on the document root.
@@ -23,9 +208,13 @@ def _process_single_document(document: str, yaml: YAML) -> str:
     Args:
         document (str): Original document content.
         yaml: YAML library instance.
+        scanner: fast check of already pretty-formatted documents, which allows to skip the round-trip.
     Returns:
         Pretty-formatted content (str).
     """
+    if scanner is not None and scanner.is_pretty_formatted(document):
+        return document
+
     content = yaml.load(document)
     if isinstance(content, (list, dict)):
         pretty_output = io.StringIO()
@@ -36,6 +225,71 @@ def _process_single_document(document: str, yaml: YAML) -> str:
         return str(document)
 
 
+def _process_documents(
+    documents: typing.List[str],
+    yaml: YAML,
+    scanner: typing.Optional[_PrettyFormattedDocumentScanner] = None,
+) -> typing.List[str]:
+    return [_process_single_document(document, yaml, scanner) for document in documents]
+
+
+def _document_chunks(documents: typing.List[str], count: int) -> typing.List[typing.List[str]]:
+    """Split `documents` into, at most, `count` chunks of consecutive documents with similar size."""
+    chunk_size = sum(len(document) for document in documents) / count
+    chunks: typing.List[typing.List[str]] = [[]]
+    size = 0
+    for document in documents:
+        if chunks[-1] and size >= chunk_size * len(chunks):
+            chunks.append([])
+        chunks[-1].append(document)
+        size += len(document)
+    return chunks
+
+
+def _format_yaml(
+    string_content: str,
+    yaml: YAML,
+    scanner: typing.Optional[_PrettyFormattedDocumentScanner] = None,
+    document_executor: typing.Optional[Executor] = None,
+    document_jobs: int = 1,
+) -> str:
+    separator = "---\n"
+
+    # Split multi-document file into individual documents
+    #
+    # Not using yaml.load_all() because it reformats primitive (non-YAML) content. It removes
+    # newline characters.
+    separator_pattern = r"^---\s*\n"
+    original_docs = re.split(separator_pattern, string_content, flags=re.MULTILINE)
+
+    # A valid multi-document YAML file might starts with the separator.
+    # In this case the first document of original docs will be empty and should not be consdered
+    if string_content.startswith("---"):
+        original_docs = original_docs[1:]
+
+    if document_executor is not None and len(original_docs) > 1 and len(string_content) >= PARALLEL_DOCUMENTS_MIN_SIZE:
+        # Documents are independent, so formatting chunks of them in the workers and concatenating the results
+        # (in the original order) is equivalent to formatting them one after the other
+        futures = [
+            document_executor.submit(_process_documents, chunk, yaml, scanner)
+            for chunk in _document_chunks(original_docs, document_jobs * _CHUNKS_PER_DOCUMENT_WORKER)
+        ]
+        processed_docs = [document for future in futures for document in future.result()]
+    else:
+        processed_docs = _process_documents(original_docs, yaml, scanner)
+
+    pretty_docs = []
+
+    for content in processed_docs:
+        if content is not None:
+            pretty_docs.append(content)
+
+    # Start multi-doc file with separator
+    pretty_content = "" if len(pretty_docs) == 1 else separator
+    pretty_content += separator.join(pretty_docs)
+    return pretty_content
+
+
 def pretty_format_yaml(argv: typing.Optional[typing.List[str]] = None) -> int:
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -56,11 +310,25 @@ def pretty_format_yaml(argv: typing.Optional[typing.List[str]] = None) -> int:
         dest="preserve_quotes",
         help="Keep existing string quoting",
     )
+    parser.add_argument(
+        "--document-jobs",
+        type=positive_int_type,
+        default=1,
+        dest="document_jobs",
+        metavar="N",
+        help="Format the documents of large multi-document files in up to N parallel processes (default: %(default)s). "
+        "It can not be combined with --jobs",
+    )
+    add_common_arguments(parser, file_extensions=(".yaml", ".yml"))
+    add_diff_argument(parser)
+    add_from_index_argument(parser)
+    add_io_threads_arguments(parser)
+    add_result_cache_argument(parser)
 
     parser.add_argument("filenames", nargs="*", help="Filenames to fix")
-    args = parser.parse_args(argv)
-
-    status = 0
+    args = parse_arguments(parser, argv)
+    if args.jobs > 1 and args.document_jobs > 1:
+        parser.error("--document-jobs can not be combined with --jobs")
 
     yaml = YAML()
     yaml.indent = args.indent
@@ -68,54 +336,33 @@ def pretty_format_yaml(argv: typing.Optional[typing.List[str]] = None) -> int:
     # Prevent ruamel.yaml to wrap yaml lines
     yaml.width = maxsize
 
-    separator = "---\n"
+    scanner = _PrettyFormattedDocumentScanner(yaml, indent=args.indent) if args.indent >= 2 else None
+
+    run_recorder = RunRecorder(
+        "pretty-format-yaml",
+        tool_version=_get_library_version("ruamel.yaml"),
+        enabled=args.record_run_history,
+        memory_report=args.memory_report,
+    )
+    run_recorder.add_files(args.filenames)
 
-    for yaml_file in set(args.filenames):
-        with open(yaml_file) as input_file:
-            string_content = "".join(input_file.readlines())
-
-        # Split multi-document file into individual documents
-        #
-        # Not using yaml.load_all() because it reformats primitive (non-YAML) content. It removes
-        # newline characters.
-        separator_pattern = r"^---\s*\n"
-        original_docs = re.split(separator_pattern, string_content, flags=re.MULTILINE)
-
-        # A valid multi-document YAML file might starts with the separator.
-        # In this case the first document of original docs will be empty and should not be consdered
-        if string_content.startswith("---"):
-            original_docs = original_docs[1:]
-
-        pretty_docs = []
-
-        try:
-            for doc in original_docs:
-                content = _process_single_document(doc, yaml)
-                if content is not None:
-                    pretty_docs.append(content)
-
-            # Start multi-doc file with separator
-            pretty_content = "" if len(pretty_docs) == 1 else separator
-            pretty_content += separator.join(pretty_docs)
-
-            if string_content != pretty_content:
-                print("File {} is not pretty-formatted".format(yaml_file))
-
-                if args.autofix:
-                    print("Fixing file {}".format(yaml_file))
-                    with io.open(yaml_file, "w", encoding="UTF-8") as output_file:
-                        output_file.write(str(pretty_content))
-
-                status = 1
-        except YAMLError:  # pragma: no cover
-            print(
-                "Input File {} is not a valid YAML file, consider using check-yaml".format(
-                    yaml_file,
-                ),
-            )
-            return 1
-
-    return status
+    with ExitStack() as exit_stack:
+        document_executor = exit_stack.enter_context(ProcessPoolExecutor(max_workers=args.document_jobs)) if args.document_jobs > 1 else None
+        status = format_files(
+            args,
+            format_content=functools.partial(
+                _format_yaml,
+                yaml=yaml,
+                scanner=scanner,
+                document_executor=document_executor,
+                document_jobs=args.document_jobs,
+            ),
+            parse_errors=(YAMLError,),
+            invalid_file_message="Input File {filename} is not a valid YAML file, consider using check-yaml",
+            run_recorder=run_recorder,
+            cache_options={"indent": args.indent, "preserve_quotes": args.preserve_quotes},
+        )
+    return run_recorder.save(status)
 
 
 if __name__ == "__main__":
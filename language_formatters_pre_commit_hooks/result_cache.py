@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import abc
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from language_formatters_pre_commit_hooks import __version__
+
+
+# Environment variable that allows to configure the result cache without modifying the hooks arguments
+RESULT_CACHE_ENVIRONMENT_VARIABLE = "LANGUAGE_FORMATTERS_RESULT_CACHE"
+
+
+class CacheBackend(abc.ABC):
+    """Storage of the cached results. Failures of the storage should never be propagated to the hooks."""
+
+    @abc.abstractmethod
+    def get_many(self, keys: typing.Sequence[str]) -> typing.Dict[str, bytes]:  # pragma: no cover
+        """Retrieve the stored entries (key -> value) among `keys`, missing entries are not present in the returned dictionary."""
+
+    @abc.abstractmethod
+    def put_many(self, entries: typing.Dict[str, bytes]) -> None:  # pragma: no cover
+        """Store `entries` (key -> value)."""
+
+
+class DirectoryCacheBackend(CacheBackend):
+    """Cache stored on a directory, which could be local or shared across machines (ie. NFS)."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], key)
+
+    def get_many(self, keys: typing.Sequence[str]) -> typing.Dict[str, bytes]:
+        entries = {}
+        for key in keys:
+            try:
+                with open(self._entry_path(key), "rb") as f:
+                    entries[key] = f.read()
+            except OSError:
+                pass
+        return entries
+
+    def put_many(self, entries: typing.Dict[str, bytes]) -> None:
+        for key, value in entries.items():
+            entry_path = self._entry_path(key)
+            try:
+                os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+                # Write and rename, so concurrent readers never observe partial entries
+                with tempfile.NamedTemporaryFile(dir=os.path.dirname(entry_path), delete=False) as tmp_file:
+                    tmp_file.write(value)
+                os.replace(tmp_file.name, entry_path)
+            except OSError as e:
+                print("Unable to store result cache entry in {path}: {error}".format(path=self.path, error=e), file=sys.stderr)
+                return
+
+
+class HttpCacheBackend(CacheBackend):
+    """
+    Cache stored on a simple HTTP store, entries are read via `GET <url>/<key>` and written via `PUT <url>/<key>`.
+    The backend is disabled, for the rest of the run, on the first network failure so the
+    hooks fall back to computing the results locally without paying further timeouts.
+    """
+
+    def __init__(self, url: str, max_concurrent_requests: int = 8, timeout: float = 5) -> None:
+        self.url = url.rstrip("/")
+        self.max_concurrent_requests = max_concurrent_requests
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=max_concurrent_requests)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.available = True
+
+    def _disable(self, error: Exception) -> None:
+        if self.available:
+            print(
+                "Result cache {url} is not available, results will be computed locally: {error}".format(url=self.url, error=error),
+                file=sys.stderr,
+            )
+        self.available = False
+
+    def _get(self, key: str) -> typing.Optional[bytes]:
+        if not self.available:
+            return None
+        try:
+            response = self.session.get("{url}/{key}".format(url=self.url, key=key), timeout=self.timeout)
+            if response.status_code == 404:
+                return None
+            response.raise_for_status()
+            return typing.cast(bytes, response.content)
+        except requests.RequestException as e:
+            self._disable(e)
+            return None
+
+    def _put(self, item: typing.Tuple[str, bytes]) -> None:
+        if not self.available:
+            return
+        key, value = item
+        try:
+            self.session.put("{url}/{key}".format(url=self.url, key=key), data=value, timeout=self.timeout).raise_for_status()
+        except requests.RequestException as e:
+            self._disable(e)
+
+    def get_many(self, keys: typing.Sequence[str]) -> typing.Dict[str, bytes]:
+        with ThreadPoolExecutor(max_workers=self.max_concurrent_requests) as executor:
+            return {key: value for key, value in zip(keys, executor.map(self._get, keys)) if value is not None}
+
+    def put_many(self, entries: typing.Dict[str, bytes]) -> None:
+        with ThreadPoolExecutor(max_workers=self.max_concurrent_requests) as executor:
+            list(executor.map(self._put, entries.items()))
+
+
+def cache_backend_from_url(url: str) -> CacheBackend:
+    """Build the cache backend for `url`, which could be an HTTP(S) URL, a `file://` URL or a directory path."""
+    parsed_url = urlparse(url)
+    if parsed_url.scheme in ("http", "https"):
+        return HttpCacheBackend(url)
+    elif parsed_url.scheme == "file":
+        return DirectoryCacheBackend(url2pathname(parsed_url.path))
+    else:
+        return DirectoryCacheBackend(url)
+
+
+class FormatResult(typing.NamedTuple):
+    valid: bool
+    # None if the content was already pretty-formatted (or not valid)
+    pretty_content: typing.Optional[str] = None
+
+    def serialize(self) -> bytes:
+        return json.dumps({"valid": self.valid, "pretty_content": self.pretty_content}).encode("utf-8")
+
+    @classmethod
+    def deserialize(cls, value: bytes) -> typing.Optional["FormatResult"]:
+        try:
+            content = json.loads(value.decode("utf-8"))
+            return cls(valid=bool(content["valid"]), pretty_content=content["pretty_content"])
+        except (ValueError, KeyError, TypeError):
+            return None
+
+
+class ResultCache(object):
+    """
+    Cache of the formatting results keyed by file content, hook, tool version and hook options.
+    """
+
+    def __init__(
+        self,
+        backend: CacheBackend,
+        hook_name: str,
+        tool_version: typing.Optional[str],
+        options: typing.Optional[typing.Dict[str, typing.Any]] = None,
+    ) -> None:
+        self.backend = backend
+        self._key_prefix = json.dumps(
+            {
+                "hook": hook_name,
+                "hooks_version": __version__,
+                "tool_version": tool_version,
+                "options": options or {},
+            },
+            sort_keys=True,
+        )
+
+    def key(self, content: typing.Union[str, bytes]) -> str:
+        key_hash = hashlib.sha256(self._key_prefix.encode("utf-8"))
+        key_hash.update(b"\0")
+        key_hash.update(content.encode("utf-8") if isinstance(content, str) else content)
+        return key_hash.hexdigest()
+
+    def get_many(self, contents: typing.Dict[str, str]) -> typing.Dict[str, FormatResult]:
+        """Lookup, as a single batch, the cached results of the files in `contents` (filename -> content)."""
+        keys = {filename: self.key(content) for filename, content in contents.items()}
+        entries = self.backend.get_many(list(set(keys.values())))
+
+        results = {}
+        for filename, key in keys.items():
+            if key in entries:
+                result = FormatResult.deserialize(entries[key])
+                if result is not None:
+                    results[filename] = result
+        return results
+
+    def put_many(self, contents: typing.Dict[str, str], results: typing.Dict[str, FormatResult]) -> None:
+        """Store, as a single batch, the results of the files in `results` (filename -> result)."""
+        if results:
+            self.backend.put_many({self.key(contents[filename]): result.serialize() for filename, result in results.items()})
+
+
+def executable_identity(executable: str) -> typing.Optional[str]:
+    """
+    Identity of an executable (path, size and modification time), which changes if the tool is upgraded.
+    It allows to key the cached results of external tools without running them to retrieve their version.
+    """
+    path = shutil.which(executable)
+    if path is None:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:  # pragma: no cover
+        return None
+    return "{path}:{size}:{mtime}".format(path=os.path.realpath(path), size=stat.st_size, mtime=stat.st_mtime_ns)
+
+
+class CleanFilesCache(object):
+    """
+    Cache of the files verified as pretty-formatted by an external tool (ie. gofmt), used to not pass them to the tool again.
+
+    Entries are keyed by file content, hook, tool identity (`tool_version`), hook options and by the content of the
+    tool configuration files (`config_file_names`) found in the directory of the file or in its parents.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        hook_name: str,
+        tool_version: typing.Optional[str],
+        options: typing.Optional[typing.Dict[str, typing.Any]] = None,
+        config_file_names: typing.Sequence[str] = (),
+    ) -> None:
+        self.result_cache = ResultCache(cache_backend_from_url(url), hook_name=hook_name, tool_version=tool_version, options=options)
+        self.config_file_names = config_file_names
+        self._directory_configs: typing.Dict[str, bytes] = {}
+        self._keys: typing.Dict[str, str] = {}
+
+    def _directory_config(self, directory: str) -> bytes:
+        if directory not in self._directory_configs:
+            config = hashlib.sha256()
+            for config_file_name in self.config_file_names:
+                try:
+                    with open(os.path.join(directory, config_file_name), "rb") as f:
+                        config.update(config_file_name.encode("utf-8") + b"\0" + hashlib.sha256(f.read()).digest())
+                except OSError:
+                    pass
+            parent = os.path.dirname(directory)
+            self._directory_configs[directory] = config.digest() + (self._directory_config(parent) if parent != directory else b"")
+        return self._directory_configs[directory]
+
+    def _key(self, filename: str, path: str) -> typing.Optional[str]:
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+        except OSError:
+            return None
+        if self.config_file_names:
+            content += b"\0" + self._directory_config(os.path.dirname(os.path.abspath(filename)))
+        return self.result_cache.key(content)
+
+    def drop_clean_files(self, filenames: typing.Iterable[str], paths: typing.Optional[typing.Dict[str, str]] = None) -> typing.List[str]:
+        """
+        Filter out the files that have been verified as pretty-formatted by earlier runs.
+        The content is read from `paths[filename]` (ie. the staged content), if provided, instead of `filename`.
+        """
+        filenames = list(filenames)
+        for filename in filenames:
+            key = self._key(filename, paths[filename] if paths is not None else filename)
+            if key is not None:
+                self._keys[filename] = key
+        entries = self.result_cache.backend.get_many(list(set(self._keys.values())))
+
+        not_clean_files = []
+        for filename in filenames:
+            result = FormatResult.deserialize(entries[self._keys[filename]]) if self._keys.get(filename) in entries else None
+            if result is None or not result.valid or result.pretty_content is not None:
+                not_clean_files.append(filename)
+        return not_clean_files
+
+    def store_clean_files(self, filenames: typing.Iterable[str]) -> None:
+        """Record that `filenames`, looked up via `drop_clean_files`, have been verified as pretty-formatted."""
+        clean_result = FormatResult(valid=True).serialize()
+        entries = {self._keys[filename]: clean_result for filename in filenames if filename in self._keys}
+        if entries:
+            self.result_cache.backend.put_many(entries)
+
+
+def clean_files_cache(
+    url: typing.Optional[str],
+    hook_name: str,
+    tool_version: typing.Optional[str],
+    options: typing.Optional[typing.Dict[str, typing.Any]] = None,
+    config_file_names: typing.Sequence[str] = (),
+) -> typing.Optional[CleanFilesCache]:
+    """Cache of the files verified by an external tool, None if no cache is configured or if the tool could not be identified."""
+    if not url or not tool_version:
+        return None
+    return CleanFilesCache(url, hook_name=hook_name, tool_version=tool_version, options=options, config_file_names=config_file_names)
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+import os
+import sqlite3
+import sys
+import time
+import typing
+from contextlib import closing
+from contextlib import contextmanager
+
+from language_formatters_pre_commit_hooks.memory_report import MemoryProfiler
+from language_formatters_pre_commit_hooks.utils import _base_directory
+from language_formatters_pre_commit_hooks.utils import ToolSlots
+
+
+DATABASE_FILE_NAME = "language-formatters-run-history.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    hook_name TEXT NOT NULL,
+    tool_version TEXT,
+    started_at REAL NOT NULL,
+    file_count INTEGER NOT NULL,
+    total_bytes INTEGER NOT NULL,
+    wall_time REAL NOT NULL,
+    phase_durations TEXT NOT NULL,
+    cache_hit_rate REAL,
+    exit_status INTEGER NOT NULL
+)
+"""
+
+# Latest duration of the processing of each file, used to estimate the cost of processing it again
+_FILE_TIMINGS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS file_timings (
+    hook_name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    PRIMARY KEY (hook_name, path)
+)
+"""
+
+
+class RunRecord(typing.NamedTuple):
+    hook_name: str
+    tool_version: typing.Optional[str]
+    started_at: float
+    file_count: int
+    total_bytes: int
+    wall_time: float
+    phase_durations: typing.Dict[str, float]
+    cache_hit_rate: typing.Optional[float]
+    exit_status: int
+
+
+class FileTiming(typing.NamedTuple):
+    size: int
+    duration: float
+
+
+def _database_path() -> str:
+    return os.path.join(_base_directory(), DATABASE_FILE_NAME)
+
+
+def _connect(database_path: str) -> sqlite3.Connection:
+    if not os.path.exists(os.path.dirname(database_path)):  # pragma: no cover
+        os.makedirs(os.path.dirname(database_path))
+    # Multiple hooks might record their run at the same time (pre-commit runs hooks in parallel)
+    connection = sqlite3.connect(database_path, timeout=10)
+    connection.execute(_SCHEMA)
+    connection.execute(_FILE_TIMINGS_SCHEMA)
+    return connection
+
+
+class RunRecorder(object):
+    """
+    Collect the performance metrics of a single hook run.
+
+    Metrics are stored in a SQLite database within the pre-commit cache directory only if
+    the recorder is enabled (ie. `--record-run-history` is passed to the hook).
+    The memory usage is profiled, and written into `memory_report`, only if requested (ie. `--memory-report` is passed to the hook).
+    """
+
+    def __init__(
+        self,
+        hook_name: str,
+        tool_version: typing.Optional[str] = None,
+        enabled: bool = False,
+        memory_report: typing.Optional[str] = None,
+    ) -> None:
+        self.hook_name = hook_name
+        self.tool_version = tool_version
+        self.enabled = enabled
+        self.started_at = time.time()
+        self.file_count = 0
+        self.total_bytes = 0
+        self.phase_durations: typing.Dict[str, float] = {}
+        self.cache_hits = 0
+        self.cache_lookups = 0
+        self.file_timings: typing.Dict[str, FileTiming] = {}
+        self._start = time.perf_counter()
+        self.memory_profiler = MemoryProfiler(hook_name, memory_report) if memory_report else None
+
+    def add_files(self, filenames: typing.Iterable[str]) -> None:
+        if not self.enabled:
+            return
+        for filename in filenames:
+            self.file_count += 1
+            try:
+                self.total_bytes += os.path.getsize(filename)
+            except OSError:
+                pass
+
+    @contextmanager
+    def phase(self, name: str) -> typing.Generator[None, None, None]:
+        start = time.perf_counter()
+        try:
+            if self.memory_profiler is None:
+                yield
+            else:
+                with self.memory_profiler.phase(name):
+                    yield
+        finally:
+            self.phase_durations[name] = self.phase_durations.get(name, 0) + time.perf_counter() - start
+
+    @contextmanager
+    def file(self, filename: str) -> typing.Generator[None, None, None]:
+        """Context processing a single file, used to attribute the memory usage to the file."""
+        if self.memory_profiler is None:
+            yield
+        else:
+            with self.memory_profiler.file(filename):
+                yield
+
+    def record_file_timing(self, filename: str, size: int, duration: float) -> None:
+        """Record how long processing `filename` (of `size` bytes) took, so that next runs could schedule it (see scheduler.py)."""
+        if self.enabled:
+            self.file_timings[os.path.abspath(filename)] = FileTiming(size=size, duration=duration)
+
+    def record_cache_lookup(self, hit: bool) -> None:
+        self.cache_lookups += 1
+        if hit:
+            self.cache_hits += 1
+
+    def record_cache_lookups(self, lookups: int, hits: int) -> None:
+        self.cache_lookups += lookups
+        self.cache_hits += hits
+
+    def record_tool_slots_wait(self, tool_slots: ToolSlots) -> None:
+        """Record, and report, the time spent waiting for the machine-wide tool slots (see `--max-concurrent-tools`)."""
+        if tool_slots.waited_seconds > 0:
+            self.phase_durations["tool-slots-wait"] = self.phase_durations.get("tool-slots-wait", 0) + tool_slots.waited_seconds
+            print(
+                "Waited {seconds:.1f}s for other heavyweight tools to complete (at most {limit} run at the same time, "
+                "see --max-concurrent-tools)".format(seconds=tool_slots.waited_seconds, limit=tool_slots.limit),
+                file=sys.stderr,
+            )
+
+    @property
+    def cache_hit_rate(self) -> typing.Optional[float]:
+        if self.cache_lookups == 0:
+            return None
+        return self.cache_hits / self.cache_lookups
+
+    def save(self, exit_status: int) -> int:
+        """
+        Store the run metrics, if enabled, and return `exit_status`.
+        Failures while storing the metrics are reported but they never affect the hook outcome.
+        """
+        if self.memory_profiler is not None:
+            self.memory_profiler.save()
+
+        if not self.enabled:
+            return exit_status
+
+        record = RunRecord(
+            hook_name=self.hook_name,
+            tool_version=self.tool_version,
+            started_at=self.started_at,
+            file_count=self.file_count,
+            total_bytes=self.total_bytes,
+            wall_time=time.perf_counter() - self._start,
+            phase_durations=self.phase_durations,
+            cache_hit_rate=self.cache_hit_rate,
+            exit_status=exit_status,
+        )
+        try:
+            with closing(_connect(_database_path())) as connection, connection:
+                connection.execute(
+                    "INSERT INTO runs ("
+                    "hook_name, tool_version, started_at, file_count, total_bytes, wall_time, phase_durations, cache_hit_rate, exit_status"
+                    ") VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        record.hook_name,
+                        record.tool_version,
+                        record.started_at,
+                        record.file_count,
+                        record.total_bytes,
+                        record.wall_time,
+                        json.dumps(record.phase_durations, sort_keys=True),
+                        record.cache_hit_rate,
+                        record.exit_status,
+                    ),
+                )
+                connection.executemany(
+                    "INSERT OR REPLACE INTO file_timings (hook_name, path, size, duration) VALUES (?, ?, ?, ?)",
+                    [(record.hook_name, path, timing.size, timing.duration) for path, timing in self.file_timings.items()],
+                )
+        except sqlite3.Error as e:  # pragma: no cover
+            print("Unable to record run history: {error}".format(error=e), file=sys.stderr)
+
+        return exit_status
+
+
+def load_runs(hook_name: typing.Optional[str] = None) -> typing.List[RunRecord]:
+    """Load the recorded runs, sorted by start time."""
+    database_path = _database_path()
+    if not os.path.exists(database_path):
+        return []
+
+    query = (
+        "SELECT hook_name, tool_version, started_at, file_count, total_bytes, wall_time, phase_durations, cache_hit_rate, exit_status "
+        "FROM runs"
+    )
+    parameters: typing.Tuple[str, ...] = ()
+    if hook_name is not None:
+        query += " WHERE hook_name = ?"
+        parameters = (hook_name,)
+    query += " ORDER BY started_at"
+
+    with closing(_connect(database_path)) as connection:
+        return [
+            RunRecord(
+                hook_name=row[0],
+                tool_version=row[1],
+                started_at=row[2],
+                file_count=row[3],
+                total_bytes=row[4],
+                wall_time=row[5],
+                phase_durations=json.loads(row[6]),
+                cache_hit_rate=row[7],
+                exit_status=row[8],
+            )
+            for row in connection.execute(query, parameters)
+        ]
+
+
+def load_file_timings(hook_name: str) -> typing.Dict[str, FileTiming]:
+    """Load the latest recorded timing of the files (by absolute path) processed by `hook_name`."""
+    database_path = _database_path()
+    if not os.path.exists(database_path):
+        return {}
+
+    with closing(_connect(database_path)) as connection:
+        return {
+            row[0]: FileTiming(size=row[1], duration=row[2])
+            for row in connection.execute("SELECT path, size, duration FROM file_timings WHERE hook_name = ?", (hook_name,))
+        }
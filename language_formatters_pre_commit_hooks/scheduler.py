@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import heapq
+import os
+import sqlite3
+import sys
+import typing
+
+from language_formatters_pre_commit_hooks.run_history import FileTiming
+from language_formatters_pre_commit_hooks.run_history import load_file_timings
+from language_formatters_pre_commit_hooks.utils import command_line_chunks
+
+
+# Estimated seconds needed to process a byte, if no timing has been recorded for the hook yet
+DEFAULT_SECONDS_PER_BYTE = 1e-6
+# Estimated fixed cost, in seconds, of processing a file
+FILE_OVERHEAD_SECONDS = 1e-4
+
+
+def _file_size(filename: str) -> int:
+    try:
+        return os.path.getsize(filename)
+    except OSError:
+        return 0
+
+
+class CostModel(object):
+    """
+    Estimate the time needed by a hook to process a file.
+
+    Files processed by earlier runs (recorded via `--record-run-history`) are estimated from their latest
+    duration, scaled by the change of their size. The other files are estimated from their size and the
+    median throughput of the files recorded for the hook.
+    The recorded timings are loaded on the first estimation, so the model is free if no scheduling is needed.
+    """
+
+    def __init__(self, hook_name: str) -> None:
+        self.hook_name = hook_name
+        self._timings: typing.Optional[typing.Dict[str, FileTiming]] = None
+        self._seconds_per_byte = DEFAULT_SECONDS_PER_BYTE
+
+    def _load(self) -> typing.Dict[str, FileTiming]:
+        if self._timings is None:
+            try:
+                self._timings = load_file_timings(self.hook_name)
+            except sqlite3.Error as e:  # pragma: no cover
+                print("Unable to load the recorded file timings: {error}".format(error=e), file=sys.stderr)
+                self._timings = {}
+            rates = sorted(timing.duration / timing.size for timing in self._timings.values() if timing.size > 0)
+            if rates:
+                self._seconds_per_byte = rates[len(rates) // 2]
+        return self._timings
+
+    def estimate(self, filename: str, size: typing.Optional[int] = None) -> float:
+        """Estimated seconds needed to process `filename`, whose size is looked up if not provided."""
+        timings = self._load()
+        if size is None:
+            size = _file_size(filename)
+
+        timing = timings.get(os.path.abspath(filename))
+        if timing is not None:
+            return timing.duration * (size / timing.size if timing.size else 1)
+        return FILE_OVERHEAD_SECONDS + size * self._seconds_per_byte
+
+
+def longest_first(costs: typing.Dict[str, float]) -> typing.List[str]:
+    """Files sorted by decreasing cost (ties keep the original order)."""
+    return sorted(costs, key=lambda filename: -costs[filename])
+
+
+def partition(costs: typing.Dict[str, float], count: int) -> typing.List[typing.List[str]]:
+    """
+    Split the files into, at most, `count` partitions with similar total cost.
+    Files are assigned longest-expected-first to the least loaded partition (LPT scheduling), which is
+    within 4/3 of the optimal makespan. Empty partitions are not returned.
+    """
+    partitions: typing.List[typing.List[str]] = [[] for _ in range(max(count, 1))]
+    loads = [(0.0, index) for index in range(len(partitions))]
+    for filename in longest_first(costs):
+        load, index = heapq.heappop(loads)
+        partitions[index].append(filename)
+        heapq.heappush(loads, (load + costs[filename], index))
+    return [files for files in partitions if files]
+
+
+def _bounded_chunks(
+    filenames: typing.List[str],
+    max_files: typing.Optional[int],
+    max_bytes: typing.Optional[int],
+) -> typing.Iterator[typing.List[str]]:
+    chunk: typing.List[str] = []
+    chunk_bytes = 0
+    for filename in filenames:
+        size = _file_size(filename) if max_bytes is not None else 0
+        if chunk and ((max_files is not None and len(chunk) >= max_files) or (max_bytes is not None and chunk_bytes + size > max_bytes)):
+            yield chunk
+            chunk, chunk_bytes = [], 0
+        chunk.append(filename)
+        chunk_bytes += size
+    if chunk:
+        yield chunk
+
+
+def invocation_chunks(
+    args: argparse.Namespace,
+    command: typing.Sequence[str],
+    filenames: typing.List[str],
+    cost_model: CostModel,
+    paths: typing.Optional[typing.Dict[str, str]] = None,
+    split_command_line: bool = True,
+) -> typing.List[typing.List[str]]:
+    """
+    Split `filenames` into the files to pass to each invocation of `command`.
+
+    Files are partitioned into up to `args.jobs` groups with similar expected cost (LPT scheduling), which are
+    split further so that each invocation receives at most `args.max_files_per_invocation` files and
+    `args.max_bytes_per_invocation` bytes and, if `split_command_line` is set, fits the command line length limit.
+    If `args.failure_limit` is set the invocations are bounded as well, so that the run can stop between them.
+    `paths` maps the filenames to the paths passed to the tool, if they differ (ie. staged copies).
+    Invocations are sorted longest-expected-first, as they are started in order.
+    A single invocation without files is returned if there are no files.
+    """
+    if not filenames:
+        return [[]]
+
+    costs = {filename: cost_model.estimate(filename) for filename in filenames} if args.jobs > 1 else {}
+    groups = partition(costs, args.jobs) if args.jobs > 1 else [filenames]
+    failure_limit = getattr(args, "failure_limit", None)
+    max_files_per_invocation = args.max_files_per_invocation
+    if failure_limit is not None:
+        max_files_per_invocation = failure_limit.max_files_per_invocation(max_files_per_invocation)
+
+    chunks = []
+    for group in groups:
+        for chunk in _bounded_chunks(group, max_files_per_invocation, args.max_bytes_per_invocation):
+            if not split_command_line:
+                chunks.append(chunk)
+                continue
+            chunk_paths = {paths[filename] if paths is not None else filename: filename for filename in chunk}
+            chunks.extend(
+                [chunk_paths[path] for path in command_line_chunk] for command_line_chunk in command_line_chunks(command, list(chunk_paths))
+            )
+
+    if costs:
+        chunks.sort(key=lambda chunk: -sum(costs[filename] for filename in chunk))
+    return chunks
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import time
+import typing
+
+
+# Exit status of the hooks that run out of time budget before checking all the files (and found no other issue)
+TIME_BUDGET_EXHAUSTED_EXIT_CODE = 3
+
+# Number of files passed at once to external tools if a time budget is set.
+# The budget is verified between tool invocations, as running processes are never interrupted.
+TIME_BUDGET_BATCH_SIZE = 32
+
+
+class TimeBudget(object):
+    """
+    Maximum amount of time that a hook should spend checking files, measured since the hook start.
+    A budget of None represents an unlimited budget.
+    """
+
+    def __init__(self, seconds: typing.Optional[float]) -> None:
+        self.deadline = None if seconds is None else time.monotonic() + seconds
+        self.unchecked_files: typing.List[str] = []
+
+    def is_exhausted(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def skip(self, filenames: typing.Iterable[str]) -> None:
+        """Record files that have not been checked due to the exhausted budget."""
+        self.unchecked_files.extend(filenames)
+
+    def batches(self, filenames: typing.Sequence[str], batch_size: int = TIME_BUDGET_BATCH_SIZE) -> typing.Iterator[typing.List[str]]:
+        """
+        Split `filenames` into the batches that should be processed, stopping once the budget is exhausted.
+        Without budget all the files are returned as a single batch.
+        """
+        if self.deadline is None:
+            yield list(filenames)
+            return
+
+        for start in range(0, len(filenames), batch_size):
+            if self.is_exhausted():
+                self.skip(filenames[start:])
+                return
+            yield list(filenames[start : start + batch_size])
+
+    def exit_status(self, status: int) -> int:
+        """Report the files that have not been checked and determine the exit status of the hook."""
+        if not self.unchecked_files:
+            return status
+
+        print(
+            "Time budget exhausted, the following files have not been checked: {}".format(", ".join(self.unchecked_files)),
+        )
+        return status or TIME_BUDGET_EXHAUSTED_EXIT_CODE
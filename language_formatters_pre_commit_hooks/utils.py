@@ -3,15 +3,52 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import asyncio
+import contextlib
+import glob
+import itertools
 import os
 import shutil
 import subprocess  # nosec: disable=B603
 import sys
 import tempfile
+import time
 import typing
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
 
 import requests
+from requests.adapters import HTTPAdapter
+
+if sys.platform == "win32":  # pragma: no cover
+    import msvcrt
+else:
+    import fcntl
+
+
+# Environment variable defining the base URL of a mirror of the downloaded artifacts.
+# The path of the original URL is appended to it (ie. https://mirror/google/google-java-format/releases/download/...)
+DOWNLOAD_MIRROR_ENVIRONMENT_VARIABLE = "LANGUAGE_FORMATTERS_DOWNLOAD_MIRROR"
+# Artifacts bigger than RANGED_DOWNLOAD_MIN_SIZE bytes are downloaded via DOWNLOAD_CONCURRENCY concurrent HTTP Range requests
+RANGED_DOWNLOAD_MIN_SIZE = 4 * 1024 * 1024
+DOWNLOAD_CONCURRENCY = 4
+DOWNLOAD_TIMEOUT = 60
+# Command line bytes reserved to the arguments added by the invoked tools to their subprocesses (ie. cargo fmt running rustfmt)
+COMMAND_LINE_MARGIN = 4096
+# Command line length limit used if the system one can not be retrieved (ARG_MAX on Linux is at least 128KB)
+_DEFAULT_ARG_MAX = 128 * 1024
+_WINDOWS_MAX_COMMAND_LINE_LENGTH = 32767
+# Exit status reported for the commands killed after exceeding their timeout (as timeout(1) does)
+COMMAND_TIMEOUT_EXIT_CODE = 124
+# Exit status reported for the commands killed, or never started, once the run is stopped early (see `run_commands`)
+COMMAND_CANCELLED_EXIT_CODE = -1
+# Environment variable limiting the heavyweight tools (ie. JVMs and cargo) running at the same time on the machine
+MAX_CONCURRENT_TOOLS_ENVIRONMENT_VARIABLE = "LANGUAGE_FORMATTERS_MAX_CONCURRENT_TOOLS"
+# Interval, in seconds, between two attempts to acquire a tool slot. It doubles after each attempt, up to the maximum
+_TOOL_SLOT_POLL_INTERVAL = 0.05
+_TOOL_SLOT_MAX_POLL_INTERVAL = 0.5
+
+_download_session: typing.Optional[requests.Session] = None
 
 
 def run_command(*command: str) -> typing.Tuple[int, str]:
@@ -31,6 +68,288 @@ def run_command(*command: str) -> typing.Tuple[int, str]:
     return return_code, output
 
 
+def _argument_length(argument: str) -> int:
+    if sys.platform == "win32":  # pragma: no cover
+        # Separator and quotes
+        return len(argument) + 3
+    # NUL terminator and argv (or envp) pointer
+    return len(os.fsencode(argument)) + 1 + 8
+
+
+def _max_command_line_length() -> int:
+    if sys.platform == "win32":  # pragma: no cover
+        return _WINDOWS_MAX_COMMAND_LINE_LENGTH - COMMAND_LINE_MARGIN
+    try:
+        arg_max = os.sysconf("SC_ARG_MAX")
+    except (OSError, ValueError):  # pragma: no cover
+        arg_max = -1
+    if arg_max <= 0:  # pragma: no cover
+        arg_max = _DEFAULT_ARG_MAX
+    # The environment shares the limit with the arguments
+    environment_length = sum(_argument_length("{}={}".format(key, value)) for key, value in os.environ.items())
+    return arg_max - environment_length - COMMAND_LINE_MARGIN
+
+
+def command_line_chunks(
+    command: typing.Sequence[str],
+    arguments: typing.Sequence[str],
+    max_length: typing.Optional[int] = None,
+) -> typing.Iterator[typing.List[str]]:
+    """
+    Split `arguments` into the fewest chunks that, appended to `command`, fit the command line length limit of the system.
+    At least one chunk is returned, and each chunk contains at least one argument (if any).
+    """
+    if max_length is None:
+        max_length = _max_command_line_length()
+    command_length = sum(_argument_length(argument) for argument in command)
+
+    chunk: typing.List[str] = []
+    chunk_length = command_length
+    for argument in arguments:
+        length = _argument_length(argument)
+        if chunk and chunk_length + length > max_length:
+            yield chunk
+            chunk, chunk_length = [], command_length
+        chunk.append(argument)
+        chunk_length += length
+    if chunk or not arguments:
+        yield chunk
+
+
+def fits_command_line(command: typing.Sequence[str], arguments: typing.Sequence[str]) -> bool:
+    return len(list(itertools.islice(command_line_chunks(command, arguments), 2))) == 1
+
+
+def _lock_file(f: typing.IO[bytes]) -> bool:
+    """Try to acquire, without blocking, an exclusive lock on `f`. Locks are released by the operating system if the process dies."""
+    try:
+        if sys.platform == "win32":  # pragma: no cover
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+def _unlock_file(f: typing.IO[bytes]) -> None:
+    if sys.platform == "win32":  # pragma: no cover
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class ToolSlots(object):
+    """
+    Machine-wide semaphore limiting the heavyweight tool processes (ie. JVMs and cargo) running at the same time.
+
+    Each of the `limit` tokens is a lock file within `_base_directory()`, so the tokens are shared by all the
+    hook processes (ie. the ones run in parallel by pre-commit) and they are released if a process dies.
+    A limit of None represents an unlimited number of tokens (no lock file is involved).
+    The wall-clock time during which at least one task waited for a token is accumulated in `waited_seconds`
+    (the waits of concurrent tasks overlap, so they are not added up).
+    """
+
+    def __init__(self, limit: typing.Optional[int] = None, directory: typing.Optional[str] = None) -> None:
+        self.limit = limit
+        self.directory = directory or os.path.join(_base_directory(), "tool-slots")
+        self.waited_seconds = 0.0
+        self._waiting_tasks = 0
+        self._waiting_since = 0.0
+
+    def try_acquire(self) -> typing.Optional[typing.IO[bytes]]:
+        """Acquire a free token, returning None if all the tokens are in use."""
+        os.makedirs(self.directory, exist_ok=True)
+        for index in range(self.limit or 0):
+            slot = open(os.path.join(self.directory, "slot-{}.lock".format(index)), "a+b")
+            if _lock_file(slot):
+                return slot
+            slot.close()
+        return None
+
+    async def acquire(self) -> typing.Optional[typing.IO[bytes]]:
+        """Wait for a free token, None is returned if the number of tokens is unlimited."""
+        if self.limit is None:
+            return None
+        slot = self.try_acquire()
+        if slot is not None:
+            return slot
+
+        if self._waiting_tasks == 0:
+            self._waiting_since = time.perf_counter()
+        self._waiting_tasks += 1
+        try:
+            poll_interval = _TOOL_SLOT_POLL_INTERVAL
+            while slot is None:
+                await asyncio.sleep(poll_interval)
+                poll_interval = min(poll_interval * 2, _TOOL_SLOT_MAX_POLL_INTERVAL)
+                slot = self.try_acquire()
+        finally:
+            self._waiting_tasks -= 1
+            if self._waiting_tasks == 0:
+                self.waited_seconds += time.perf_counter() - self._waiting_since
+        return slot
+
+    @staticmethod
+    def release(slot: typing.IO[bytes]) -> None:
+        _unlock_file(slot)
+        slot.close()
+
+
+async def _run_subprocess(command: typing.Sequence[str], timeout: typing.Optional[float]) -> typing.Tuple[int, str]:
+    print("[cwd={cwd}] Run command: {command}".format(command=tuple(command), cwd=os.getcwd()), file=sys.stderr)
+    process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT)
+    try:
+        stdout, _ = await asyncio.wait_for(process.communicate(), timeout)
+        return_code, output = typing.cast(int, process.returncode), stdout.decode("utf-8")
+    except asyncio.TimeoutError:
+        return_code, output = COMMAND_TIMEOUT_EXIT_CODE, "Command timed out after {} seconds: {}\n".format(timeout, " ".join(command))
+    finally:
+        # The command timed out or the run has been cancelled (ie. KeyboardInterrupt)
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+    print("[return_code={return_code}] | {output}".format(return_code=return_code, output=output), file=sys.stderr)
+    return return_code, output
+
+
+async def _run_command_async(
+    command: typing.Sequence[str],
+    semaphore: asyncio.Semaphore,
+    timeout: typing.Optional[float],
+    tool_slots: typing.Optional[ToolSlots],
+) -> typing.Tuple[int, str]:
+    async with semaphore:
+        slot = await tool_slots.acquire() if tool_slots is not None else None
+        try:
+            return await _run_subprocess(command, timeout)
+        finally:
+            if slot is not None:
+                ToolSlots.release(slot)
+
+
+async def _run_commands(
+    commands: typing.Sequence[typing.Sequence[str]],
+    concurrency: int,
+    timeout: typing.Optional[float],
+    tool_slots: typing.Optional[ToolSlots],
+    stop: typing.Optional[typing.Callable[[int, typing.Tuple[int, str]], bool]],
+) -> typing.List[typing.Tuple[int, str]]:
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+    tasks = [asyncio.ensure_future(_run_command_async(command, semaphore, timeout, tool_slots)) for command in commands]
+    indexes = {task: index for index, task in enumerate(tasks)}
+    try:
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in sorted(done, key=indexes.__getitem__):
+                # Commands that could not be started raise here, and stop the run, as soon as they fail
+                result = task.result()
+                if stop is not None and stop(indexes[task], result):
+                    pending = set()
+        return [task.result() if task.done() else (COMMAND_CANCELLED_EXIT_CODE, "") for task in tasks]
+    finally:
+        # If a command could not be started, or the run is stopped, the others are cancelled and their processes killed
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def run_commands(
+    commands: typing.Sequence[typing.Sequence[str]],
+    concurrency: int = 1,
+    timeout: typing.Optional[float] = None,
+    tool_slots: typing.Optional[ToolSlots] = None,
+    stop: typing.Optional[typing.Callable[[int, typing.Tuple[int, str]], bool]] = None,
+) -> typing.List[typing.Tuple[int, str]]:
+    """
+    Run `commands` with at most `concurrency` of them running at the same time, and return their exit statuses and outputs (in order).
+    Commands running for more than `timeout` seconds are killed and reported with `COMMAND_TIMEOUT_EXIT_CODE` exit status.
+    If `tool_slots` is provided each command runs only while holding one of its machine-wide tokens (the wait is not part of the timeout).
+    `stop` is called with the index and the result of each command once it completes: as soon as it returns True the running commands
+    are killed, the pending ones are not started and all of them are reported with `COMMAND_CANCELLED_EXIT_CODE` exit status.
+    All the running commands are killed if the run is interrupted (ie. KeyboardInterrupt).
+    """
+    if not commands:
+        return []
+
+    # Subprocesses are supported only by the proactor event loop on Windows
+    loop = asyncio.ProactorEventLoop() if sys.platform == "win32" else asyncio.new_event_loop()  # type: ignore[attr-defined]
+    # The loop is registered as current one so that the child processes watcher is attached to it (python < 3.8)
+    asyncio.set_event_loop(loop)
+    main_task = loop.create_task(_run_commands(commands, concurrency, timeout, tool_slots, stop))
+    try:
+        return loop.run_until_complete(main_task)
+    except BaseException:
+        main_task.cancel()
+        try:
+            loop.run_until_complete(main_task)
+        except BaseException:  # The original exception is propagated
+            pass
+        raise
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+def merge_results(results: typing.Iterable[typing.Tuple[int, str]]) -> typing.Tuple[int, str]:
+    """Merge the results of multiple invocations into the first non zero exit status and the concatenated outputs."""
+    status, output = 0, ""
+    for result_status, result_output in results:
+        status = status or result_status
+        output += result_output
+    return status, output
+
+
+_Invocation = typing.Tuple[typing.List[str], typing.Tuple[int, str]]
+
+
+def isolate_failures(
+    invocations: typing.Iterable[_Invocation],
+    command: typing.Callable[[typing.List[str]], typing.List[str]],
+    is_attributable: typing.Callable[[typing.List[str], typing.Tuple[int, str]], bool],
+    concurrency: int = 1,
+    timeout: typing.Optional[float] = None,
+    tool_slots: typing.Optional[ToolSlots] = None,
+) -> typing.List[_Invocation]:
+    """
+    Bisect the invocations (files and result) whose failure can not be attributed to specific files, ie. a tool failing the whole
+    invocation if any file is not valid. Their files are split in halves, running `command` on all the halves concurrently,
+    until every result is attributable or covers at most a single file (so the not valid files are isolated).
+    Invocations are returned in the order of their files (the ones without files first), each of them covering at most a single file
+    if its result is still not attributable.
+    """
+    invocations = list(invocations)
+    positions = {filename: position for position, filename in enumerate(filename for files, _ in invocations for filename in files)}
+    settled: typing.List[_Invocation] = []
+    pending: typing.List[_Invocation] = []
+    for files, result in invocations:
+        # Invocations with less than 2 files can not be split further (ie. the whole package checked if no files are passed)
+        (settled if len(files) <= 1 or is_attributable(files, result) else pending).append((files, result))
+
+    while pending:
+        halves = [half for files, _ in pending for half in (files[: len(files) // 2], files[len(files) // 2 :])]
+        results = run_commands([command(half) for half in halves], concurrency=concurrency, timeout=timeout, tool_slots=tool_slots)
+        pending = []
+        for half, result in zip(halves, results):
+            (settled if len(half) == 1 or is_attributable(half, result) else pending).append((half, result))
+
+    return sorted(settled, key=lambda invocation: positions[invocation[0][0]] if invocation[0] else -1)
+
+
+def run_command_in_chunks(
+    command: typing.Sequence[str],
+    arguments: typing.Sequence[str],
+    tool_slots: typing.Optional[ToolSlots] = None,
+) -> typing.Tuple[int, str]:
+    """
+    Run `command` on `arguments` (ie. files), splitting them in multiple invocations only if they do not fit a single command line.
+    The first non zero exit status, and the output of all the invocations, are returned.
+    """
+    return merge_results(run_commands([[*command, *chunk] for chunk in command_line_chunks(command, arguments)], tool_slots=tool_slots))
+
+
 def _base_directory() -> str:
     # Extracted from pre-commit code:
     # https://github.com/pre-commit/pre-commit/blob/master/pre_commit/store.py
@@ -43,6 +362,132 @@ def _base_directory() -> str:
     )
 
 
+def _session() -> requests.Session:
+    """Connection-pooled session shared by all the downloads."""
+    global _download_session
+    if _download_session is None:
+        _download_session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=DOWNLOAD_CONCURRENCY, max_retries=3)
+        _download_session.mount("http://", adapter)
+        _download_session.mount("https://", adapter)
+    return _download_session
+
+
+def _mirrored_url(url: str) -> str:
+    mirror = os.environ.get(DOWNLOAD_MIRROR_ENVIRONMENT_VARIABLE)
+    if not mirror:
+        return url
+    return "{mirror}{path}".format(mirror=mirror.rstrip("/"), path=urlparse(url).path)
+
+
+def _download_validator(response: requests.Response) -> typing.Optional[str]:
+    """Validator (strong ETag, or Last-Modified date) identifying the version of the artifact, as accepted by If-Range."""
+    etag = response.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return response.headers.get("Last-Modified")
+
+
+@contextlib.contextmanager
+def _download_lock(final_file: str) -> typing.Iterator[None]:
+    """
+    Exclusive lock on the download of `final_file`, shared by all the hook processes (ie. the ones run in parallel by pre-commit).
+    The lock file is removed, while still holding the lock, once `final_file` is downloaded: the processes waiting on the removed
+    file find `final_file` once they acquire the lock, and the later ones do not look for the lock at all.
+    """
+    lock_file = "{}.lock".format(final_file)
+    with open(lock_file, "a+b") as lock:
+        poll_interval = _TOOL_SLOT_POLL_INTERVAL
+        while not _lock_file(lock):
+            time.sleep(poll_interval)
+            poll_interval = min(poll_interval * 2, _TOOL_SLOT_MAX_POLL_INTERVAL)
+        try:
+            yield
+            if os.path.exists(final_file):
+                try:
+                    os.remove(lock_file)
+                except OSError:  # pragma: no cover
+                    # Already removed by the process holding the lock before, or not removable while open (ie. on Windows)
+                    pass
+        finally:
+            _unlock_file(lock)
+
+
+def _download_range(url: str, part_file: str, start: int, end: int, validator: typing.Optional[str]) -> None:
+    """
+    Download the bytes [start, end] of `url` into `part_file`, resuming from the bytes already present in it.
+    Resumed requests are conditional (If-Range) on `validator`, so bytes of different versions of the artifact are never mixed.
+    """
+    downloaded_size = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+    if start + downloaded_size > end:
+        return
+
+    headers = {"Range": "bytes={}-{}".format(start + downloaded_size, end)}
+    if downloaded_size > 0 and validator is not None:
+        headers["If-Range"] = validator
+    with _session().get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as r:
+        r.raise_for_status()
+        if r.status_code != 206:
+            if downloaded_size > 0:
+                # The artifact changed since the part was downloaded, the download restarts from scratch on the next attempt
+                os.remove(part_file)
+                raise RuntimeError("{url} changed while it was downloaded".format(url=url))
+            raise RuntimeError("{url} does not honour HTTP Range requests".format(url=url))
+        with open(part_file, "ab") as f:
+            shutil.copyfileobj(r.raw, f)
+
+    if os.path.getsize(part_file) != end - start + 1:
+        raise RuntimeError("Incomplete download of {url} (bytes {start}-{end})".format(url=url, start=start, end=end))
+
+
+def _download_parts(url: str, final_file: str) -> typing.List[str]:
+    """
+    Download `url` into part files, whose concatenation is the downloaded artifact.
+    Part files are kept on failure, so a later download resumes from them if the artifact did not change
+    (the validator of the artifact is stored alongside the part files). The caller must hold `_download_lock(final_file)`.
+    """
+    response = _session().head(url, allow_redirects=True, timeout=DOWNLOAD_TIMEOUT)
+    size = int(response.headers.get("Content-Length", 0)) if response.ok else 0
+
+    if size == 0 or response.headers.get("Accept-Ranges") != "bytes":
+        part_file = "{}.part".format(final_file)
+        with _session().get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as r:
+            r.raise_for_status()
+            with open(part_file, "wb") as f:
+                shutil.copyfileobj(r.raw, f)
+        return [part_file]
+
+    # Redirects (ie. GitHub releases) are resolved once
+    url = response.url
+    validator = _download_validator(response)
+    validator_file = "{}.validator".format(final_file)
+    stored_validator = None
+    if os.path.exists(validator_file):
+        with open(validator_file) as f:
+            stored_validator = f.read()
+    if validator is None or validator != stored_validator:
+        # Parts of a previous download can be resumed only if they refer to the same version of the artifact
+        for part_file in glob.glob("{}.*.part".format(glob.escape(final_file))):
+            os.remove(part_file)
+        if validator is None:
+            if os.path.exists(validator_file):
+                os.remove(validator_file)
+        else:
+            with open(validator_file, "w") as f:
+                f.write(validator)
+
+    part_count = DOWNLOAD_CONCURRENCY if size >= RANGED_DOWNLOAD_MIN_SIZE else 1
+    part_size = -(-size // part_count)
+    parts = [
+        ("{}.{}-{}.part".format(final_file, start, min(start + part_size, size) - 1), start, min(start + part_size, size) - 1)
+        for start in range(0, size, part_size)
+    ]
+    with ThreadPoolExecutor(max_workers=len(parts)) as executor:
+        for future in [executor.submit(_download_range, url, part_file, start, end, validator) for part_file, start, end in parts]:
+            future.result()
+    return [part_file for part_file, _, _ in parts]
+
+
 def download_url(url: str, file_name: typing.Optional[str] = None) -> str:
     base_directory = _base_directory()
 
@@ -63,16 +508,28 @@ def download_url(url: str, file_name: typing.Optional[str] = None) -> str:
         print("Unexisting base directory ({base_directory}). Creating it".format(base_directory=base_directory), file=sys.stderr)
         os.makedirs(base_directory)
 
-    print("Downloading {url}".format(url=url), file=sys.stderr)
-    r = requests.get(url, stream=True)
-    r.raise_for_status()
-    with tempfile.NamedTemporaryFile(delete=False) as tmp_file:  # Not delete because we're renaming it
-        tmp_file_name = tmp_file.name
-        shutil.copyfileobj(r.raw, tmp_file)
-        tmp_file.flush()
-        os.fsync(tmp_file.fileno())
+    with _download_lock(final_file):
+        if os.path.exists(final_file):
+            # Downloaded by another process while waiting for the lock
+            return final_file
+
+        url = _mirrored_url(url)
+        print("Downloading {url}".format(url=url), file=sys.stderr)
+        part_files = _download_parts(url, final_file)
+
+        with tempfile.NamedTemporaryFile(dir=base_directory, delete=False) as tmp_file:  # Not delete because we're renaming it
+            tmp_file_name = tmp_file.name
+            for part_file in part_files:
+                with open(part_file, "rb") as f:
+                    shutil.copyfileobj(f, tmp_file)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
 
-    os.rename(tmp_file_name, final_file)
+        os.replace(tmp_file_name, final_file)
+        for part_file in part_files:
+            os.remove(part_file)
+        if os.path.exists("{}.validator".format(final_file)):
+            os.remove("{}.validator".format(final_file))
 
     return final_file
 
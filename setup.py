@@ -17,6 +17,7 @@ setup(
             "pretty-format-kotlin = language_formatters_pre_commit_hooks.pretty_format_kotlin:pretty_format_kotlin",
             "pretty-format-ini = language_formatters_pre_commit_hooks.pretty_format_ini:pretty_format_ini",
             "pretty-format-rust = language_formatters_pre_commit_hooks.pretty_format_rust:pretty_format_rust",
+            "pretty-format-stats = language_formatters_pre_commit_hooks.pretty_format_stats:pretty_format_stats",
             "pretty-format-toml = language_formatters_pre_commit_hooks.pretty_format_toml:pretty_format_toml",
             "pretty-format-yaml = language_formatters_pre_commit_hooks.pretty_format_yaml:pretty_format_yaml",
         ],
@@ -4,6 +4,7 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import os
+import subprocess  # nosec: disable=B404
 import typing
 from contextlib import contextmanager
 from posixpath import basename
@@ -25,6 +26,19 @@ def change_dir_context(directory: str) -> typing.Generator[None, None, None]:
         os.chdir(working_directory)
 
 
+@contextmanager
+def git_repository_context(directory: str) -> typing.Generator[None, None, None]:
+    """Initialize an empty git repository in `directory` and change the working directory to it."""
+    with change_dir_context(directory):
+        for command in (
+            ("git", "init", "--quiet"),
+            ("git", "config", "user.email", "test@example.com"),
+            ("git", "config", "user.name", "test"),
+        ):
+            subprocess.check_call(command)  # nosec: disable=B603
+        yield
+
+
 @contextmanager
 def undecorate_function(func: F) -> typing.Generator[F, None, None]:
     passed_function = func
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import os
+import subprocess  # nosec: disable=B404
+
+import mock
+import pytest
+
+from language_formatters_pre_commit_hooks.cli import add_common_arguments
+from language_formatters_pre_commit_hooks.cli import add_io_threads_arguments
+from language_formatters_pre_commit_hooks.cli import add_max_concurrent_tools_argument
+from language_formatters_pre_commit_hooks.cli import add_tool_invocation_arguments
+from language_formatters_pre_commit_hooks.cli import has_no_selected_files
+from language_formatters_pre_commit_hooks.cli import parse_arguments
+from language_formatters_pre_commit_hooks.formatting import DEFAULT_IO_MEMORY_BUDGET
+from language_formatters_pre_commit_hooks.formatting import IO_THREADS_ENVIRONMENT_VARIABLE
+from language_formatters_pre_commit_hooks.utils import MAX_CONCURRENT_TOOLS_ENVIRONMENT_VARIABLE
+from tests import git_repository_context
+
+
+@pytest.fixture
+def parser():
+    parser = argparse.ArgumentParser()
+    add_common_arguments(parser)
+    parser.add_argument("filenames", nargs="*")
+    return parser
+
+
+def test_parse_arguments_without_selection(parser):
+    args = parse_arguments(parser, ["a", "b"])
+    assert args.filenames == args.input_filenames == ["a", "b"]
+    assert not has_no_selected_files(args)
+
+
+def test_parse_arguments_without_files(parser):
+    args = parse_arguments(parser, [])
+    assert args.filenames == []
+    assert not has_no_selected_files(args)
+
+
+def test_parse_arguments_with_shard(parser):
+    filenames = ["file-{}".format(index) for index in range(10)]
+    shards = [parse_arguments(parser, ["--shard", "{}/3".format(index)] + filenames).filenames for index in range(1, 4)]
+    assert sorted(sum(shards, [])) == sorted(filenames)
+
+
+def test_has_no_selected_files(parser):
+    args = parse_arguments(parser, ["--shard", "1/2", "a"])
+    if args.filenames:
+        args = parse_arguments(parser, ["--shard", "2/2", "a"])
+    assert has_no_selected_files(args)
+
+
+def test_parse_arguments_with_invalid_shard(parser, capsys):
+    with pytest.raises(SystemExit):
+        parse_arguments(parser, ["--shard", "3/2", "a"])
+    assert "Shard index should be between 1 and 2" in capsys.readouterr().err
+
+
+def test_parse_arguments_skips_files(parser, tmpdir, capsys):
+    generated_file = tmpdir.join("generated.go")
+    generated_file.write("// Code generated by hand. DO NOT EDIT.\npackage main\n")
+    args = parse_arguments(parser, ["--skip-generated", generated_file.strpath])
+    assert args.filenames == []
+    assert has_no_selected_files(args)
+    assert "Skipping {}: generated file marker".format(generated_file.strpath) in capsys.readouterr().out
+
+
+def test_parse_arguments_skips_files_with_format_attribute_unset(parser, tmpdir, capsys):
+    with git_repository_context(tmpdir.strpath):
+        with open(".gitattributes", "w") as f:
+            f.write("generated/** -format\n*.go eol=lf\n")
+        args = parse_arguments(parser, ["generated/a.yaml", "b.go"])
+        assert args.filenames == ["b.go"]
+        assert args.git_attributes["b.go"]["eol"] == "lf"
+        assert "Skipping generated/a.yaml: format git attribute is unset" in capsys.readouterr().out
+
+        # Attributes are read from the index with --from-index
+        parser.add_argument("--from-index", action="store_true", dest="from_index")
+        parser.add_argument("--autofix", action="store_true", dest="autofix")
+        assert parse_arguments(parser, ["--from-index", "generated/a.yaml"]).filenames == ["generated/a.yaml"]
+        subprocess.check_call(("git", "add", ".gitattributes"))  # nosec: disable=B603
+        assert parse_arguments(parser, ["--from-index", "generated/a.yaml"]).filenames == []
+
+
+def test_parse_arguments_with_tree(tmpdir, capsys):
+    parser = argparse.ArgumentParser()
+    add_common_arguments(parser, file_extensions=(".yaml",))
+    parser.add_argument("filenames", nargs="*")
+    tmpdir.join("a.yaml").write("a: 1\n")
+    tmpdir.join("sub", "b.yaml").write("b: 1\n", ensure=True)
+    tmpdir.join("sub", "c.toml").write("c = 1\n")
+
+    args = parse_arguments(parser, ["other.yaml", "--tree", tmpdir.join("sub").strpath])
+    assert args.filenames == args.input_filenames == ["other.yaml", tmpdir.join("sub", "b.yaml").strpath]
+    assert sorted(parse_arguments(parser, ["--tree", tmpdir.strpath]).filenames) == [
+        tmpdir.join("a.yaml").strpath,
+        tmpdir.join("sub", "b.yaml").strpath,
+    ]
+
+    with pytest.raises(SystemExit):
+        parse_arguments(parser, ["--tree", tmpdir.join("a.yaml").strpath])
+    assert "is not a directory" in capsys.readouterr().err
+
+
+def test_parse_arguments_with_invalid_jobs(parser, capsys):
+    assert parse_arguments(parser, ["a"]).jobs == 1
+    assert parse_arguments(parser, ["--jobs", "4", "a"]).jobs == 4
+    with pytest.raises(SystemExit):
+        parse_arguments(parser, ["--jobs", "0", "a"])
+    assert "expected a positive number, received 0" in capsys.readouterr().err
+
+
+def test_parse_arguments_with_tool_invocation_arguments(parser):
+    add_tool_invocation_arguments(parser)
+    args = parse_arguments(parser, ["a"])
+    assert (args.tool_timeout, args.max_files_per_invocation, args.max_bytes_per_invocation) == (None, None, None)
+
+    args = parse_arguments(parser, ["--tool-timeout", "1.5", "--max-files-per-invocation", "10", "--max-bytes-per-invocation", "4K", "a"])
+    assert (args.tool_timeout, args.max_files_per_invocation, args.max_bytes_per_invocation) == (1.5, 10, 4096)
+
+
+def test_parse_arguments_with_failure_limit(parser, capsys):
+    assert parse_arguments(parser, ["a"]).failure_limit.max_failures is None
+    assert parse_arguments(parser, ["--fail-fast", "a"]).failure_limit.max_failures == 1
+    assert parse_arguments(parser, ["--max-failures", "5", "a"]).failure_limit.max_failures == 5
+
+    parser.add_argument("--autofix", action="store_true")
+    with pytest.raises(SystemExit):
+        parse_arguments(parser, ["--autofix", "--fail-fast", "a"])
+    assert "--fail-fast and --max-failures can not be combined with --autofix" in capsys.readouterr().err
+
+
+def test_parse_arguments_with_max_concurrent_tools():
+    def _parser() -> argparse.ArgumentParser:
+        parser = argparse.ArgumentParser()
+        add_common_arguments(parser)
+        add_max_concurrent_tools_argument(parser)
+        parser.add_argument("filenames", nargs="*")
+        return parser
+
+    with mock.patch.dict(os.environ) as environ:
+        environ.pop(MAX_CONCURRENT_TOOLS_ENVIRONMENT_VARIABLE, None)
+        assert parse_arguments(_parser(), ["a"]).max_concurrent_tools is None
+        assert parse_arguments(_parser(), ["--max-concurrent-tools", "2", "a"]).max_concurrent_tools == 2
+
+        environ[MAX_CONCURRENT_TOOLS_ENVIRONMENT_VARIABLE] = "3"
+        assert parse_arguments(_parser(), ["a"]).max_concurrent_tools == 3
+
+
+def test_parse_arguments_with_io_threads():
+    def _parser() -> argparse.ArgumentParser:
+        parser = argparse.ArgumentParser()
+        add_common_arguments(parser)
+        add_io_threads_arguments(parser)
+        parser.add_argument("filenames", nargs="*")
+        return parser
+
+    with mock.patch.dict(os.environ) as environ:
+        environ.pop(IO_THREADS_ENVIRONMENT_VARIABLE, None)
+        args = parse_arguments(_parser(), ["a"])
+        assert args.io_threads is None
+        assert args.io_memory_budget == DEFAULT_IO_MEMORY_BUDGET
+
+        args = parse_arguments(_parser(), ["--io-threads", "8", "--io-memory-budget", "16M", "a"])
+        assert args.io_threads == 8
+        assert args.io_memory_budget == 16 * 1024 * 1024
+
+        environ[IO_THREADS_ENVIRONMENT_VARIABLE] = "4"
+        assert parse_arguments(_parser(), ["a"]).io_threads == 4
+
+
+def test_parse_arguments_with_file_list(parser, tmpdir, capsys):
+    file_list = tmpdir.join("files")
+    file_list.write_binary(b"b\0c\0")
+    args = parse_arguments(parser, ["a", "@" + file_list.strpath])
+    assert args.filenames == args.input_filenames == ["a", "b", "c"]
+
+    with pytest.raises(SystemExit):
+        parse_arguments(parser, ["@" + tmpdir.join("not-existing").strpath])
+    assert "Unable to read the list of files" in capsys.readouterr().err
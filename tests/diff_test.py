@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import random
+import re
+
+import pytest
+
+from language_formatters_pre_commit_hooks.diff import unified_diff
+
+
+def _apply_unified_diff(original, diff_lines):
+    """Minimal patch implementation, enough to verify that the generated hunks are consistent."""
+    original_lines = original.splitlines(True)
+    result = []
+    position = 0
+    previous_line = ""
+    for line in diff_lines[2:]:
+        hunk_header = re.match(r"^@@ -(\d+)(?:,(\d+))? \+\d+(?:,\d+)? @@$", line)
+        if hunk_header:
+            start = int(hunk_header.group(1)) - (0 if hunk_header.group(2) == "0" else 1)
+            result.extend(original_lines[position:start])
+            position = start
+        elif line == "\\ No newline at end of file\n":
+            if previous_line.startswith("+"):
+                result[-1] = result[-1][:-1]
+        elif line[0] == "+":
+            result.append(line[1:])
+        else:
+            assert original_lines[position].rstrip("\n") == line[1:].rstrip("\n")
+            if line[0] == " ":
+                result.append(original_lines[position])
+            position += 1
+        previous_line = line
+    result.extend(original_lines[position:])
+    return "".join(result)
+
+
+def test_unified_diff():
+    original = "".join("line {}\n".format(index) for index in range(10))
+    pretty = original.replace("line 2\n", "line two\n").replace("line 8\n", "")
+    assert list(unified_diff(original, pretty, "file.yaml")) == [
+        "--- a/file.yaml\n",
+        "+++ b/file.yaml\n",
+        "@@ -1,10 +1,9 @@\n",
+        " line 0\n",
+        " line 1\n",
+        "-line 2\n",
+        "+line two\n",
+        " line 3\n",
+        " line 4\n",
+        " line 5\n",
+        " line 6\n",
+        " line 7\n",
+        "-line 8\n",
+        " line 9\n",
+    ]
+
+
+def test_unified_diff_missing_newline_at_end_of_file():
+    assert list(unified_diff("a: 1", "a: 1\n", "file.yaml")) == [
+        "--- a/file.yaml\n",
+        "+++ b/file.yaml\n",
+        "@@ -1 +1 @@\n",
+        "-a: 1\n",
+        "\\ No newline at end of file\n",
+        "+a: 1\n",
+    ]
+
+
+def test_unified_diff_is_truncated():
+    original = "".join("{}\n".format(index) for index in range(100))
+    diff_lines = list(unified_diff(original, original.replace("\n", " \n"), "file.yaml", max_lines=10))
+    assert len(diff_lines) == 11
+    assert diff_lines[-1] == "... diff truncated after 10 lines\n"
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_unified_diff_can_be_applied(seed):
+    rnd = random.Random(seed)
+    for _ in range(100):
+        original_lines = [rnd.choice("abcdef") for _ in range(rnd.randint(0, 50))]
+        pretty_lines = list(original_lines)
+        for _ in range(rnd.randint(1, 10)):
+            position = rnd.randint(0, len(pretty_lines))
+            if rnd.random() < 0.5 or not pretty_lines:
+                pretty_lines.insert(position, rnd.choice("abxyz"))
+            else:
+                del pretty_lines[min(position, len(pretty_lines) - 1)]
+        original = "\n".join(original_lines) + rnd.choice(("", "\n"))
+        pretty = "\n".join(pretty_lines) + rnd.choice(("", "\n"))
+        if original != pretty:
+            assert _apply_unified_diff(original, list(unified_diff(original, pretty, "file", max_lines=10000))) == pretty
+
+
+def test_unified_diff_of_large_files_with_repeated_lines():
+    original = "".join("key: {}\n".format(index % 10) for index in range(100000))
+    pretty = "".join("key: {}\n".format(index * 7 % 10) for index in range(100000))
+    diff_lines = list(unified_diff(original, pretty, "file.yaml"))
+    assert diff_lines[-1] == "... diff truncated after 1000 lines\n"
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from language_formatters_pre_commit_hooks.failure_limit import FailureLimit
+from language_formatters_pre_commit_hooks.failure_limit import FILES_PER_INVOCATION_WITH_LIMIT
+from language_formatters_pre_commit_hooks.utils import COMMAND_CANCELLED_EXIT_CODE
+
+
+def test_unlimited_failure_limit(capsys):
+    failure_limit = FailureLimit(None)
+    assert not failure_limit.record(1000)
+    assert failure_limit.exit_status(1) == 1
+    assert capsys.readouterr().out == ""
+
+
+def test_failure_limit(capsys):
+    failure_limit = FailureLimit(2)
+    assert not failure_limit.is_reached()
+    assert not failure_limit.record()
+    assert failure_limit.record()
+    assert failure_limit.is_reached()
+
+    failure_limit.skip(["a", "b"])
+    assert failure_limit.exit_status(1) == 1
+    assert capsys.readouterr().out == "Stopped after 2 failures (see --fail-fast and --max-failures), 2 files have not been checked\n"
+
+
+def test_failure_limit_without_skipped_files(capsys):
+    failure_limit = FailureLimit(1)
+    assert failure_limit.record(3)
+    assert failure_limit.exit_status(1) == 1
+    assert capsys.readouterr().out == ""
+
+
+def test_failure_limit_skip_cancelled():
+    failure_limit = FailureLimit(1)
+    invocations = [(["a", "b"], (1, "a")), (["c"], (COMMAND_CANCELLED_EXIT_CODE, "")), (["d"], (0, ""))]
+    assert failure_limit.skip_cancelled(invocations) == [(["a", "b"], (1, "a")), (["d"], (0, ""))]
+    assert failure_limit.unchecked_files == ["c"]
+
+
+def test_failure_limit_max_files_per_invocation():
+    assert FailureLimit(None).max_files_per_invocation(None) is None
+    assert FailureLimit(None).max_files_per_invocation(1000) == 1000
+    assert FailureLimit(1).max_files_per_invocation(None) == FILES_PER_INVOCATION_WITH_LIMIT
+    assert FailureLimit(1).max_files_per_invocation(4) == 4
+    assert FailureLimit(1000).max_files_per_invocation(None) == 1000
+
+
+def test_failure_limit_truncate(capsys):
+    assert FailureLimit(None).truncate(["a", "b"]) == ["a", "b"]
+
+    failure_limit = FailureLimit(3)
+    assert failure_limit.record(5)
+    # The limit applies across the reports
+    assert failure_limit.truncate(["a", "b"]) == ["a", "b"]
+    assert failure_limit.truncate(["c", "d", "e"]) == ["c"]
+    assert failure_limit.truncate(["f"]) == []
+    assert failure_limit.exit_status(1) == 1
+    assert capsys.readouterr().out == "Stopped after 3 failures (see --fail-fast and --max-failures), 3 files have not been checked\n"
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import os
+
+import pytest
+from mock import patch
+
+from language_formatters_pre_commit_hooks.file_selection import drop_skipped_files
+from language_formatters_pre_commit_hooks.file_selection import expand_file_lists
+from language_formatters_pre_commit_hooks.file_selection import GENERATED_MARKER_READ_SIZE
+from language_formatters_pre_commit_hooks.file_selection import parse_shard
+from language_formatters_pre_commit_hooks.file_selection import parse_size
+from language_formatters_pre_commit_hooks.file_selection import prioritize_recently_changed
+from language_formatters_pre_commit_hooks.file_selection import select_shard
+from language_formatters_pre_commit_hooks.file_selection import Shard
+from language_formatters_pre_commit_hooks.file_selection import skip_reason
+from tests import change_dir_context
+
+
+@pytest.mark.parametrize(
+    "value, expected_shard",
+    [
+        ("1/1", Shard(number=1, total=1)),
+        ("2/4", Shard(number=2, total=4)),
+        ("4/4", Shard(number=4, total=4)),
+    ],
+)
+def test_parse_shard(value, expected_shard):
+    assert parse_shard(value) == expected_shard
+
+
+@pytest.mark.parametrize("value", ["", "1", "a/b", "1/2/3", "0/4", "5/4", "1/0", "-1/4"])
+def test_parse_shard_invalid(value):
+    with pytest.raises(ValueError):
+        parse_shard(value)
+
+
+@pytest.fixture
+def files(tmpdir):
+    filenames = []
+    for index in range(50):
+        file = tmpdir.join("file-{}.txt".format(index))
+        file.write("x" * (index * index))
+        filenames.append(file.strpath)
+    return filenames
+
+
+@pytest.mark.parametrize("balance_by_size", [True, False])
+def test_select_shard_partitions_files(files, balance_by_size):
+    shards = [select_shard(files, Shard(number=index, total=4), balance_by_size=balance_by_size) for index in range(1, 5)]
+
+    assert sorted(file for shard in shards for file in shard) == sorted(files)
+    assert all(shards)
+    # The input order is preserved
+    assert all(shard == [file for file in files if file in shard] for shard in shards)
+
+
+def test_select_shard_is_stable(files):
+    shard = Shard(number=2, total=3)
+    selected = select_shard(files, shard)
+
+    assert select_shard(list(reversed(files)), shard) == list(reversed(selected))
+    # The assignment of a file does not depend on the other files
+    assert select_shard(files[:10], shard) == [file for file in selected if file in files[:10]]
+    assert select_shard(files + files, shard) == selected
+
+
+def test_select_shard_balance_by_size(files):
+    def shard_size(shard):
+        return sum(len(open(file).read()) for file in shard)
+
+    shard_sizes = [shard_size(select_shard(files, Shard(number=index, total=4), balance_by_size=True)) for index in range(1, 5)]
+    assert max(shard_sizes) - min(shard_sizes) <= 49 * 49
+
+
+def test_prioritize_recently_changed(tmpdir):
+    filenames = []
+    for index in range(4):
+        filename = tmpdir.join("file-{}".format(index)).strpath
+        with open(filename, "w") as f:
+            f.write("")
+        os.utime(filename, (index, index))
+        filenames.append(filename)
+
+    with patch("language_formatters_pre_commit_hooks.file_selection.run_command", return_value=(0, "{}\0".format(filenames[1]))):
+        assert prioritize_recently_changed(filenames) == [filenames[1], filenames[3], filenames[2], filenames[0]]
+
+
+def test_prioritize_recently_changed_outside_of_git_repository():
+    with patch("language_formatters_pre_commit_hooks.file_selection.run_command", return_value=(128, "fatal: not a git repository")):
+        assert prioritize_recently_changed(["b", "a", "b"]) == ["a", "b"]
+
+
+@pytest.mark.parametrize(
+    "value, expected_size",
+    [
+        ("100", 100),
+        ("512K", 512 * 1024),
+        ("2m", 2 * 1024 * 1024),
+        ("1GB", 1024 * 1024 * 1024),
+    ],
+)
+def test_parse_size(value, expected_size):
+    assert parse_size(value) == expected_size
+
+
+@pytest.mark.parametrize("value", ["", "K", "1.5M", "1T"])
+def test_parse_size_invalid(value):
+    with pytest.raises(ValueError):
+        parse_size(value)
+
+
+@pytest.mark.parametrize(
+    "filename, content, expected_reason",
+    [
+        ("main.go", "package main\n", None),
+        (
+            "main.go",
+            "// Code generated by protoc-gen-go. DO NOT EDIT.\n\npackage main\n",
+            "generated file marker `// Code generated by protoc-gen-go. DO NOT EDIT.`",
+        ),
+        ("file.yaml", "# @generated by a tool\na: 1\n", "generated file marker `@generated`"),
+        (
+            "file_pb2.py",
+            "# Generated by the protocol buffer compiler.  DO NOT EDIT!\n",
+            "generated file marker `Generated by the protocol buffer compiler.  DO NOT EDIT`",
+        ),
+        ("file.yaml", "# DO NOT EDIT without updating the deployment scripts\na: 1\n", None),
+        ("Cargo.lock", "", "lockfile"),
+        ("pnpm-lock.yaml", "", "lockfile"),
+        ("file.yaml", "a: 1\n" * GENERATED_MARKER_READ_SIZE + "# Code generated by a tool. DO NOT EDIT.\n", None),
+    ],
+)
+def test_skip_reason_generated(tmpdir, filename, content, expected_reason):
+    path = tmpdir.join(filename)
+    path.write(content)
+    assert skip_reason(path.strpath, max_file_size=None, skip_generated=True) == expected_reason
+    assert skip_reason(path.strpath, max_file_size=None, skip_generated=False) is None
+
+
+def test_drop_skipped_files(tmpdir):
+    small_file, big_file = tmpdir.join("small.yaml"), tmpdir.join("big.yaml")
+    small_file.write("a: 1\n")
+    big_file.write("a: 1\n" * 100)
+    assert drop_skipped_files([small_file.strpath, big_file.strpath], max_file_size=100, skip_generated=False) == (
+        [small_file.strpath],
+        {big_file.strpath: "size of 500 bytes exceeds --max-file-size"},
+    )
+
+
+def test_expand_file_lists(tmpdir):
+    nul_separated_list = tmpdir.join("nul-separated")
+    nul_separated_list.write_binary(b"a.yaml\0dir/with space.yaml\0with\nnew line.yaml\0")
+    line_separated_list = tmpdir.join("line-separated")
+    line_separated_list.write_binary(b"b.yaml\r\nc.yaml\n")
+
+    assert expand_file_lists(["first.yaml", "@" + nul_separated_list.strpath, "@" + line_separated_list.strpath, "@"]) == [
+        "first.yaml",
+        "a.yaml",
+        "dir/with space.yaml",
+        "with\nnew line.yaml",
+        "b.yaml",
+        "c.yaml",
+        "@",
+    ]
+
+
+def test_expand_file_lists_from_stdin():
+    with patch("sys.stdin", io.TextIOWrapper(io.BytesIO(b"a.yaml\0b.yaml\0"))):
+        assert expand_file_lists(["@-"]) == ["a.yaml", "b.yaml"]
+
+
+def test_expand_file_lists_keeps_existing_files(tmpdir):
+    with change_dir_context(tmpdir.strpath):
+        tmpdir.join("@types.yaml").write("")
+        assert expand_file_lists(["@types.yaml"]) == ["@types.yaml"]
+        with pytest.raises(OSError):
+            expand_file_lists(["@not-existing.yaml"])
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import subprocess  # nosec: disable=B404
+
+import pytest
+
+from language_formatters_pre_commit_hooks.file_tree import _is_ignored
+from language_formatters_pre_commit_hooks.file_tree import _parse_gitignore
+from language_formatters_pre_commit_hooks.file_tree import tree_files
+from language_formatters_pre_commit_hooks.file_tree import walk_tree
+from tests import change_dir_context
+from tests import git_repository_context
+
+
+def _create_tree(root):
+    root.join(".gitignore").write("# comment\n*.log.yaml\n/build/\ndocs/**/draft-*.yaml\n!keep.log.yaml\n")
+    for path in (
+        "a.yaml",
+        "b.txt",
+        "error.log.yaml",
+        "keep.log.yaml",
+        "build/generated.yaml",
+        "src/build/c.yaml",
+        "src/d.yml",
+        "docs/x/y/draft-1.yaml",
+        "docs/final.yaml",
+        "vendor/e.yaml",
+        "vendor/f.yaml",
+    ):
+        root.join(path).write("a: 1\n", ensure=True)
+    root.join("vendor", ".gitignore").write("e.yaml\n")
+
+
+_EXPECTED_FILES = [
+    "a.yaml",
+    "docs/final.yaml",
+    "keep.log.yaml",
+    "src/build/c.yaml",
+    "src/d.yml",
+    "vendor/f.yaml",
+]
+
+
+@pytest.mark.parametrize(
+    "gitignore, path, is_directory, expected_ignored",
+    [
+        ("*.yaml", "a/b.yaml", False, True),
+        ("/b.yaml", "a/b.yaml", False, False),
+        ("/b.yaml", "b.yaml", False, True),
+        ("build/", "a/build", True, True),
+        ("build/", "a/build", False, False),
+        ("a/**/c.yaml", "a/c.yaml", False, True),
+        ("a/**/c.yaml", "a/b/d/c.yaml", False, True),
+        ("a/**", "a/b/c.yaml", False, True),
+        ("file-[0-9].yaml", "file-1.yaml", False, True),
+        ("file-[!0-9].yaml", "file-1.yaml", False, False),
+        ("file-?.yaml", "file-ab.yaml", False, False),
+        ("\\#file.yaml", "#file.yaml", False, True),
+        ("*.yaml\n!keep.yaml", "keep.yaml", False, False),
+    ],
+)
+def test_gitignore_rules(gitignore, path, is_directory, expected_ignored):
+    assert _is_ignored(path, is_directory, _parse_gitignore("", gitignore)) == expected_ignored
+
+
+def test_walk_tree(tmpdir):
+    _create_tree(tmpdir)
+    with change_dir_context(tmpdir.strpath):
+        assert sorted(path.replace(os.sep, "/") for path in walk_tree(".", (".yaml", ".yml"))) == _EXPECTED_FILES
+    assert sorted(walk_tree(tmpdir.strpath, (".yml",))) == [tmpdir.join("src", "d.yml").strpath]
+
+
+def test_tree_files_outside_of_git_repository(tmpdir):
+    _create_tree(tmpdir)
+    assert sorted(tree_files(tmpdir.strpath, (".yaml", ".yml"))) == [tmpdir.join(*path.split("/")).strpath for path in _EXPECTED_FILES]
+
+
+def test_tree_files_within_git_repository(tmpdir):
+    _create_tree(tmpdir)
+    with git_repository_context(tmpdir.strpath):
+        # Tracked files are listed even if ignored, deleted files are not
+        subprocess.check_call(("git", "add", "--force", "a.yaml", "error.log.yaml", "src/d.yml"))  # nosec: disable=B603
+        os.remove("src/d.yml")
+        assert sorted(tree_files(".", (".yaml", ".yml"))) == [
+            "a.yaml",
+            "docs/final.yaml",
+            "error.log.yaml",
+            "keep.log.yaml",
+            "src/build/c.yaml",
+            "vendor/f.yaml",
+        ]
+        assert list(tree_files("src", (".yaml",))) == [os.path.join("src", "build", "c.yaml")]
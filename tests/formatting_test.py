@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from concurrent.futures import ThreadPoolExecutor
+
+import mock
+
+from language_formatters_pre_commit_hooks.formatting import _PipelinedIO
+from language_formatters_pre_commit_hooks.formatting import _read_file
+
+
+def test_pipelined_io(tmpdir):
+    filenames = []
+    for index in range(6):
+        path = tmpdir.join("file{}".format(index))
+        path.write("content {}".format(index))
+        filenames.append(path.strpath)
+    batches = [filenames[0:2], filenames[2:4], filenames[4:6]]
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        pipelined_io = _PipelinedIO(executor, 2, batches, memory_budget=1024)
+        assert pipelined_io.read(batches[0]) == {filenames[0]: "content 0", filenames[1]: "content 1"}
+        pipelined_io.skip(batches[1])
+        assert pipelined_io.read(batches[2]) == {filenames[4]: "content 4", filenames[5]: "content 5"}
+
+        pipelined_io.write(filenames[0], "fixed", None)
+        pipelined_io.wait_writes()
+        pipelined_io.stop()
+
+    assert tmpdir.join("file0").read() == "fixed"
+    # Only the content of the last batch is still buffered
+    assert pipelined_io._buffered_bytes == len("content 4") + len("content 5")
+
+
+def test_pipelined_io_memory_budget(tmpdir):
+    filenames = []
+    for index in range(20):
+        path = tmpdir.join("file{}".format(index))
+        path.write("content")
+        filenames.append(path.strpath)
+
+    with mock.patch(
+        "language_formatters_pre_commit_hooks.formatting._read_file",
+        autospec=True,
+        side_effect=_read_file,
+    ) as mock_read_file:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            pipelined_io = _PipelinedIO(executor, 1, [[filename] for filename in filenames], memory_budget=1)
+            assert pipelined_io.read([filenames[0]]) == {filenames[0]: "content"}
+            pipelined_io.stop()
+
+    # Reading ahead stops once the budget is exceeded, except for the reads already started
+    read_files = [call[0][0] for call in mock_read_file.call_args_list]
+    assert filenames[0] in read_files
+    assert set(read_files) <= set(filenames[:4])
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import subprocess  # nosec: disable=B404
+
+import pytest
+
+from language_formatters_pre_commit_hooks.git_utils import _parse_changed_line_ranges
+from language_formatters_pre_commit_hooks.git_utils import file_attributes
+from language_formatters_pre_commit_hooks.git_utils import IndexReader
+from language_formatters_pre_commit_hooks.git_utils import LineRange
+from language_formatters_pre_commit_hooks.git_utils import paths_to_check
+from language_formatters_pre_commit_hooks.git_utils import restore_filenames
+from language_formatters_pre_commit_hooks.git_utils import staged_changed_line_ranges
+from tests import change_dir_context
+from tests import git_repository_context
+
+
+@pytest.fixture
+def git_repository(tmpdir):
+    with git_repository_context(tmpdir.strpath):
+        yield tmpdir
+
+
+def _write(filename, lines):
+    with open(filename, "w") as f:
+        f.write("".join("{}\n".format(line) for line in lines))
+
+
+def test_parse_changed_line_ranges():
+    diff_output = "\n".join(
+        (
+            "diff --git a/a.java b/a.java",
+            "--- a/a.java",
+            "+++ b/a.java",
+            "@@ -1 +1 @@",
+            "@@ -5,0 +6,3 @@ class A {",
+            "@@ -20,2 +22,0 @@",
+            "diff --git a/b.java b/b.java",
+            "--- a/b.java",
+            "+++ /dev/null",
+            "@@ -1,2 +0,0 @@",
+        ),
+    )
+    assert _parse_changed_line_ranges(diff_output) == {
+        os.path.abspath("a.java"): [LineRange(start=1, end=1), LineRange(start=6, end=8)],
+    }
+
+
+def test_parse_changed_line_ranges_quoted_paths():
+    diff_output = "\n".join(
+        (
+            "+++ b/with space.java\t",
+            "@@ -1 +1 @@",
+            '+++ "b/\\303\\251t\\303\\251.java"',
+            "@@ -2 +2 @@",
+            '+++ "b/with \\"quote\\" and \\\\.java"',
+            "@@ -3 +3 @@",
+            '+++ "b/with\\ttab.java"\t',
+            "@@ -4 +4 @@",
+        ),
+    )
+    assert _parse_changed_line_ranges(diff_output) == {
+        os.path.abspath("with space.java"): [LineRange(start=1, end=1)],
+        os.path.abspath("\u00e9t\u00e9.java"): [LineRange(start=2, end=2)],
+        os.path.abspath('with "quote" and \\.java'): [LineRange(start=3, end=3)],
+        os.path.abspath("with\ttab.java"): [LineRange(start=4, end=4)],
+    }
+
+
+def test_staged_changed_line_ranges(git_repository):
+    _write("changed.java", range(10))
+    _write("unchanged.java", range(10))
+    subprocess.check_call(("git", "add", "changed.java", "unchanged.java"))  # nosec: disable=B603
+    subprocess.check_call(("git", "commit", "--quiet", "-m", "initial"))  # nosec: disable=B603
+
+    _write("changed.java", ["new", 0, 1, 2, 3, 4, "changed", 6, 7, 8, 9])
+    _write("new.java", range(3))
+    subprocess.check_call(("git", "add", "changed.java", "new.java"))  # nosec: disable=B603
+    # Not staged changes are ignored
+    _write("unchanged.java", range(11))
+
+    assert staged_changed_line_ranges(["changed.java", "unchanged.java", os.path.abspath("new.java")]) == {
+        "changed.java": [LineRange(start=1, end=1), LineRange(start=7, end=7)],
+        os.path.abspath("new.java"): [LineRange(start=1, end=3)],
+    }
+
+
+@pytest.mark.parametrize("filename", ("with space.java", "\u00e9t\u00e9.java", 'with "quote".java'))
+def test_staged_changed_line_ranges_special_paths(git_repository, filename):
+    _write(filename, range(3))
+    subprocess.check_call(("git", "add", filename))  # nosec: disable=B603
+
+    assert staged_changed_line_ranges([filename]) == {filename: [LineRange(start=1, end=3)]}
+
+
+def test_staged_changed_line_ranges_outside_of_git_repository(tmpdir):
+    with change_dir_context(tmpdir.strpath):
+        assert staged_changed_line_ranges(["file.java"]) is None
+
+
+def test_file_attributes(git_repository):
+    _write(".gitattributes", ["*.go eol=crlf", "vendor/** -format"])
+    filenames = ["a.go", os.path.abspath("vendor/b.yaml"), "c.yaml"]
+    assert file_attributes(filenames, ("format", "eol")) == {
+        "a.go": {"format": "unspecified", "eol": "crlf"},
+        os.path.abspath("vendor/b.yaml"): {"format": "unset", "eol": "unspecified"},
+        "c.yaml": {"format": "unspecified", "eol": "unspecified"},
+    }
+    assert file_attributes([], ("eol",)) == {}
+
+    # Attributes are read from the index if cached is set
+    assert file_attributes(["a.go"], ("eol",), cached=True) == {"a.go": {"eol": "unspecified"}}
+    subprocess.check_call(("git", "add", ".gitattributes"))  # nosec: disable=B603
+    assert file_attributes(["a.go"], ("eol",), cached=True) == {"a.go": {"eol": "crlf"}}
+
+
+def test_file_attributes_outside_of_git_repository(tmpdir):
+    with change_dir_context(tmpdir.strpath):
+        assert file_attributes(["a.go"], ("eol",)) == {}
+
+
+def test_index_reader(git_repository):
+    os.mkdir("directory")
+    for filename in ("a.yaml", "directory/b.yaml"):
+        _write(filename, ["staged"])
+    subprocess.check_call(("git", "add", "a.yaml", "directory/b.yaml"))  # nosec: disable=B603
+    _write("a.yaml", ["not staged"])
+    _write("untracked.yaml", ["untracked"])
+
+    with IndexReader() as index_reader:
+        assert index_reader.read_many(["a.yaml", "untracked.yaml"]) == {"a.yaml": b"staged\n", "untracked.yaml": b"untracked\n"}
+        with change_dir_context("directory"):
+            # The cat-file process is reused and paths are resolved relatively to the current directory
+            assert index_reader.read_many(["b.yaml", "../a.yaml"]) == {"b.yaml": b"staged\n", "../a.yaml": b"staged\n"}
+
+
+def test_paths_to_check(git_repository):
+    _write("a.go", ["staged"])
+    subprocess.check_call(("git", "add", "a.go"))  # nosec: disable=B603
+    _write("a.go", ["not staged"])
+
+    with paths_to_check(["a.go"], from_index=False) as paths:
+        assert paths == {"a.go": "a.go"}
+
+    with paths_to_check(["a.go"], from_index=True) as paths:
+        assert os.path.basename(paths["a.go"]) == "a.go"
+        with open(paths["a.go"]) as f:
+            assert f.read() == "staged\n"
+        assert restore_filenames("{} is not formatted".format(paths["a.go"]), paths) == "a.go is not formatted"
+    assert not os.path.exists(paths["a.go"])
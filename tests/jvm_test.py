@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+
+import mock
+import pytest
+
+from language_formatters_pre_commit_hooks.jvm import _java_identity
+from language_formatters_pre_commit_hooks.jvm import claim_archive_dump
+from language_formatters_pre_commit_hooks.jvm import class_data_sharing_archive
+from language_formatters_pre_commit_hooks.jvm import formatter_command
+from language_formatters_pre_commit_hooks.jvm import jvm_arguments
+from language_formatters_pre_commit_hooks.jvm import STARTUP_PROFILE_ARGUMENTS
+
+
+@pytest.fixture
+def java_executable(tmpdir):
+    java = tmpdir.join("java")
+    java.write("")
+    with mock.patch("language_formatters_pre_commit_hooks.jvm.shutil.which", autospec=True, return_value=java.strpath):
+        yield java
+
+
+@pytest.fixture
+def jar_path(tmpdir):
+    jar = tmpdir.join("tool.jar")
+    jar.write("")
+    return jar.strpath
+
+
+def test__java_identity_without_java():
+    with mock.patch("language_formatters_pre_commit_hooks.jvm.shutil.which", autospec=True, return_value=None):
+        assert _java_identity() is None
+        assert class_data_sharing_archive("tool.jar") is None
+
+
+def test__java_identity_changes_with_java_executable(java_executable):
+    identity = _java_identity()
+    assert identity is not None
+    assert identity == _java_identity()
+
+    java_executable.write("updated")
+    assert identity != _java_identity()
+
+
+def test_jvm_arguments_without_java(jar_path):
+    with mock.patch("language_formatters_pre_commit_hooks.jvm.shutil.which", autospec=True, return_value=None):
+        with jvm_arguments(jar_path) as arguments:
+            assert not any(argument.startswith("-XX:SharedArchiveFile") for argument in arguments)
+            assert not any(argument.startswith("-XX:ArchiveClassesAtExit") for argument in arguments)
+
+
+@pytest.mark.usefixtures("java_executable")
+def test_jvm_arguments_dumps_and_then_uses_archive(jar_path):
+    archive = class_data_sharing_archive(jar_path)
+    assert archive is not None
+
+    with jvm_arguments(jar_path) as arguments:
+        dump_arguments = [argument for argument in arguments if argument.startswith("-XX:ArchiveClassesAtExit=")]
+        assert len(dump_arguments) == 1
+        # Simulate the JVM dumping the archive on exit
+        with open(dump_arguments[0].split("=", 1)[1], "w") as f:
+            f.write("archive")
+        assert not os.path.exists(archive)
+
+    assert os.path.exists(archive)
+
+    with jvm_arguments(jar_path) as arguments:
+        assert "-XX:SharedArchiveFile={}".format(archive) in arguments
+        assert not any(argument.startswith("-XX:ArchiveClassesAtExit") for argument in arguments)
+
+
+@pytest.mark.usefixtures("java_executable")
+def test_claim_archive_dump(jar_path):
+    with jvm_arguments(jar_path) as arguments:
+        commands = [claim_archive_dump(["java", *arguments, "-jar", jar_path, chunk]) for chunk in ("A.java", "B.java", "C.java")]
+    # A single JVM dumps the archive, the concurrent ones would overwrite it
+    assert [any(argument.startswith("-XX:ArchiveClassesAtExit=") for argument in command) for command in commands] == [True, False, False]
+    assert [command[-1] for command in commands] == ["A.java", "B.java", "C.java"]
+
+    # Each context has its own dump
+    with jvm_arguments(jar_path) as arguments:
+        assert claim_archive_dump(["java", *arguments]) == ["java", *arguments]
+
+
+@pytest.mark.usefixtures("java_executable")
+def test_jvm_arguments_ignores_missing_dump(jar_path):
+    # Older JVMs ignore -XX:ArchiveClassesAtExit, so no archive is produced
+    archive = class_data_sharing_archive(jar_path)
+    assert archive is not None
+
+    with jvm_arguments(jar_path):
+        pass
+    assert not os.path.exists(archive)
+
+
+@pytest.mark.parametrize("startup_profile", [True, False])
+def test_jvm_arguments_startup_profile(jar_path, startup_profile):
+    with jvm_arguments(jar_path, startup_profile=startup_profile) as arguments:
+        assert all((argument in arguments) == startup_profile for argument in STARTUP_PROFILE_ARGUMENTS)
+
+
+def test_formatter_command(jar_path):
+    with formatter_command("/cache/google-java-formatter1.9-linux-x86-64") as command:
+        assert command == ["/cache/google-java-formatter1.9-linux-x86-64"]
+
+    with mock.patch("language_formatters_pre_commit_hooks.jvm.shutil.which", autospec=True, return_value=None):
+        with formatter_command(jar_path, startup_profile=True) as command, jvm_arguments(jar_path, startup_profile=True) as arguments:
+            assert command == ["java", *arguments, "-jar", jar_path]
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+import subprocess  # nosec: disable=B404
+import sys
+import time
+
+from language_formatters_pre_commit_hooks.memory_report import MemoryProfiler
+
+
+def _allocate(size):
+    content = [bytearray(1024) for _ in range(size // 1024)]
+    time.sleep(0.1)
+    return len(content)
+
+
+def test_memory_profiler(tmpdir):
+    report_path = tmpdir.join("report.json").strpath
+    memory_profiler = MemoryProfiler("pretty-format-test", report_path)
+
+    with memory_profiler.file("small.yaml"), memory_profiler.phase("format"):
+        _allocate(1024 * 1024)
+    with memory_profiler.file("big.yaml"), memory_profiler.phase("format"):
+        _allocate(8 * 1024 * 1024)
+    with memory_profiler.phase("tool"):
+        subprocess.check_call((sys.executable, "-c", "import time; x = bytearray(64 * 1024 * 1024); time.sleep(0.2)"))  # nosec: disable=B603
+    memory_profiler.save()
+
+    with open(report_path) as f:
+        report = json.load(f)
+
+    assert report["hook"] == "pretty-format-test"
+    assert 1024 * 1024 <= report["files"]["small.yaml"] < report["files"]["big.yaml"]
+    assert report["phases"]["format"]["peak_increase"] >= 8 * 1024 * 1024
+    assert report["peak_traced_memory"] >= report["files"]["big.yaml"]
+    if sys.platform != "win32":
+        assert report["phases"]["tool"]["children_peak_rss"] >= 64 * 1024 * 1024
+    assert any(__file__ in allocation["site"] for allocation in report["top_allocations"])
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import stat
+import sys
+
+import mock
+import pytest
+import requests
+
+from language_formatters_pre_commit_hooks.native_image import download_native_image
+from language_formatters_pre_commit_hooks.native_image import native_image_platform
+
+
+@pytest.fixture(autouse=True)
+def pre_commit_home(tmpdir):
+    with mock.patch.dict(os.environ, {"PRE_COMMIT_HOME": tmpdir.strpath}):
+        yield tmpdir
+
+
+@pytest.fixture
+def linux_x86_64():
+    with mock.patch("platform.system", return_value="Linux"), mock.patch("platform.machine", return_value="x86_64"):
+        yield
+
+
+def _not_found_error() -> requests.HTTPError:
+    response = requests.Response()
+    response.status_code = 404
+    return requests.HTTPError("404 Client Error", response=response)
+
+
+@pytest.mark.parametrize(
+    "system, machine, expected_platform",
+    [
+        ("Linux", "x86_64", "linux-x86-64"),
+        ("Linux", "aarch64", "linux-arm64"),
+        ("Darwin", "arm64", "darwin-arm64"),
+        ("Windows", "AMD64", "windows-x86-64"),
+        ("Linux", "ppc64le", None),
+        ("FreeBSD", "amd64", None),
+    ],
+)
+def test_native_image_platform(system, machine, expected_platform):
+    with mock.patch("platform.system", return_value=system), mock.patch("platform.machine", return_value=machine):
+        assert native_image_platform() == expected_platform
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Native images are downloaded without .exe suffix on POSIX platforms only")
+@pytest.mark.usefixtures("linux_x86_64")
+def test_download_native_image(pre_commit_home):
+    def _download_url(url, file_name):
+        path = pre_commit_home.join(file_name)
+        path.write("binary")
+        return path.strpath
+
+    with mock.patch(
+        "language_formatters_pre_commit_hooks.native_image.download_url",
+        autospec=True,
+        side_effect=_download_url,
+    ) as mock_download_url:
+        native_image = download_native_image("tool", "1.0", "https://host/{version}/tool_{platform}")
+
+    mock_download_url.assert_called_once_with("https://host/1.0/tool_linux-x86-64", "tool1.0-linux-x86-64")
+    assert native_image is not None and native_image == pre_commit_home.join("tool1.0-linux-x86-64").strpath
+    assert os.stat(native_image).st_mode & stat.S_IXUSR
+
+
+@pytest.mark.usefixtures("linux_x86_64")
+def test_download_native_image_remembers_missing_versions(capsys):
+    with mock.patch(
+        "language_formatters_pre_commit_hooks.native_image.download_url",
+        autospec=True,
+        side_effect=_not_found_error(),
+    ) as mock_download_url:
+        assert download_native_image("tool", "1.0", "https://host/{version}/tool_{platform}") is None
+        assert "falling back to the jar" in capsys.readouterr().err
+        # The following runs do not query the server again
+        assert download_native_image("tool", "1.0", "https://host/{version}/tool_{platform}") is None
+    mock_download_url.assert_called_once()
+
+
+@pytest.mark.usefixtures("linux_x86_64")
+def test_download_native_image_retries_after_network_errors():
+    with mock.patch(
+        "language_formatters_pre_commit_hooks.native_image.download_url",
+        autospec=True,
+        side_effect=requests.ConnectionError("Network is unreachable"),
+    ) as mock_download_url:
+        assert download_native_image("tool", "1.0", "https://host/{version}/tool_{platform}") is None
+        assert download_native_image("tool", "1.0", "https://host/{version}/tool_{platform}") is None
+    assert mock_download_url.call_count == 2
+
+
+def test_download_native_image_on_unsupported_platform(capsys):
+    with mock.patch("platform.system", return_value="SunOS"), mock.patch(
+        "language_formatters_pre_commit_hooks.native_image.download_url",
+        autospec=True,
+    ) as mock_download_url:
+        assert download_native_image("tool", "1.0", "https://host/{version}/tool_{platform}") is None
+    mock_download_url.assert_not_called()
+    assert "No native image of tool is available for SunOS" in capsys.readouterr().err
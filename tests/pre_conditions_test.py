@@ -26,6 +26,11 @@ def success(request):
 def test__ToolRequired(success: bool) -> None:
     decorator = _ToolRequired(tool_name="test", check_command=lambda: success, download_install_url="url")
     assert decorator.is_tool_installed() == success
+    if success:
+        decorator.ensure_installed()
+    else:
+        with pytest.raises(ToolNotInstalled):
+            decorator.ensure_installed()
 
     def throw_exception():
         raise SyntaxError("This error is thrown by the decorated function")
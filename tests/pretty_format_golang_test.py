@@ -3,13 +3,19 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import os
 import shutil
 
 import pytest
 from mock import patch
 
-from language_formatters_pre_commit_hooks.pretty_format_golang import _get_eol_attribute
+from language_formatters_pre_commit_hooks.failure_limit import FILES_PER_INVOCATION_WITH_LIMIT
+from language_formatters_pre_commit_hooks.pretty_format_golang import _needs_eol_hint
 from language_formatters_pre_commit_hooks.pretty_format_golang import pretty_format_golang
+from language_formatters_pre_commit_hooks.result_cache import executable_identity
+from language_formatters_pre_commit_hooks.run_history import load_runs
+from language_formatters_pre_commit_hooks.utils import COMMAND_CANCELLED_EXIT_CODE
+from language_formatters_pre_commit_hooks.utils import run_commands
 from tests import change_dir_context
 from tests import run_autofix_test
 from tests import undecorate_function
@@ -29,17 +35,16 @@ def undecorate_method():
 
 
 @pytest.mark.parametrize(
-    "exit_status, output, expected_eol",
+    "git_attributes, expected_hint",
     [
-        (1, "", None),
-        (0, "", None),
-        (0, "a\0eol\0lf\0", "lf"),
+        ({}, False),
+        ({"a.go": {"eol": "lf"}}, False),
+        ({"a.go": {"eol": "lf"}, "b.go": {"eol": "unspecified"}}, True),
+        ({"a.go": {"eol": "crlf"}}, True),
     ],
 )
-@patch("language_formatters_pre_commit_hooks.pretty_format_golang.run_command", autospec=True)
-def test__get_eol_attribute(mock_run_command, exit_status, output, expected_eol):
-    mock_run_command.return_value = (exit_status, output)
-    assert _get_eol_attribute() == expected_eol
+def test__needs_eol_hint(git_attributes, expected_hint):
+    assert _needs_eol_hint(["a.go", "b.go"], git_attributes) == expected_hint
 
 
 @pytest.mark.parametrize(
@@ -57,3 +62,76 @@ def test_pretty_format_golang(undecorate_method, filename, expected_retval):
 
 def test_pretty_format_golang_autofix(tmpdir, undecorate_method):
     run_autofix_test(tmpdir, undecorate_method, "not-pretty-formatted.go", "not-pretty-formatted_fixed.go")
+
+
+def test_pretty_format_golang_jobs(undecorate_method, capsys):
+    assert undecorate_method(["--jobs", "2", "pretty-formatted.go", "not-pretty-formatted.go", "not-pretty-formatted_fixed.go"]) == 1
+    assert "The following files are not properly formatted: not-pretty-formatted.go\n" in capsys.readouterr().out
+
+
+def test_pretty_format_golang_fail_fast(undecorate_method, capsys):
+    def _run_commands(commands, stop, **kwargs):
+        # The first invocation completes, and reports a not pretty-formatted file, so the other one is cancelled
+        assert stop(0, (0, "not-pretty-formatted.go\n"))
+        return [(0, "not-pretty-formatted.go\n"), (COMMAND_CANCELLED_EXIT_CODE, "")]
+
+    with patch("language_formatters_pre_commit_hooks.pretty_format_golang.run_commands", side_effect=_run_commands):
+        assert undecorate_method(["--fail-fast", "--jobs", "2", "not-pretty-formatted.go", "pretty-formatted.go"]) == 1
+
+    output = capsys.readouterr().out
+    assert "The following files are not properly formatted: not-pretty-formatted.go\n" in output
+    assert "Stopped after 1 failures (see --fail-fast and --max-failures), 1 files have not been checked\n" in output
+
+
+def test_pretty_format_golang_records_gofmt_identity(undecorate_method, tmpdir):
+    with patch.dict(os.environ, {"PRE_COMMIT_HOME": tmpdir.strpath}):
+        assert undecorate_method(["--record-run-history", "pretty-formatted.go"]) == 0
+        (run,) = load_runs()
+    assert run.tool_version == executable_identity("gofmt")
+
+
+def test_pretty_format_golang_max_failures_single_job(undecorate_method, tmpdir, capsys):
+    filenames = []
+    for index in range(FILES_PER_INVOCATION_WITH_LIMIT + 8):
+        filename = tmpdir.join("not-pretty-formatted-{:02d}.go".format(index)).strpath
+        shutil.copyfile("not-pretty-formatted.go", filename)
+        filenames.append(filename)
+
+    with patch(
+        "language_formatters_pre_commit_hooks.pretty_format_golang.run_commands", autospec=True, wraps=run_commands
+    ) as mock_run_commands:
+        assert undecorate_method(["--max-failures", "2"] + filenames) == 1
+
+    # The files are split in bounded invocations, and the run stops once the first one reports the failures
+    commands = mock_run_commands.call_args[0][0]
+    assert [len(command) - 2 for command in commands] == [FILES_PER_INVOCATION_WITH_LIMIT, 8]
+    assert capsys.readouterr().out == (
+        "The following files are not properly formatted: {}, {}\n"
+        "Stopped after 2 failures (see --fail-fast and --max-failures), {} files have not been checked\n"
+    ).format(filenames[0], filenames[1], len(filenames) - 2)
+
+
+def test_pretty_format_golang_file_list(undecorate_method, tmpdir, capsys):
+    file_list = tmpdir.join("files")
+    file_list.write_binary(b"pretty-formatted.go\0not-pretty-formatted.go\0")
+    assert undecorate_method(["@" + file_list.strpath]) == 1
+    assert "The following files are not properly formatted: not-pretty-formatted.go\n" in capsys.readouterr().out
+
+
+def test_pretty_format_golang_result_cache(undecorate_method, tmpdir, capsys):
+    cache_arguments = ["--result-cache", tmpdir.join("cache").strpath]
+    assert undecorate_method(cache_arguments + ["pretty-formatted.go", "not-pretty-formatted.go"]) == 1
+
+    # Files verified as pretty-formatted are not passed to gofmt anymore
+    with patch(
+        "language_formatters_pre_commit_hooks.pretty_format_golang.run_commands",
+        autospec=True,
+        return_value=[(0, "not-pretty-formatted.go\n")],
+    ) as mock_run_commands:
+        assert undecorate_method(cache_arguments + ["pretty-formatted.go", "not-pretty-formatted.go"]) == 1
+        (commands,), _ = mock_run_commands.call_args
+        assert [command[-1] for command in commands] == ["not-pretty-formatted.go"]
+
+        mock_run_commands.reset_mock()
+        assert undecorate_method(cache_arguments + ["pretty-formatted.go"]) == 0
+        assert not mock_run_commands.called
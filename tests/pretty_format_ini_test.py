@@ -9,6 +9,7 @@ import shutil
 import pytest
 
 from language_formatters_pre_commit_hooks.pretty_format_ini import pretty_format_ini
+from tests import git_repository_context
 
 
 @pytest.fixture(autouse=True)
@@ -43,3 +44,15 @@ def test_pretty_format_ini_autofix(tmpdir):
     # file was formatted (shouldn't trigger linter again)
     ret = pretty_format_ini([srcfile.strpath])
     assert ret == 0
+
+
+@pytest.mark.parametrize("eol, expected_newline", (("crlf", b"\r\n"), ("lf", b"\n")))
+def test_pretty_format_ini_autofix_honors_eol_attribute(tmpdir, eol, expected_newline):
+    shutil.copyfile("not-pretty-formatted.ini", tmpdir.join("to_be_fixed.ini").strpath)
+    with git_repository_context(tmpdir.strpath):
+        tmpdir.join(".gitattributes").write("*.ini eol={}\n".format(eol))
+        assert pretty_format_ini(["--autofix", "to_be_fixed.ini"]) == 1
+        assert pretty_format_ini(["to_be_fixed.ini"]) == 0
+
+    content = tmpdir.join("to_be_fixed.ini").read_binary()
+    assert content.count(expected_newline) == content.count(b"\n") > 0
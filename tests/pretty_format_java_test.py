@@ -3,14 +3,26 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import os
 import shutil
+import sys
+from contextlib import ExitStack
 
+import mock
 import pytest
+from mock import patch
 
+from language_formatters_pre_commit_hooks.git_utils import LineRange
+from language_formatters_pre_commit_hooks.pre_conditions import ToolNotInstalled
+from language_formatters_pre_commit_hooks.pretty_format_java import _clean_files
+from language_formatters_pre_commit_hooks.pretty_format_java import _google_java_formatter_arguments
+from language_formatters_pre_commit_hooks.pretty_format_java import _google_java_formatter_commands
+from language_formatters_pre_commit_hooks.pretty_format_java import _is_attributable
+from language_formatters_pre_commit_hooks.pretty_format_java import GOOGLE_JAVA_FORMATTER_NATIVE_IMAGE_URL
 from language_formatters_pre_commit_hooks.pretty_format_java import pretty_format_java
+from language_formatters_pre_commit_hooks.time_budget import TimeBudget
 from tests import change_dir_context
 from tests import run_autofix_test
-from tests import undecorate_function
 
 
 @pytest.fixture(autouse=True)
@@ -21,9 +33,9 @@ def change_dir():
 
 @pytest.fixture
 def undecorate_method():
-    # Method undecoration is needed to ensure that tests could be executed even if the tool is not installed
-    with undecorate_function(pretty_format_java) as undecorated:
-        yield undecorated
+    # The JRE check is skipped to ensure that tests could be executed even if the tool is not installed
+    with patch("language_formatters_pre_commit_hooks.pretty_format_java.java_required.ensure_installed", autospec=True):
+        yield pretty_format_java
 
 
 @pytest.mark.parametrize(
@@ -41,3 +53,139 @@ def test_pretty_format_java(undecorate_method, filename, expected_retval):
 
 def test_pretty_format_java_autofix(tmpdir, undecorate_method):
     run_autofix_test(tmpdir, undecorate_method, "not-pretty-formatted.java", "not-pretty-formatted_fixed.java")
+
+
+def test_google_java_formatter_arguments():
+    assert list(_google_java_formatter_arguments(TimeBudget(None), ["a.java", "b.java"], None)) == [([], ["a.java", "b.java"])]
+
+
+def test_google_java_formatter_arguments_with_changed_lines():
+    changed_line_ranges = {"a.java": [LineRange(start=1, end=2), LineRange(start=5, end=5)], "b.java": [LineRange(start=3, end=4)]}
+    assert list(_google_java_formatter_arguments(TimeBudget(None), ["a.java", "b.java"], changed_line_ranges)) == [
+        (["--lines", "1:2", "--lines", "5:5"], ["a.java"]),
+        (["--lines", "3:4"], ["b.java"]),
+    ]
+
+
+@pytest.mark.parametrize(
+    "fits_command_line, filenames, expected_parameters_file",
+    [
+        (True, ["A.java", "B.java"], False),
+        (False, ["A.java", "B.java"], True),
+        (False, ["A.java", "with space/B.java"], False),
+    ],
+)
+def test_google_java_formatter_commands_uses_parameters_file(fits_command_line, filenames, expected_parameters_file):
+    files_paths = {filename: "staged/" + filename for filename in filenames}
+    with patch("language_formatters_pre_commit_hooks.pretty_format_java.fits_command_line", return_value=fits_command_line), patch(
+        "language_formatters_pre_commit_hooks.pretty_format_java.command_line_chunks",
+        return_value=iter([list(files_paths.values())]),
+    ), ExitStack() as exit_stack:
+        commands = _google_java_formatter_commands(["java", "-jar", "gjf.jar"], files_paths, exit_stack)
+        if expected_parameters_file:
+            [(command, files)] = commands
+            assert command[:-1] == ["java", "-jar", "gjf.jar"] and command[-1].startswith("@")
+            with open(command[-1][1:]) as f:
+                assert f.read() == "\n".join(files_paths.values())
+        else:
+            assert commands == [(["java", "-jar", "gjf.jar"] + list(files_paths.values()), filenames)]
+
+    if expected_parameters_file:
+        # The parameters file is removed once the commands are run
+        assert not os.path.exists(command[-1][1:])
+        assert files == filenames
+
+
+@pytest.mark.parametrize(
+    "status, output, autofix, expected_clean_files",
+    [
+        (0, "", False, ["A.java", "B.java"]),
+        (0, "", True, ["A.java", "B.java"]),
+        (1, "B.java\n", False, ["A.java"]),
+        (1, "", True, []),
+        (1, "B.java:1:1: error: class, interface, or enum expected\n", False, []),
+    ],
+)
+def test_clean_files(status, output, autofix, expected_clean_files):
+    assert _clean_files(["A.java", "B.java"], status, output, autofix) == expected_clean_files
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="The stub native image is a shell script")
+def test_pretty_format_java_native_image(tmpdir):
+    native_image = tmpdir.join("google-java-formatter")
+    native_image.write('#!/bin/sh\necho "$@" > {}\n'.format(tmpdir.join("arguments").strpath))
+    native_image.chmod(0o755)
+
+    with patch(
+        "language_formatters_pre_commit_hooks.pretty_format_java.download_native_image",
+        autospec=True,
+        return_value=native_image.strpath,
+    ) as mock_download_native_image, patch(
+        "language_formatters_pre_commit_hooks.pretty_format_java.java_required.ensure_installed",
+        autospec=True,
+    ) as mock_ensure_installed:
+        assert pretty_format_java(["--native-image", "pretty-formatted.java"]) == 0
+
+    mock_download_native_image.assert_called_once_with("google-java-formatter", mock.ANY, GOOGLE_JAVA_FORMATTER_NATIVE_IMAGE_URL)
+    # The JVM is not needed at all
+    mock_ensure_installed.assert_not_called()
+    assert tmpdir.join("arguments").read() == "--set-exit-if-changed --dry-run pretty-formatted.java\n"
+
+
+_FAILING_BATCH_STUB = """#!/bin/sh
+status=0
+for f in "$@"; do
+  case "$f" in
+    invalid.java) echo "$f:1:1: error: class, interface, or enum expected"; exit 1;;
+    not-pretty-formatted.java) echo "$f"; status=1;;
+  esac
+done
+exit $status
+"""
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="The stub native image is a shell script")
+def test_pretty_format_java_isolates_not_valid_files(tmpdir, capsys):
+    # The stub formatter fails the whole invocation as soon as a file is not valid
+    native_image = tmpdir.join("google-java-formatter")
+    native_image.write(_FAILING_BATCH_STUB)
+    native_image.chmod(0o755)
+
+    with patch(
+        "language_formatters_pre_commit_hooks.pretty_format_java.download_native_image",
+        autospec=True,
+        return_value=native_image.strpath,
+    ):
+        assert pretty_format_java(["--native-image", "pretty-formatted.java", "invalid.java", "not-pretty-formatted.java"]) == 1
+
+    assert capsys.readouterr().out == (
+        "The following files are not valid java source files: invalid.java\n"
+        "The following files are not properly formatted: not-pretty-formatted.java\n"
+    )
+
+
+@pytest.mark.parametrize(
+    "result, expected_attributable",
+    [
+        ((0, ""), True),
+        ((1, "B.java\n"), True),
+        ((124, "Command timed out after 1 seconds: google-java-format\n"), True),
+        ((1, "B.java:1:1: error: class, interface, or enum expected\n"), False),
+    ],
+)
+def test_is_attributable(result, expected_attributable):
+    assert _is_attributable(result, ["A.java", "B.java"]) == expected_attributable
+
+
+def test_pretty_format_java_native_image_falls_back_to_jar():
+    with patch(
+        "language_formatters_pre_commit_hooks.pretty_format_java.download_native_image",
+        autospec=True,
+        return_value=None,
+    ), patch(
+        "language_formatters_pre_commit_hooks.pretty_format_java.java_required.ensure_installed",
+        autospec=True,
+        side_effect=ToolNotInstalled(tool_name="JRE", download_install_url="url"),
+    ):
+        with pytest.raises(ToolNotInstalled):
+            pretty_format_java(["--native-image", "pretty-formatted.java"])
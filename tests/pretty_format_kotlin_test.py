@@ -6,11 +6,12 @@ from __future__ import unicode_literals
 import shutil
 
 import pytest
+from mock import patch
 
+from language_formatters_pre_commit_hooks.pretty_format_kotlin import _is_attributable
 from language_formatters_pre_commit_hooks.pretty_format_kotlin import pretty_format_kotlin
 from tests import change_dir_context
 from tests import run_autofix_test
-from tests import undecorate_function
 
 
 @pytest.fixture(autouse=True)
@@ -21,9 +22,9 @@ def change_dir():
 
 @pytest.fixture
 def undecorate_method():
-    # Method undecoration is needed to ensure that tests could be executed even if the tool is not installed
-    with undecorate_function(pretty_format_kotlin) as undecorated:
-        yield undecorated
+    # The JRE check is skipped to ensure that tests could be executed even if the tool is not installed
+    with patch("language_formatters_pre_commit_hooks.pretty_format_kotlin.java_required.ensure_installed", autospec=True):
+        yield pretty_format_kotlin
 
 
 @pytest.mark.parametrize(
@@ -41,3 +42,22 @@ def test_pretty_format_kotlin(undecorate_method, filename, expected_retval):
 
 def test_pretty_format_kotlin_autofix(tmpdir, undecorate_method):
     run_autofix_test(tmpdir, undecorate_method, "not-pretty-formatted.kt", "not-pretty-formatted_fixed.kt")
+
+
+def test_pretty_format_kotlin_native_image_requires_url(capsys):
+    with pytest.raises(SystemExit):
+        pretty_format_kotlin(["--native-image", "pretty-formatted.kt"])
+    assert "--native-image requires --native-image-url" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize(
+    "result, expected_attributable",
+    [
+        ((0, ""), True),
+        ((1, 'src/B.kt:1:1: Unexpected blank line(s) before "}" (no-blank-line-before-rbrace)\n'), True),
+        ((124, "Command timed out after 1 seconds: ktlint\n"), True),
+        ((1, 'Exception in thread "main" java.lang.IllegalStateException\n'), False),
+    ],
+)
+def test_is_attributable(result, expected_attributable):
+    assert _is_attributable(["src/A.kt", "src/B.kt"], result) == expected_attributable
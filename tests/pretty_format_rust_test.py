@@ -7,8 +7,20 @@ import os
 from shutil import copyfile
 
 import pytest
+from mock import patch
 
+from language_formatters_pre_commit_hooks.file_selection import select_shard
+from language_formatters_pre_commit_hooks.file_selection import Shard
+from language_formatters_pre_commit_hooks.git_utils import LineRange
+from language_formatters_pre_commit_hooks.pretty_format_rust import _cargo_fmt_check_failures
+from language_formatters_pre_commit_hooks.pretty_format_rust import _file_lines_arguments
+from language_formatters_pre_commit_hooks.pretty_format_rust import _is_attributable
+from language_formatters_pre_commit_hooks.pretty_format_rust import _not_valid_files
+from language_formatters_pre_commit_hooks.pretty_format_rust import _not_well_formatted_paths
+from language_formatters_pre_commit_hooks.pretty_format_rust import _rustfmt_identity
 from language_formatters_pre_commit_hooks.pretty_format_rust import pretty_format_rust
+from language_formatters_pre_commit_hooks.run_history import load_runs
+from language_formatters_pre_commit_hooks.utils import run_commands
 from tests import change_dir_context
 from tests import run_autofix_test
 from tests import undecorate_function
@@ -47,3 +59,150 @@ def test_pretty_format_rust(undecorate_method, filename, expected_retval):
 def test_pretty_format_rust_autofix(tmpdir, undecorate_method):
     copyfile("not-pretty-formatted/Cargo.toml", tmpdir.join("Cargo.toml").strpath)
     run_autofix_test(tmpdir, undecorate_method, "not-pretty-formatted/src/main.rs", "not-pretty-formatted_fixed/src/main.rs")
+
+
+def test_pretty_format_rust_isolates_not_valid_files(tmpdir, undecorate_method, capsys):
+    copyfile("not-pretty-formatted/Cargo.toml", tmpdir.join("Cargo.toml").strpath)
+    tmpdir.mkdir("src")
+    copyfile("not-pretty-formatted/src/main.rs", tmpdir.join("src", "main.rs").strpath)
+    copyfile("invalid/src/main.rs", tmpdir.join("src", "invalid.rs").strpath)
+    copyfile("pretty-formatted/src/main.rs", tmpdir.join("src", "pretty.rs").strpath)
+
+    with change_dir_context(tmpdir.strpath):
+        assert undecorate_method(["--autofix", "src/pretty.rs", "src/invalid.rs", "src/main.rs"]) == 1
+    # The not valid file is reported on its own, and the valid files are fixed in the same run
+    assert "The following files are not valid rust source files: src/invalid.rs\n" in capsys.readouterr().out
+    assert tmpdir.join("src", "main.rs").read() == open("not-pretty-formatted_fixed/src/main.rs").read()
+
+
+def test_pretty_format_rust_does_not_blame_valid_files_for_not_valid_target(tmpdir, undecorate_method, capsys):
+    copyfile("not-pretty-formatted/Cargo.toml", tmpdir.join("Cargo.toml").strpath)
+    tmpdir.mkdir("src")
+    copyfile("invalid/src/main.rs", tmpdir.join("src", "main.rs").strpath)
+    copyfile("pretty-formatted/src/main.rs", tmpdir.join("src", "a.rs").strpath)
+    copyfile("pretty-formatted/src/main.rs", tmpdir.join("src", "b.rs").strpath)
+
+    with change_dir_context(tmpdir.strpath):
+        assert undecorate_method(["src/a.rs", "src/b.rs"]) == 1
+    # cargo fmt checks the not valid package target in every invocation, it is reported instead of the checked files
+    assert capsys.readouterr().out == "The following files are not valid rust source files: {}\n".format(
+        os.path.realpath(tmpdir.join("src", "main.rs").strpath),
+    )
+
+
+def test_pretty_format_rust_without_filenames_outside_of_package(tmpdir, undecorate_method, capsys):
+    with change_dir_context(tmpdir.strpath), patch(
+        "language_formatters_pre_commit_hooks.pretty_format_rust.run_commands", autospec=True, wraps=run_commands
+    ) as mock_run_commands:
+        assert undecorate_method([]) == 1
+    # The whole package is checked, the not attributable failure of the invocation without files is not bisected
+    mock_run_commands.assert_called_once()
+    assert "could not find `Cargo.toml`" in capsys.readouterr().err
+
+
+def test_pretty_format_rust_does_not_run_cargo_for_empty_shard(undecorate_method):
+    filename = os.path.abspath("not-pretty-formatted/src/main.rs")
+    empty_shard = "2/2" if select_shard([filename], Shard(number=1, total=2)) else "1/2"
+    with patch("language_formatters_pre_commit_hooks.pretty_format_rust.run_commands", autospec=True) as mock_run_command:
+        assert undecorate_method(["--shard", empty_shard, filename]) == 0
+    assert not mock_run_command.called
+
+
+@pytest.mark.parametrize(
+    "result, expected_failures",
+    [
+        ((0, ""), 0),
+        ((1, "Diff in /src/a.rs at line 1:\n-a\nDiff in /src/a.rs at line 5:\n-b\nDiff in /src/b.rs at line 1:\n-c\n"), 2),
+        ((1, "error: expected item, found `fn`\n"), 1),
+    ],
+)
+def test_cargo_fmt_check_failures(result, expected_failures):
+    assert _cargo_fmt_check_failures(result) == expected_failures
+
+
+@pytest.mark.parametrize(
+    "result, expected_attributable",
+    [
+        ((0, ""), True),
+        ((1, "Diff in /src/a.rs at line 1:\n-a\n"), True),
+        ((124, "Command timed out after 1 seconds: cargo fmt\n"), True),
+        ((1, "Diff in /src/a.rs at line 1:\n-a\nerror: expected item, found `fn`\n --> /src/b.rs:1:1\n"), True),
+        ((1, "Diff in /src/a.rs at line 1:\n-a\nerror: expected item, found `fn`\n"), False),
+    ],
+)
+def test_is_attributable(result, expected_attributable):
+    assert _is_attributable(["/src/a.rs", "/src/b.rs"], result) == expected_attributable
+
+
+@pytest.mark.parametrize(
+    "output, expected_not_valid_files",
+    [
+        ("", set()),
+        ("error: expected item, found `fn`\n --> {cwd}/src/b.rs:1:1\n", {"src/b.rs"}),
+        # The package targets are checked as well, even if they are not among the files
+        ("error: this file contains an unclosed delimiter\n --> /project/src/main.rs:1:9\n", {"/project/src/main.rs"}),
+        ("error: expected item, found `fn`\n", {"src/a.rs", "src/b.rs"}),
+    ],
+)
+def test_not_valid_files(output, expected_not_valid_files):
+    assert _not_valid_files(["src/a.rs", "src/b.rs"], output.format(cwd=os.getcwd())) == expected_not_valid_files
+
+
+def test_file_lines_arguments():
+    assert _file_lines_arguments(None) == []
+    assert _file_lines_arguments({"src/main.rs": [LineRange(start=1, end=2), LineRange(start=7, end=7)]}) == [
+        "--unstable-features",
+        "--file-lines",
+        '[{"file": "src/main.rs", "range": [1, 2]}, {"file": "src/main.rs", "range": [7, 7]}]',
+    ]
+
+
+def test_pretty_format_rust_changed_lines_only_without_changes(undecorate_method):
+    filename = os.path.abspath("not-pretty-formatted/src/main.rs")
+    with patch("language_formatters_pre_commit_hooks.pretty_format_rust.staged_changed_line_ranges", return_value={}), patch(
+        "language_formatters_pre_commit_hooks.pretty_format_rust.run_commands",
+        autospec=True,
+    ) as mock_run_command:
+        assert undecorate_method(["--changed-lines-only", filename]) == 0
+    assert not mock_run_command.called
+
+
+@pytest.mark.parametrize(
+    "output, expected_paths",
+    [
+        ("", set()),
+        ("Diff in /project/src/main.rs:1:\n fn main() {\n-println!();\n+    println!();\n", {"/project/src/main.rs"}),
+        ("Diff in /project/src/lib.rs at line 3:\n-a\n+b\n", {"/project/src/lib.rs"}),
+        ("error: expected item, found `fn`\n --> /project/src/main.rs:1:1\n", None),
+        ("Diff in src/main.rs:1:\n", None),
+    ],
+)
+def test_not_well_formatted_paths(output, expected_paths):
+    if expected_paths is not None:
+        expected_paths = {os.path.realpath(path) for path in expected_paths}
+    assert _not_well_formatted_paths(output) == expected_paths
+
+
+def test_pretty_format_rust_records_rustfmt_identity(undecorate_method, tmpdir):
+    with patch.dict(os.environ, {"PRE_COMMIT_HOME": tmpdir.strpath, "RUST_TOOLCHAIN": "stable"}), patch(
+        "language_formatters_pre_commit_hooks.pretty_format_rust._rustfmt_identity", autospec=True, return_value="rustfmt-identity"
+    ) as mock_rustfmt_identity, change_dir_context("pretty-formatted"):
+        assert undecorate_method(["--record-run-history", "src/main.rs"]) == 0
+        (run,) = load_runs()
+    mock_rustfmt_identity.assert_called_once_with("stable")
+    assert run.tool_version == "rustfmt-identity"
+
+
+def test_rustfmt_identity(tmpdir):
+    with patch.dict(os.environ, {"RUSTUP_HOME": tmpdir.strpath}):
+        assert _rustfmt_identity("stable") is None
+
+        rustfmt = tmpdir.join("toolchains", "stable-x86_64-unknown-linux-gnu", "bin", "rustfmt")
+        rustfmt.ensure()
+        rustfmt.chmod(0o755)
+        identity = _rustfmt_identity("stable")
+        assert identity is not None
+        assert _rustfmt_identity("nightly") is None
+
+        rustfmt.write("upgraded")
+        assert _rustfmt_identity("stable") != identity
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+
+import mock
+import pytest
+
+from language_formatters_pre_commit_hooks.pretty_format_stats import _percentile
+from language_formatters_pre_commit_hooks.pretty_format_stats import pretty_format_stats
+from language_formatters_pre_commit_hooks.run_history import RunRecorder
+
+
+@pytest.fixture(autouse=True)
+def pre_commit_home(tmpdir):
+    with mock.patch.dict(os.environ, {"PRE_COMMIT_HOME": tmpdir.strpath}):
+        yield tmpdir
+
+
+def _record_run(hook_name, tool_version, wall_time, file_count=1):
+    run_recorder = RunRecorder(hook_name, tool_version=tool_version, enabled=True)
+    run_recorder.file_count = file_count
+    with mock.patch("language_formatters_pre_commit_hooks.run_history.time.perf_counter", return_value=run_recorder._start + wall_time):
+        run_recorder.save(0)
+
+
+@pytest.mark.parametrize(
+    "values, percentile, expected",
+    [
+        ([1], 50, 1),
+        ([1, 2, 3, 4], 50, 2.5),
+        ([4, 3, 2, 1], 0, 1),
+        ([1, 2, 3, 4], 100, 4),
+        ([1, 2, 3, 4, 5], 90, 4.6),
+    ],
+)
+def test__percentile(values, percentile, expected):
+    assert _percentile(values, percentile) == pytest.approx(expected)
+
+
+def test_pretty_format_stats_without_history(capsys):
+    assert pretty_format_stats([]) == 0
+    assert "No run history recorded" in capsys.readouterr().out
+
+
+def test_pretty_format_stats_without_regressions(capsys):
+    _record_run("pretty-format-kotlin", "0.39.0", wall_time=2)
+    # A bigger repository is not a regression
+    _record_run("pretty-format-kotlin", "0.40.0", wall_time=4, file_count=2)
+
+    assert pretty_format_stats([]) == 0
+    output = capsys.readouterr().out
+    assert "0.39.0" in output and "0.40.0" in output
+    assert "regression" not in output
+
+
+def test_pretty_format_stats_with_regressions(capsys):
+    _record_run("pretty-format-kotlin", "0.39.0", wall_time=2)
+    _record_run("pretty-format-kotlin", "0.40.0", wall_time=3)
+    _record_run("pretty-format-java", "1.9", wall_time=10)
+
+    assert pretty_format_stats(["--hook", "pretty-format-kotlin"]) == 1
+    output = capsys.readouterr().out
+    assert "pretty-format-kotlin: median time per file went from 2.0000s (0.39.0) to 3.0000s (0.40.0), +50%" in output
+    assert "pretty-format-java" not in output
+
+    assert pretty_format_stats(["--regression-threshold", "0.6"]) == 0
@@ -5,6 +5,7 @@ from __future__ import unicode_literals
 
 import os
 
+import mock
 import pytest
 
 from language_formatters_pre_commit_hooks.pretty_format_toml import pretty_format_toml
@@ -41,3 +42,55 @@ def test_pretty_format_toml_autofix(tmpdir):
         "not-pretty-formatted.toml",
         "not-pretty-formatted_fixed.toml",
     )
+
+
+def test_pretty_format_toml_max_failures(capsys):
+    filenames = ["invalid.toml", "pretty-formatted.toml", "not-pretty-formatted.toml", "not-pretty-formatted_fixed.toml"]
+    # Not valid files do not prevent the following files from being checked
+    assert pretty_format_toml(filenames) == 1
+    assert capsys.readouterr().out == (
+        "Input File invalid.toml is not a valid TOML file\nFile not-pretty-formatted.toml is not pretty-formatted\n"
+    )
+
+    assert pretty_format_toml(["--max-failures", "1"] + filenames) == 1
+    assert capsys.readouterr().out == (
+        "Input File invalid.toml is not a valid TOML file\n"
+        "Stopped after 1 failures (see --fail-fast and --max-failures), 3 files have not been checked\n"
+    )
+
+    assert pretty_format_toml(["--max-failures", "2"] + filenames) == 1
+    assert "1 files have not been checked" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("memory_budget", ["1", "64M"])
+def test_pretty_format_toml_io_threads(tmpdir, capsys, memory_budget):
+    filenames = []
+    for index in range(7):
+        for name in ("invalid.toml", "pretty-formatted.toml", "not-pretty-formatted.toml"):
+            copy = tmpdir.join("{}-{}".format(index, name))
+            copy.write(open(name).read())
+            filenames.append(copy.strpath)
+
+    # Files are read ahead across the batches, and fixed in background, with the same output as the sequential run
+    with mock.patch("language_formatters_pre_commit_hooks.formatting.BATCH_SIZE", 4):
+        assert pretty_format_toml(filenames) == 1
+        sequential_output = capsys.readouterr().out
+        assert pretty_format_toml(["--io-threads", "3", "--io-memory-budget", memory_budget, "--autofix"] + filenames) == 1
+        assert capsys.readouterr().out == "".join(
+            "{}Fixing file {}\n".format(line, line.split()[1]) if line.endswith(" is not pretty-formatted\n") else line
+            for line in sequential_output.splitlines(keepends=True)
+        )
+
+    for filename in filenames:
+        if filename.endswith("not-pretty-formatted.toml"):
+            assert open(filename).read() == open("not-pretty-formatted_fixed.toml").read()
+
+
+def test_pretty_format_toml_io_threads_max_failures(capsys):
+    filenames = ["invalid.toml", "pretty-formatted.toml", "not-pretty-formatted.toml", "not-pretty-formatted_fixed.toml"]
+    with mock.patch("language_formatters_pre_commit_hooks.formatting.BATCH_SIZE", 1):
+        assert pretty_format_toml(["--io-threads", "2", "--max-failures", "1"] + filenames) == 1
+    assert capsys.readouterr().out == (
+        "Input File invalid.toml is not a valid TOML file\n"
+        "Stopped after 1 failures (see --fail-fast and --max-failures), 3 files have not been checked\n"
+    )
@@ -4,10 +4,20 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import os
+import random
+import subprocess  # nosec: disable=B404
+from sys import maxsize
 
+import mock
 import pytest
+from ruamel.yaml import YAML
 
+from language_formatters_pre_commit_hooks.pretty_format_yaml import _document_chunks
+from language_formatters_pre_commit_hooks.pretty_format_yaml import _PrettyFormattedDocumentScanner
+from language_formatters_pre_commit_hooks.pretty_format_yaml import _process_single_document
 from language_formatters_pre_commit_hooks.pretty_format_yaml import pretty_format_yaml
+from language_formatters_pre_commit_hooks.time_budget import TIME_BUDGET_EXHAUSTED_EXIT_CODE
+from tests import git_repository_context
 from tests import run_autofix_test
 from tests.pretty_format_rust_test import undecorate_method
 
@@ -56,3 +66,197 @@ def test_pretty_format_yaml_preserve_quotes():
     filename = "preserve-quotes-pretty-formatted.yaml"
     assert pretty_format_yaml([filename]) == 1
     assert pretty_format_yaml(["--preserve-quotes", filename]) == 0
+
+
+def _yaml(indent=2, preserve_quotes=False):
+    yaml = YAML()
+    yaml.indent = indent
+    yaml.preserve_quotes = preserve_quotes
+    yaml.width = maxsize
+    return yaml
+
+
+@pytest.mark.parametrize(
+    ("document", "expected_result"),
+    (
+        ("a: 1\nb:\n  c: d\n", True),
+        ("a:\n- 1\n- b: c\n  d: e\n", True),
+        ("- - a\n  - b\n- c\n", True),
+        ("a: 1  # comment\n\n# comment\nb:\n", True),
+        ("a:\n   b: c\n", False),  # wrong indentation
+        ("a:\n  - b\n", False),  # sequence dash offset
+        ("a:  1\n", False),  # spacing after colon
+        ("a: 1 \n", False),  # trailing whitespace
+        ("a: 'b'\n", False),  # quotes are not preserved
+        ("a: ~\n", False),  # null is normalized
+        ("a: True\n", False),  # bool is normalized
+        ("a: 01\n", False),  # int is normalized
+        ("a: 1\na: 2\n", False),  # duplicated key
+        ("a: [1, 2]\n", False),  # flow style
+        ("a: 1", False),  # missing trailing newline
+        ("\na: 1\n", False),  # leading blank line
+    ),
+)
+def test_pretty_formatted_document_scanner(document, expected_result):
+    yaml = _yaml()
+    assert _PrettyFormattedDocumentScanner(yaml, indent=2).is_pretty_formatted(document) is expected_result
+    if expected_result:
+        assert _process_single_document(document, yaml) == document
+
+
+def test_pretty_formatted_document_scanner_preserve_quotes():
+    document = "a: 'b'\nc: \"d\"\n"
+    assert _PrettyFormattedDocumentScanner(_yaml(preserve_quotes=True), indent=2).is_pretty_formatted(document)
+    assert not _PrettyFormattedDocumentScanner(_yaml(preserve_quotes=False), indent=2).is_pretty_formatted(document)
+
+
+@pytest.mark.parametrize("document", ("'a': 1\na: 2\n", 'a: 1\n"a": 2\n', "'a': 1\n\"a\": 2\n", "'a''b': 1\n\"a'b\": 2\n"))
+def test_pretty_formatted_document_scanner_duplicated_quoted_keys(document):
+    # Keys are compared by value, as the quotes do not make them distinct
+    assert not _PrettyFormattedDocumentScanner(_yaml(preserve_quotes=True), indent=2).is_pretty_formatted(document)
+
+
+@pytest.mark.parametrize("document", ("'a': 1\na: 2\n", 'a: 1\n"a": 2\n', "'a': 1\n\"a\": 2\n"))
+@pytest.mark.parametrize("preserve_quotes", (True, False))
+def test_pretty_format_yaml_duplicated_quoted_keys(tmpdir, document, preserve_quotes):
+    filename = tmpdir.join("duplicated-keys.yaml")
+    filename.write(document)
+    assert pretty_format_yaml((["--preserve-quotes"] if preserve_quotes else []) + [filename.strpath]) == 1
+
+
+@pytest.mark.parametrize("document", ("a: ...x\n", "- ...\n", "a:\n- ...\n", "...: a\n", "a: ...\n", "a: .x\n", "a: ..x\n"))
+def test_pretty_formatted_document_scanner_document_markers(document):
+    # Scalars starting like the document end marker are quoted by the dumper
+    yaml = _yaml()
+    is_pretty_formatted = _process_single_document(document, yaml) == document
+    assert _PrettyFormattedDocumentScanner(yaml, indent=2).is_pretty_formatted(document) is is_pretty_formatted
+
+
+def _random_document(rnd, indent, depth=0, column=0):
+    lines = []
+    scalars = ("a", "b c", "1", "1.5", "true", "True", "~", "01", "'q'", "x:y", "a #b", "...", ".a", "...a")
+    for index in range(rnd.randint(1, 3)):
+        key = rnd.choice(("k", "l", "m", "n", "1"))
+        if depth < 3 and rnd.random() < 0.4:
+            lines.append("{}{}:".format(" " * column, key))
+            if rnd.random() < 0.5:
+                lines.extend(_random_document(rnd, indent, depth + 1, column + indent + rnd.choice((0, 0, 0, 1))))
+            else:
+                for _ in range(rnd.randint(1, 3)):
+                    lines.append("{}{}{}".format(" " * column, "-".ljust(indent), rnd.choice(scalars)))
+        else:
+            lines.append("{}{}: {}".format(" " * column, key, rnd.choice(scalars)))
+    return lines
+
+
+@pytest.mark.parametrize("indent", (2, 4))
+def test_pretty_formatted_document_scanner_is_consistent_with_round_trip(indent):
+    rnd = random.Random(indent)
+    yaml = _yaml(indent=indent)
+    scanner = _PrettyFormattedDocumentScanner(yaml, indent=indent)
+    for _ in range(300):
+        document = "\n".join(_random_document(rnd, indent)) + "\n"
+        if scanner.is_pretty_formatted(document):
+            assert _process_single_document(document, yaml) == document, document
+
+
+def test_pretty_format_yaml_diff(capsys):
+    assert pretty_format_yaml(["--diff", "not-pretty-formatted.yaml"]) == 1
+    output = capsys.readouterr().out
+    assert "--- a/not-pretty-formatted.yaml\n+++ b/not-pretty-formatted.yaml\n@@ " in output
+
+    assert pretty_format_yaml(["--diff", "pretty-formatted.yaml"]) == 0
+    assert "@@" not in capsys.readouterr().out
+
+
+def test_pretty_format_yaml_time_budget(capsys):
+    assert pretty_format_yaml(["--time-budget", "60", "pretty-formatted.yaml"]) == 0
+    assert pretty_format_yaml(["--time-budget", "0", "pretty-formatted.yaml"]) == TIME_BUDGET_EXHAUSTED_EXIT_CODE
+    assert "the following files have not been checked: pretty-formatted.yaml" in capsys.readouterr().out
+
+
+def test_pretty_format_yaml_jobs(tmpdir, capsys):
+    filenames = [
+        "pretty-formatted.yaml",
+        "not-pretty-formatted.yaml",
+        "multi-doc-not-pretty-formatted.yaml",
+        "multi-doc-pretty-formatted.yaml",
+    ]
+    assert pretty_format_yaml(["--diff"] + filenames) == 1
+    serial_output = capsys.readouterr().out
+
+    assert pretty_format_yaml(["--jobs", "2", "--diff"] + filenames) == 1
+    assert capsys.readouterr().out == serial_output
+
+    invalid_file = tmpdir.join("invalid.yaml")
+    invalid_file.write("a: [\n")
+    invalid_file_message = "Input File {} is not a valid YAML file, consider using check-yaml\n".format(invalid_file.strpath)
+    # Not valid files are reported, and the following files are still checked
+    assert pretty_format_yaml(["--jobs", "2", "pretty-formatted.yaml", invalid_file.strpath, "not-pretty-formatted.yaml"]) == 1
+    assert capsys.readouterr().out == invalid_file_message + "File not-pretty-formatted.yaml is not pretty-formatted\n"
+
+    assert (
+        pretty_format_yaml(["--jobs", "2", "--fail-fast", "pretty-formatted.yaml", invalid_file.strpath, "not-pretty-formatted.yaml"]) == 1
+    )
+    assert capsys.readouterr().out == invalid_file_message + (
+        "Stopped after 1 failures (see --fail-fast and --max-failures), 1 files have not been checked\n"
+    )
+
+
+def test_document_chunks():
+    assert _document_chunks(["a"], 4) == [["a"]]
+    assert _document_chunks(["aa", "b", "c", "dd", "e"], 2) == [["aa", "b", "c"], ["dd", "e"]]
+    assert _document_chunks(["a", "b", "c"], 8) == [["a"], ["b"], ["c"]]
+
+
+@pytest.mark.parametrize(
+    "filename",
+    (
+        "multi-doc-pretty-formatted.yaml",
+        "multi-doc-not-pretty-formatted.yaml",
+        "multi-doc-with-empty-document-inside.yaml",
+        "empty-doc-with-separator.yaml",
+    ),
+)
+def test_pretty_format_yaml_document_jobs(tmpdir, filename):
+    # Repeat the documents, so that they are split into multiple chunks
+    with open(filename) as f:
+        content = f.read()
+    serial_file, parallel_file = tmpdir.join("serial.yaml"), tmpdir.join("parallel.yaml")
+    for target in (serial_file, parallel_file):
+        target.write(content + ("" if content.startswith("---") else "---\n") + content * 20)
+
+    with mock.patch("language_formatters_pre_commit_hooks.pretty_format_yaml.PARALLEL_DOCUMENTS_MIN_SIZE", 0):
+        serial_status = pretty_format_yaml(["--autofix", serial_file.strpath])
+        assert pretty_format_yaml(["--autofix", "--document-jobs", "2", parallel_file.strpath]) == serial_status
+    assert parallel_file.read_binary() == serial_file.read_binary()
+
+
+def test_pretty_format_yaml_document_jobs_with_invalid_document(tmpdir, capsys):
+    invalid_file = tmpdir.join("invalid.yaml")
+    invalid_file.write("a: 1\n---\nb: [\n---\nc: 1\n")
+    with mock.patch("language_formatters_pre_commit_hooks.pretty_format_yaml.PARALLEL_DOCUMENTS_MIN_SIZE", 0):
+        assert pretty_format_yaml(["--document-jobs", "2", invalid_file.strpath]) == 1
+    assert "Input File {} is not a valid YAML file".format(invalid_file.strpath) in capsys.readouterr().out
+
+
+def test_pretty_format_yaml_document_jobs_with_jobs(capsys):
+    with pytest.raises(SystemExit):
+        pretty_format_yaml(["--jobs", "2", "--document-jobs", "2", "pretty-formatted.yaml"])
+    assert "--document-jobs can not be combined with --jobs" in capsys.readouterr().err
+
+
+def test_pretty_format_yaml_from_index(tmpdir):
+    with open("pretty-formatted.yaml") as f:
+        pretty_content = f.read()
+    with git_repository_context(tmpdir.strpath):
+        with open("file.yaml", "w") as f:
+            f.write(pretty_content)
+        subprocess.check_call(("git", "add", "file.yaml"))  # nosec: disable=B603
+        with open("file.yaml", "w") as f:
+            f.write("a:   1\n")
+
+        assert pretty_format_yaml(["file.yaml"]) == 1
+        assert pretty_format_yaml(["--from-index", "file.yaml"]) == 0
+        with pytest.raises(SystemExit):
+            pretty_format_yaml(["--from-index", "--autofix", "file.yaml"])
@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import shutil
+import threading
+import typing
+from http.server import BaseHTTPRequestHandler
+from http.server import HTTPServer
+from urllib.parse import urljoin
+from urllib.request import pathname2url
+
+import mock
+import pytest
+
+from language_formatters_pre_commit_hooks.pretty_format_yaml import pretty_format_yaml
+from language_formatters_pre_commit_hooks.result_cache import cache_backend_from_url
+from language_formatters_pre_commit_hooks.result_cache import CacheBackend
+from language_formatters_pre_commit_hooks.result_cache import clean_files_cache
+from language_formatters_pre_commit_hooks.result_cache import CleanFilesCache
+from language_formatters_pre_commit_hooks.result_cache import DirectoryCacheBackend
+from language_formatters_pre_commit_hooks.result_cache import executable_identity
+from language_formatters_pre_commit_hooks.result_cache import FormatResult
+from language_formatters_pre_commit_hooks.result_cache import HttpCacheBackend
+from language_formatters_pre_commit_hooks.result_cache import ResultCache
+from language_formatters_pre_commit_hooks.run_history import load_runs
+
+
+class _HttpStore(HTTPServer):
+    def __init__(self) -> None:
+        super(_HttpStore, self).__init__(("127.0.0.1", 0), _HttpStoreHandler)
+        self.store: typing.Dict[str, bytes] = {}
+
+
+class _HttpStoreHandler(BaseHTTPRequestHandler):
+    server: _HttpStore
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path in self.server.store:
+            content = self.server.store[self.path]
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    def do_PUT(self):
+        self.server.store[self.path] = self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(201)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+@pytest.fixture
+def http_store():
+    server = _HttpStore()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+@pytest.fixture
+def http_store_url(http_store):
+    return "http://127.0.0.1:{port}/cache".format(port=http_store.server_address[1])
+
+
+@pytest.fixture
+def unreachable_url():
+    server = _HttpStore()
+    url = "http://127.0.0.1:{port}/cache".format(port=server.server_address[1])
+    server.server_close()
+    return url
+
+
+@pytest.mark.parametrize(
+    "url, expected_backend_class",
+    [
+        ["http://localhost/cache", HttpCacheBackend],
+        ["https://localhost/cache", HttpCacheBackend],
+        [urljoin("file://", pathname2url(os.path.abspath("cache"))), DirectoryCacheBackend],
+        ["/path/to/cache", DirectoryCacheBackend],
+    ],
+)
+def test_cache_backend_from_url(url, expected_backend_class):
+    assert isinstance(cache_backend_from_url(url), expected_backend_class)
+
+
+class _IncompleteCacheBackend(CacheBackend):
+    def get_many(self, keys):
+        return {}
+
+
+@pytest.mark.parametrize("backend_class", [CacheBackend, _IncompleteCacheBackend])
+def test_cache_backend_is_abstract(backend_class):
+    with pytest.raises(TypeError):
+        backend_class()
+
+
+def test_cache_backend_from_file_url(tmpdir):
+    backend = cache_backend_from_url(urljoin("file://", pathname2url(tmpdir.strpath)))
+    assert isinstance(backend, DirectoryCacheBackend)
+    assert backend.path == tmpdir.strpath
+
+
+def test_directory_cache_backend(tmpdir):
+    backend = DirectoryCacheBackend(tmpdir.join("cache").strpath)
+    assert backend.get_many(["aa1", "bb2"]) == {}
+
+    backend.put_many({"aa1": b"value1", "bb2": b"value2"})
+    assert backend.get_many(["aa1", "bb2", "cc3"]) == {"aa1": b"value1", "bb2": b"value2"}
+
+
+def test_directory_cache_backend_not_writable(tmpdir, capsys):
+    cache_path = tmpdir.join("cache")
+    cache_path.write("this is a file, not a directory")
+    backend = DirectoryCacheBackend(cache_path.strpath)
+
+    backend.put_many({"aa1": b"value1"})
+    assert backend.get_many(["aa1"]) == {}
+    assert "Unable to store result cache entry" in capsys.readouterr().err
+
+
+def test_http_cache_backend(http_store, http_store_url):
+    backend = HttpCacheBackend(http_store_url)
+    assert backend.get_many(["aa1", "bb2"]) == {}
+
+    backend.put_many({"aa1": b"value1", "bb2": b"value2"})
+    assert backend.get_many(["aa1", "bb2", "cc3"]) == {"aa1": b"value1", "bb2": b"value2"}
+    assert http_store.store["/cache/aa1"] == b"value1"
+
+
+def test_http_cache_backend_network_failure(unreachable_url, capsys):
+    backend = HttpCacheBackend(unreachable_url)
+    assert backend.get_many(["aa1", "bb2"]) == {}
+    assert not backend.available
+    assert capsys.readouterr().err.count("is not available") == 1
+
+    backend.put_many({"aa1": b"value1"})
+    assert backend.get_many(["aa1"]) == {}
+
+
+def test_http_cache_backend_server_error(http_store, http_store_url):
+    with mock.patch.object(_HttpStoreHandler, "do_GET", lambda self: self.send_error(500)):
+        backend = HttpCacheBackend(http_store_url)
+        assert backend.get_many(["aa1"]) == {}
+        assert not backend.available
+
+
+@pytest.mark.parametrize(
+    "result",
+    [FormatResult(valid=False), FormatResult(valid=True), FormatResult(valid=True, pretty_content="content")],
+)
+def test_format_result_serialization(result):
+    assert FormatResult.deserialize(result.serialize()) == result
+
+
+@pytest.mark.parametrize("value", [b"", b"not json", b"{}", b"[]"])
+def test_format_result_deserialize_invalid(value):
+    assert FormatResult.deserialize(value) is None
+
+
+def test_result_cache_key():
+    def key(content="content", **kwargs):
+        cache_arguments: typing.Dict[str, typing.Any] = dict(backend=None, hook_name="hook", tool_version="1.0", options={"indent": 2})
+        cache_arguments.update(kwargs)
+        return ResultCache(**cache_arguments).key(content)
+
+    assert key() == key()
+    assert len({key(), key(content="other"), key(hook_name="other"), key(tool_version="2.0"), key(options={"indent": 4})}) == 5
+
+
+def test_result_cache(tmpdir):
+    result_cache = ResultCache(DirectoryCacheBackend(tmpdir.strpath), hook_name="hook", tool_version="1.0")
+    contents = {"file1": "content", "file2": "content", "file3": "other content"}
+    assert result_cache.get_many(contents) == {}
+
+    result_cache.put_many(contents, {"file1": FormatResult(valid=True)})
+    assert result_cache.get_many(contents) == {"file1": FormatResult(valid=True), "file2": FormatResult(valid=True)}
+
+
+def test_clean_files_cache(tmpdir):
+    for filename, content in (("clean", "clean"), ("also-clean", "clean"), ("dirty", "dirty"), ("new", "new")):
+        tmpdir.join(filename).write(content)
+    filenames = [tmpdir.join(filename).strpath for filename in ("clean", "also-clean", "dirty", "new")]
+
+    cache = CleanFilesCache(tmpdir.join("cache").strpath, hook_name="hook", tool_version="1.0")
+    assert cache.drop_clean_files(filenames[:3]) == filenames[:3]
+    cache.store_clean_files(filenames[:1])
+
+    # Files with the same content as a clean file are clean too
+    cache = CleanFilesCache(tmpdir.join("cache").strpath, hook_name="hook", tool_version="1.0")
+    assert cache.drop_clean_files(filenames) == filenames[2:]
+    # Not existing files are always passed to the tool
+    assert cache.drop_clean_files([tmpdir.join("not-existing").strpath]) == [tmpdir.join("not-existing").strpath]
+
+    # Entries depend on the tool identity and on the content read (ie. the staged content)
+    assert (
+        CleanFilesCache(tmpdir.join("cache").strpath, hook_name="hook", tool_version="2.0").drop_clean_files(filenames[:1]) == filenames[:1]
+    )
+    assert cache.drop_clean_files(filenames[:1], paths={filenames[0]: filenames[2]}) == filenames[:1]
+
+
+def test_clean_files_cache_tracks_config_files(tmpdir):
+    source = tmpdir.mkdir("project").mkdir("src").join("main.rs")
+    source.write("fn main() {}\n")
+
+    def drop_clean_files():
+        cache = CleanFilesCache(tmpdir.join("cache").strpath, hook_name="hook", tool_version="1.0", config_file_names=("rustfmt.toml",))
+        not_clean_files = cache.drop_clean_files([source.strpath])
+        cache.store_clean_files([source.strpath])
+        return not_clean_files
+
+    assert drop_clean_files() == [source.strpath]
+    assert drop_clean_files() == []
+    # Configuration files in the parent directories invalidate the entries
+    tmpdir.join("project", "rustfmt.toml").write("max_width = 80\n")
+    assert drop_clean_files() == [source.strpath]
+    assert drop_clean_files() == []
+    tmpdir.join("project", "rustfmt.toml").write("max_width = 100\n")
+    assert drop_clean_files() == [source.strpath]
+
+
+def test_clean_files_cache_requires_url_and_tool_version(tmpdir):
+    assert clean_files_cache(None, "hook", "1.0") is None
+    assert clean_files_cache(tmpdir.strpath, "hook", None) is None
+    assert isinstance(clean_files_cache(tmpdir.strpath, "hook", "1.0"), CleanFilesCache)
+
+
+def test_executable_identity(tmpdir):
+    assert executable_identity("not-existing-executable") is None
+
+    executable = tmpdir.join("tool")
+    executable.write("#!/bin/sh\n")
+    executable.chmod(0o755)
+    identity = executable_identity(executable.strpath)
+    assert identity is not None and identity == executable_identity(executable.strpath)
+    executable.write("#!/bin/sh\necho upgraded\n")
+    assert executable_identity(executable.strpath) != identity
+
+
+@pytest.fixture
+def yaml_files(tmpdir):
+    filenames = []
+    for filename in ("pretty-formatted.yaml", "not-pretty-formatted.yaml"):
+        shutil.copyfile(os.path.join("test-data", "pretty_format_yaml", filename), tmpdir.join(filename).strpath)
+        filenames.append(tmpdir.join(filename).strpath)
+    return filenames
+
+
+@pytest.mark.parametrize("cache_type", ["directory", "http"])
+def test_pretty_format_yaml_with_result_cache(tmpdir, yaml_files, cache_type, request):
+    cache_url = tmpdir.join("cache").strpath if cache_type == "directory" else request.getfixturevalue("http_store_url")
+
+    with mock.patch.dict(os.environ, {"PRE_COMMIT_HOME": tmpdir.strpath}):
+        assert pretty_format_yaml(["--result-cache", cache_url, "--record-run-history"] + yaml_files) == 1
+
+        # Results are reused, even from other machines, without formatting the files
+        with mock.patch("language_formatters_pre_commit_hooks.pretty_format_yaml._process_single_document", autospec=True) as mock_process:
+            assert pretty_format_yaml(["--result-cache", cache_url, "--record-run-history"] + yaml_files) == 1
+            assert pretty_format_yaml(["--result-cache", cache_url, "--autofix"] + yaml_files) == 1
+        assert not mock_process.called
+
+        # Cached results depend on the hook options
+        assert pretty_format_yaml(["--result-cache", cache_url, "--indent", "4", "--record-run-history"] + yaml_files[:1]) == 1
+
+        # Fixed files are processed again
+        assert pretty_format_yaml(["--result-cache", cache_url] + yaml_files) == 0
+
+        assert [run.cache_hit_rate for run in load_runs()] == [0, 1, 0]
+
+
+def test_pretty_format_yaml_with_unreachable_result_cache(yaml_files, unreachable_url):
+    assert pretty_format_yaml(["--result-cache", unreachable_url] + yaml_files) == 1
+
+
+def test_result_cache_via_environment_variable(tmpdir, yaml_files):
+    with mock.patch.dict(os.environ, {"LANGUAGE_FORMATTERS_RESULT_CACHE": tmpdir.join("cache").strpath}):
+        assert pretty_format_yaml(yaml_files) == 1
+    assert tmpdir.join("cache").check(dir=True)
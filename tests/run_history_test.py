@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+
+import mock
+import pytest
+
+from language_formatters_pre_commit_hooks.pretty_format_toml import pretty_format_toml
+from language_formatters_pre_commit_hooks.run_history import FileTiming
+from language_formatters_pre_commit_hooks.run_history import load_file_timings
+from language_formatters_pre_commit_hooks.run_history import load_runs
+from language_formatters_pre_commit_hooks.run_history import RunRecorder
+from language_formatters_pre_commit_hooks.utils import ToolSlots
+
+
+@pytest.fixture(autouse=True)
+def pre_commit_home(tmpdir):
+    with mock.patch.dict(os.environ, {"PRE_COMMIT_HOME": tmpdir.strpath}):
+        yield tmpdir
+
+
+def test_run_recorder_disabled_does_not_record():
+    run_recorder = RunRecorder("hook", tool_version="1.0")
+    with run_recorder.phase("phase"):
+        pass
+    assert run_recorder.save(1) == 1
+    assert load_runs() == []
+
+
+def test_run_recorder_records_run(tmpdir):
+    input_file = tmpdir.join("input.txt")
+    input_file.write("12345")
+
+    run_recorder = RunRecorder("hook", tool_version="1.0", enabled=True)
+    run_recorder.add_files([input_file.strpath, tmpdir.join("not-existing").strpath])
+    with run_recorder.phase("read"):
+        pass
+    with run_recorder.phase("read"):
+        pass
+    run_recorder.record_cache_lookup(hit=True)
+    run_recorder.record_cache_lookup(hit=False)
+    assert run_recorder.save(0) == 0
+
+    runs = load_runs()
+    assert len(runs) == 1
+    run = runs[0]
+    assert run.hook_name == "hook"
+    assert run.tool_version == "1.0"
+    assert run.file_count == 2
+    assert run.total_bytes == 5
+    assert run.wall_time >= run.phase_durations["read"] >= 0
+    assert run.cache_hit_rate == 0.5
+    assert run.exit_status == 0
+
+
+def test_run_recorder_records_tool_slots_wait(tmpdir, capsys):
+    run_recorder = RunRecorder("hook")
+    tool_slots = ToolSlots(limit=3, directory=tmpdir.strpath)
+    run_recorder.record_tool_slots_wait(tool_slots)
+    assert "tool-slots-wait" not in run_recorder.phase_durations
+    assert capsys.readouterr().err == ""
+
+    tool_slots.waited_seconds = 2.5
+    run_recorder.record_tool_slots_wait(tool_slots)
+    assert run_recorder.phase_durations["tool-slots-wait"] == 2.5
+    assert "Waited 2.5s for other heavyweight tools to complete (at most 3 run at the same time" in capsys.readouterr().err
+
+
+def test_run_recorder_cache_hit_rate_without_lookups():
+    assert RunRecorder("hook").cache_hit_rate is None
+
+
+def test_load_runs_filters_by_hook_name():
+    RunRecorder("hook-1", enabled=True).save(0)
+    RunRecorder("hook-2", enabled=True).save(1)
+    RunRecorder("hook-1", enabled=True).save(1)
+
+    assert [run.exit_status for run in load_runs(hook_name="hook-1")] == [0, 1]
+    assert len(load_runs()) == 3
+
+
+def test_run_recorder_records_file_timings():
+    run_recorder = RunRecorder("hook")
+    run_recorder.record_file_timing("file.yaml", 10, 1.0)
+    run_recorder.save(0)
+    assert load_file_timings("hook") == {}
+
+    for duration in (1.0, 2.0):
+        run_recorder = RunRecorder("hook", enabled=True)
+        run_recorder.record_file_timing("file.yaml", 10, duration)
+        run_recorder.save(0)
+    # Only the latest timing of each file is kept
+    assert load_file_timings("hook") == {os.path.abspath("file.yaml"): FileTiming(size=10, duration=2.0)}
+    assert load_file_timings("other-hook") == {}
+
+
+def test_hook_records_run_history():
+    toml_file = os.path.join("test-data", "pretty_format_toml", "pretty-formatted.toml")
+    assert pretty_format_toml([toml_file]) == 0
+    assert load_runs() == []
+
+    assert pretty_format_toml(["--record-run-history", toml_file]) == 0
+    (run,) = load_runs()
+    assert run.hook_name == "pretty-format-toml"
+    assert run.file_count == 1
+    assert run.total_bytes == os.path.getsize(toml_file)
+    assert set(run.phase_durations) == {"read", "format"}
+    assert set(load_file_timings("pretty-format-toml")) == {os.path.abspath(toml_file)}
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import os
+
+import mock
+import pytest
+
+from language_formatters_pre_commit_hooks.run_history import RunRecorder
+from language_formatters_pre_commit_hooks.scheduler import CostModel
+from language_formatters_pre_commit_hooks.scheduler import DEFAULT_SECONDS_PER_BYTE
+from language_formatters_pre_commit_hooks.scheduler import FILE_OVERHEAD_SECONDS
+from language_formatters_pre_commit_hooks.scheduler import invocation_chunks
+from language_formatters_pre_commit_hooks.scheduler import longest_first
+from language_formatters_pre_commit_hooks.scheduler import partition
+
+
+@pytest.fixture(autouse=True)
+def pre_commit_home(tmpdir):
+    with mock.patch.dict(os.environ, {"PRE_COMMIT_HOME": tmpdir.join("pre-commit-home").strpath}):
+        yield
+
+
+def test_longest_first():
+    assert longest_first({"a": 1.0, "b": 3.0, "c": 2.0, "d": 3.0}) == ["b", "d", "c", "a"]
+
+
+def test_partition_balances_costs():
+    costs = {"a": 5.0, "b": 5.0, "c": 4.0, "d": 3.0, "e": 3.0, "f": 2.0, "g": 2.0, "h": 1.0}
+    partitions = partition(costs, 3)
+    assert sorted(sum(partitions, [])) == sorted(costs)
+    assert sorted(sum(costs[filename] for filename in files) for files in partitions) == [8, 8, 9]
+    # Each partition is processed longest-expected-first
+    assert all(files == longest_first({filename: costs[filename] for filename in files}) for files in partitions)
+
+
+def test_partition_does_not_return_empty_partitions():
+    assert partition({"a": 1.0, "b": 1.0}, 4) == [["a"], ["b"]]
+    assert partition({}, 2) == []
+
+
+def test_cost_model_without_history(tmpdir):
+    input_file = tmpdir.join("input.yaml")
+    input_file.write("a" * 1000)
+
+    cost_model = CostModel("hook")
+    assert cost_model.estimate(input_file.strpath) == pytest.approx(FILE_OVERHEAD_SECONDS + 1000 * DEFAULT_SECONDS_PER_BYTE)
+    assert cost_model.estimate(input_file.strpath, size=10) == pytest.approx(FILE_OVERHEAD_SECONDS + 10 * DEFAULT_SECONDS_PER_BYTE)
+    assert cost_model.estimate(tmpdir.join("not-existing").strpath) == pytest.approx(FILE_OVERHEAD_SECONDS)
+
+
+def test_cost_model_uses_recorded_timings(tmpdir):
+    run_recorder = RunRecorder("hook", enabled=True)
+    run_recorder.record_file_timing(tmpdir.join("slow").strpath, 100, 2.0)
+    run_recorder.record_file_timing(tmpdir.join("fast-1").strpath, 100, 0.1)
+    run_recorder.record_file_timing(tmpdir.join("fast-2").strpath, 100, 0.1)
+    run_recorder.save(0)
+    other_run_recorder = RunRecorder("other-hook", enabled=True)
+    other_run_recorder.record_file_timing(tmpdir.join("slow").strpath, 100, 100.0)
+    other_run_recorder.save(0)
+
+    cost_model = CostModel("hook")
+    # Recorded files are scaled according to their size
+    assert cost_model.estimate(tmpdir.join("slow").strpath, size=200) == pytest.approx(4.0)
+    # Not recorded files are estimated via the median throughput of the hook
+    assert cost_model.estimate(tmpdir.join("new").strpath, size=1000) == pytest.approx(FILE_OVERHEAD_SECONDS + 1.0)
+
+
+def _invocation_arguments(jobs=1, max_files=None, max_bytes=None):
+    return argparse.Namespace(jobs=jobs, max_files_per_invocation=max_files, max_bytes_per_invocation=max_bytes)
+
+
+def test_invocation_chunks_without_files():
+    assert invocation_chunks(_invocation_arguments(jobs=4), ["cmd"], [], CostModel("hook")) == [[]]
+
+
+def test_invocation_chunks_without_jobs():
+    assert invocation_chunks(_invocation_arguments(), ["cmd"], ["a", "b", "c"], CostModel("hook")) == [["a", "b", "c"]]
+
+
+def test_invocation_chunks_with_jobs():
+    cost_model = mock.Mock(spec=CostModel)
+    cost_model.estimate.side_effect = {"a": 1.0, "b": 4.0, "c": 2.0, "d": 2.0}.get
+    assert invocation_chunks(_invocation_arguments(jobs=2), ["cmd"], ["a", "b", "c", "d"], cost_model) == [["b", "a"], ["c", "d"]]
+
+
+def test_invocation_chunks_bounded_by_files_and_bytes(tmpdir):
+    filenames = []
+    for name, size in (("a", 10), ("b", 10), ("c", 30), ("d", 1)):
+        tmpdir.join(name).write("x" * size)
+        filenames.append(tmpdir.join(name).strpath)
+    a, b, c, d = filenames
+
+    assert invocation_chunks(_invocation_arguments(max_files=3), ["cmd"], filenames, CostModel("hook")) == [[a, b, c], [d]]
+    # Files larger than the limit are passed alone
+    assert invocation_chunks(_invocation_arguments(max_bytes=20), ["cmd"], filenames, CostModel("hook")) == [[a, b], [c], [d]]
+
+
+def test_invocation_chunks_split_by_command_line():
+    with mock.patch(
+        "language_formatters_pre_commit_hooks.scheduler.command_line_chunks",
+        autospec=True,
+        return_value=iter([["path-a"], ["path-b"]]),
+    ) as mock_command_line_chunks:
+        assert invocation_chunks(
+            _invocation_arguments(),
+            ["cmd"],
+            ["a", "b"],
+            CostModel("hook"),
+            paths={"a": "path-a", "b": "path-b"},
+        ) == [["a"], ["b"]]
+    mock_command_line_chunks.assert_called_once_with(["cmd"], ["path-a", "path-b"])
+
+    assert invocation_chunks(_invocation_arguments(), ["cmd"], ["a", "b"], CostModel("hook"), split_command_line=False) == [["a", "b"]]
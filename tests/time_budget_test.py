@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from language_formatters_pre_commit_hooks.time_budget import TIME_BUDGET_EXHAUSTED_EXIT_CODE
+from language_formatters_pre_commit_hooks.time_budget import TimeBudget
+
+
+def test_unlimited_time_budget():
+    time_budget = TimeBudget(None)
+    assert not time_budget.is_exhausted()
+    assert list(time_budget.batches(["a", "b", "c"], batch_size=1)) == [["a", "b", "c"]]
+    assert time_budget.exit_status(0) == 0
+
+
+def test_time_budget_batches():
+    time_budget = TimeBudget(60)
+    assert list(time_budget.batches(["a", "b", "c"], batch_size=2)) == [["a", "b"], ["c"]]
+    assert time_budget.exit_status(1) == 1
+
+
+def test_exhausted_time_budget(capsys):
+    time_budget = TimeBudget(0)
+    assert time_budget.is_exhausted()
+    assert list(time_budget.batches(["a", "b", "c"], batch_size=2)) == []
+    assert time_budget.exit_status(0) == TIME_BUDGET_EXHAUSTED_EXIT_CODE
+    assert "the following files have not been checked: a, b, c" in capsys.readouterr().out
+
+
+def test_exhausted_time_budget_preserves_failures():
+    time_budget = TimeBudget(0)
+    time_budget.skip(["a"])
+    assert time_budget.exit_status(1) == 1
@@ -3,17 +3,33 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import hashlib
 import os
 import sys
-from os.path import basename
-from urllib.parse import urljoin
-from urllib.request import pathname2url
+import threading
+import time
+import typing
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
 
 import mock
 import pytest
+import requests
 
+from language_formatters_pre_commit_hooks.utils import COMMAND_CANCELLED_EXIT_CODE
+from language_formatters_pre_commit_hooks.utils import COMMAND_TIMEOUT_EXIT_CODE
+from language_formatters_pre_commit_hooks.utils import DOWNLOAD_CONCURRENCY
+from language_formatters_pre_commit_hooks.utils import DOWNLOAD_MIRROR_ENVIRONMENT_VARIABLE
+from language_formatters_pre_commit_hooks.utils import _download_parts
+from language_formatters_pre_commit_hooks.utils import command_line_chunks
 from language_formatters_pre_commit_hooks.utils import download_url
+from language_formatters_pre_commit_hooks.utils import fits_command_line
+from language_formatters_pre_commit_hooks.utils import isolate_failures
+from language_formatters_pre_commit_hooks.utils import merge_results
 from language_formatters_pre_commit_hooks.utils import run_command
+from language_formatters_pre_commit_hooks.utils import run_command_in_chunks
+from language_formatters_pre_commit_hooks.utils import run_commands
+from language_formatters_pre_commit_hooks.utils import ToolSlots
 
 
 @pytest.mark.parametrize(
@@ -28,24 +44,338 @@ def test_run_command(command, expected_status, expected_output):
     assert run_command(*command) == (expected_status, expected_output)
 
 
-@pytest.mark.parametrize(
-    "url, does_file_already_exist",
-    [
-        [urljoin("file://", pathname2url(__file__)), True],
-        [urljoin("file://", pathname2url(__file__)), False],
-    ],
-)
-@mock.patch("language_formatters_pre_commit_hooks.utils.shutil", autospec=True)
-@mock.patch("language_formatters_pre_commit_hooks.utils.requests", autospec=True)
-def test_download_url(mock_requests, mock_shutil, tmpdir, url, does_file_already_exist):
-    if does_file_already_exist:
-        with open(os.path.join(tmpdir.strpath, basename(url)), "w") as f:
-            f.write(str(""))
+@pytest.mark.skipif(sys.platform == "win32", reason="Windows limits the command line length in characters")
+def test_command_line_chunks():
+    # Each argument costs its length, plus NUL terminator and argv pointer (ie. 12 for "cmd" and 10 for "a")
+    assert list(command_line_chunks(["cmd"], ["a", "b", "c"], max_length=12 + 2 * 10)) == [["a", "b"], ["c"]]
+    assert list(command_line_chunks(["cmd"], ["a", "b", "c"], max_length=12 + 3 * 10)) == [["a", "b", "c"]]
+    # Too long arguments are passed alone
+    assert list(command_line_chunks(["cmd"], ["a" * 100, "b"], max_length=30)) == [["a" * 100], ["b"]]
+    assert list(command_line_chunks(["cmd"], [], max_length=30)) == [[]]
+
+
+def test_fits_command_line():
+    assert fits_command_line(["echo"], ["a", "b"])
+    assert not fits_command_line(["echo"], ["a" * 1000] * 10000)
+
+
+def test_run_command_in_chunks():
+    with mock.patch("language_formatters_pre_commit_hooks.utils.command_line_chunks", return_value=iter([["1"], ["2"]])):
+        assert run_command_in_chunks(["echo"], ["1", "2"]) == (0, "1{0}2{0}".format(os.linesep))
+
+    with mock.patch(
+        "language_formatters_pre_commit_hooks.utils.command_line_chunks",
+        return_value=iter([["a"], ["b"], ["c"]]),
+    ), mock.patch(
+        "language_formatters_pre_commit_hooks.utils.run_commands",
+        autospec=True,
+        return_value=[(0, "a\n"), (2, "b\n"), (1, "c\n")],
+    ) as mock_run_commands:
+        assert run_command_in_chunks(["cmd"], ["a", "b", "c"]) == (2, "a\nb\nc\n")
+    mock_run_commands.assert_called_once_with([["cmd", "a"], ["cmd", "b"], ["cmd", "c"]], tool_slots=None)
+
+
+def test_merge_results():
+    assert merge_results([]) == (0, "")
+    assert merge_results([(0, "a"), (3, "b"), (1, "c")]) == (3, "abc")
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="The test relies on POSIX commands")
+def test_run_commands():
+    assert run_commands([]) == []
+    assert run_commands([["echo", "1"], ["false"], ["sh", "-c", "echo 3 >&2"]], concurrency=2) == [(0, "1\n"), (1, ""), (0, "3\n")]
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="The test relies on POSIX commands")
+def test_run_commands_concurrently():
+    start = time.monotonic()
+    assert run_commands([["sleep", "1"]] * 4, concurrency=4) == [(0, "")] * 4
+    assert time.monotonic() - start < 3
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="The test relies on POSIX commands")
+def test_run_commands_with_timeout():
+    start = time.monotonic()
+    assert run_commands([["sleep", "10"], ["echo", "1"]], concurrency=2, timeout=0.5) == [
+        (COMMAND_TIMEOUT_EXIT_CODE, "Command timed out after 0.5 seconds: sleep 10\n"),
+        (0, "1\n"),
+    ]
+    assert time.monotonic() - start < 5
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="The test relies on POSIX commands")
+def test_run_commands_stops():
+    stopped = []
+
+    def _stop(index: int, result: typing.Tuple[int, str]) -> bool:
+        stopped.append(index)
+        return result[0] != 0
+
+    start = time.monotonic()
+    # The running command is killed and the pending one is cancelled
+    assert run_commands([["sleep", "10"], ["false"], ["sleep", "10"]], concurrency=2, stop=_stop) == [
+        (COMMAND_CANCELLED_EXIT_CODE, ""),
+        (1, ""),
+        (COMMAND_CANCELLED_EXIT_CODE, ""),
+    ]
+    assert stopped == [1]
+    assert time.monotonic() - start < 5
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="The stub tool is a shell script")
+def test_isolate_failures():
+    # Stub tool failing the whole invocation, without telling which file is not valid, if any file is named bad*
+    script = 'for f in "$@"; do case "$f" in bad*) echo "error: not valid file"; exit 1;; esac; done; echo "checked $*"'
+    commands = []
+
+    def _command(files: typing.List[str]) -> typing.List[str]:
+        commands.append(files)
+        return ["sh", "-c", script, "sh", *files]
+
+    def _is_attributable(files: typing.List[str], result: typing.Tuple[int, str]) -> bool:
+        return not result[1].startswith("error")
+
+    invocations = [(files, run_commands([_command(files)])[0]) for files in (["a", "bad1", "b", "c"], ["d"], ["e", "bad2"])]
+    del commands[:]
+    assert isolate_failures(invocations, _command, _is_attributable, concurrency=2) == [
+        (["a"], (0, "checked a\n")),
+        (["bad1"], (1, "error: not valid file\n")),
+        (["b", "c"], (0, "checked b c\n")),
+        (["d"], (0, "checked d\n")),
+        (["e"], (0, "checked e\n")),
+        (["bad2"], (1, "error: not valid file\n")),
+    ]
+    # The halves of all the failed invocations are run at the same time, until the not valid files are isolated
+    assert commands == [["a", "bad1"], ["b", "c"], ["e"], ["bad2"], ["a"], ["bad1"]]
+
+
+def test_isolate_failures_without_files():
+    command = mock.Mock(side_effect=AssertionError("invocations without files can not be bisected"))
+    invocations = [([], (1, "error: x")), (["a"], (1, "error: y"))]
+    assert isolate_failures(invocations, command, lambda files, result: False) == invocations
+    assert isolate_failures([(["a"], (1, "error: y")), ([], (1, "error: x"))], command, lambda files, result: False) == invocations
+
+
+def test_tool_slots(tmpdir):
+    tool_slots = ToolSlots(limit=2, directory=tmpdir.strpath)
+    slots = [tool_slots.try_acquire(), tool_slots.try_acquire()]
+    assert None not in slots
+    # The tokens are shared with the other processes via the lock files
+    assert ToolSlots(limit=2, directory=tmpdir.strpath).try_acquire() is None
+
+    ToolSlots.release(typing.cast(typing.IO[bytes], slots[0]))
+    slot = ToolSlots(limit=2, directory=tmpdir.strpath).try_acquire()
+    assert slot is not None
+    for slot in (slot, slots[1]):
+        ToolSlots.release(typing.cast(typing.IO[bytes], slot))
+    assert tool_slots.waited_seconds == 0
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="The test relies on POSIX commands")
+def test_run_commands_with_tool_slots(tmpdir):
+    tool_slots = ToolSlots(limit=1, directory=tmpdir.strpath)
+    start = time.monotonic()
+    assert run_commands([["sleep", "0.5"]] * 2, concurrency=2, tool_slots=tool_slots) == [(0, "")] * 2
+    # The commands run one after the other, and the wait is accounted
+    assert time.monotonic() - start >= 1
+    assert tool_slots.waited_seconds > 0
+    assert tool_slots.try_acquire() is not None
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="The test relies on POSIX commands")
+def test_run_commands_with_tool_slots_accounts_concurrent_waits_once(tmpdir):
+    held_slot = ToolSlots(limit=1, directory=tmpdir.strpath).try_acquire()
+    assert held_slot is not None
+    releaser = threading.Timer(0.5, ToolSlots.release, args=(held_slot,))
+    releaser.start()
+
+    tool_slots = ToolSlots(limit=1, directory=tmpdir.strpath)
+    start = time.monotonic()
+    assert run_commands([["true"]] * 4, concurrency=4, tool_slots=tool_slots) == [(0, "")] * 4
+    releaser.join()
+    # All the commands wait for the same slot at the same time: the wall-clock time of the wait is accounted, not the sum
+    assert 0.5 <= tool_slots.waited_seconds <= time.monotonic() - start
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="The test relies on POSIX commands")
+def test_run_commands_with_unlimited_tool_slots(tmpdir):
+    tool_slots = ToolSlots(directory=tmpdir.join("tool-slots").strpath)
+    start = time.monotonic()
+    assert run_commands([["sleep", "0.5"]] * 2, concurrency=2, tool_slots=tool_slots) == [(0, "")] * 2
+    assert time.monotonic() - start < 1
+    assert tool_slots.waited_seconds == 0
+    assert not tmpdir.join("tool-slots").exists()
+
+
+class _ArtifactServer(ThreadingHTTPServer):
+    def __init__(self) -> None:
+        super(_ArtifactServer, self).__init__(("127.0.0.1", 0), _ArtifactHandler)
+        self.artifacts: typing.Dict[str, bytes] = {}
+        self.supports_ranges = True
+        self.requested_ranges: typing.List[str] = []
 
+    @property
+    def url(self) -> str:
+        return "http://127.0.0.1:{port}".format(port=self.server_address[1])
+
+
+class _ArtifactHandler(BaseHTTPRequestHandler):
+    server: _ArtifactServer
+
+    def log_message(self, *args):
+        pass
+
+    def _send_headers(self):
+        content = self.server.artifacts.get(self.path)
+        if content is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return None
+
+        etag = '"{}"'.format(hashlib.sha256(content).hexdigest())
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if range_header and self.server.supports_ranges and if_range in (None, etag):
+            self.server.requested_ranges.append(range_header)
+            start, end = (int(value) for value in range_header[len("bytes=") :].split("-"))
+            content = content[start : end + 1]
+            self.send_response(206)
+        else:
+            self.send_response(200)
+        if self.server.supports_ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        return content
+
+    def do_HEAD(self):
+        self._send_headers()
+
+    def do_GET(self):
+        content = self._send_headers()
+        if content is not None:
+            self.wfile.write(content)
+
+
+@pytest.fixture
+def artifact_server():
+    server = _ArtifactServer()
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.01})
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+@pytest.fixture
+def pre_commit_home(tmpdir):
     with mock.patch.dict(os.environ, {"PRE_COMMIT_HOME": tmpdir.strpath}):
-        assert download_url(url) == os.path.join(tmpdir.strpath, basename(url))
+        yield tmpdir
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_download_url_already_downloaded(artifact_server, pre_commit_home):
+    pre_commit_home.join("tool.jar").write("")
+    assert download_url("{}/tool.jar".format(artifact_server.url)) == pre_commit_home.join("tool.jar").strpath
+
+
+@pytest.mark.parametrize("supports_ranges", [True, False])
+def test_download_url(artifact_server, pre_commit_home, supports_ranges):
+    artifact_server.supports_ranges = supports_ranges
+    artifact_server.artifacts["/releases/tool.jar"] = os.urandom(10000)
+
+    with mock.patch("language_formatters_pre_commit_hooks.utils.RANGED_DOWNLOAD_MIN_SIZE", 1000):
+        path = download_url("{}/releases/tool.jar".format(artifact_server.url), "tool-1.0.jar")
+
+    assert path == pre_commit_home.join("tool-1.0.jar").strpath
+    assert _read(path) == artifact_server.artifacts["/releases/tool.jar"]
+    assert os.listdir(pre_commit_home.strpath) == ["tool-1.0.jar"]
+    assert len(artifact_server.requested_ranges) == (DOWNLOAD_CONCURRENCY if supports_ranges else 0)
+
+
+def test_download_url_resumes_partial_download(artifact_server, pre_commit_home):
+    content = os.urandom(1000)
+    artifact_server.artifacts["/tool.jar"] = content
+    pre_commit_home.join("tool.jar.0-999.part").write_binary(content[:600])
+    pre_commit_home.join("tool.jar.validator").write('"{}"'.format(hashlib.sha256(content).hexdigest()))
+
+    assert _read(download_url("{}/tool.jar".format(artifact_server.url))) == content
+    assert artifact_server.requested_ranges == ["bytes=600-999"]
+    assert os.listdir(pre_commit_home.strpath) == ["tool.jar"]
+
+
+@pytest.mark.parametrize("validator", [None, '"previous-version"'])
+def test_download_url_discards_parts_of_other_versions(artifact_server, pre_commit_home, validator):
+    content = os.urandom(1000)
+    artifact_server.artifacts["/tool.jar"] = content
+    pre_commit_home.join("tool.jar.0-999.part").write_binary(os.urandom(600))
+    if validator is not None:
+        pre_commit_home.join("tool.jar.validator").write(validator)
+
+    assert _read(download_url("{}/tool.jar".format(artifact_server.url))) == content
+    assert artifact_server.requested_ranges == ["bytes=0-999"]
+    assert os.listdir(pre_commit_home.strpath) == ["tool.jar"]
+
+
+def test_download_url_artifact_changed_while_resuming(artifact_server, pre_commit_home):
+    content = os.urandom(1000)
+    artifact_server.artifacts["/tool.jar"] = content
+    pre_commit_home.join("tool.jar.0-999.part").write_binary(content[:600])
+    pre_commit_home.join("tool.jar.validator").write('"{}"'.format(hashlib.sha256(content).hexdigest()))
+
+    def _change_artifact(response):
+        # The artifact changes between the HEAD request and the resumed range request
+        artifact_server.artifacts["/tool.jar"] = os.urandom(1000)
+        return response.headers["ETag"]
+
+    with mock.patch("language_formatters_pre_commit_hooks.utils._download_validator", autospec=True, side_effect=_change_artifact):
+        with pytest.raises(RuntimeError, match="changed while it was downloaded"):
+            download_url("{}/tool.jar".format(artifact_server.url))
+
+    # The not valid part is removed, so the next attempt downloads the new version from scratch
+    assert not pre_commit_home.join("tool.jar.0-999.part").exists()
+    assert _read(download_url("{}/tool.jar".format(artifact_server.url))) == artifact_server.artifacts["/tool.jar"]
+    assert os.listdir(pre_commit_home.strpath) == ["tool.jar"]
+
+
+def test_download_url_concurrent_downloads(artifact_server, pre_commit_home):
+    artifact_server.artifacts["/tool.jar"] = os.urandom(1000)
+    url = "{}/tool.jar".format(artifact_server.url)
+
+    with mock.patch(
+        "language_formatters_pre_commit_hooks.utils._download_parts", autospec=True, wraps=_download_parts
+    ) as mock_download_parts:
+        threads = [threading.Thread(target=download_url, args=(url,)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    # The downloads are serialized by the lock, so the artifact is downloaded only once
+    assert mock_download_parts.call_count == 1
+    assert _read(pre_commit_home.join("tool.jar").strpath) == artifact_server.artifacts["/tool.jar"]
+    assert os.listdir(pre_commit_home.strpath) == ["tool.jar"]
+
+
+def test_download_url_from_mirror(artifact_server, pre_commit_home):
+    artifact_server.artifacts["/mirror/google/tool/releases/tool.jar"] = b"content"
+
+    with mock.patch.dict(os.environ, {DOWNLOAD_MIRROR_ENVIRONMENT_VARIABLE: "{}/mirror/".format(artifact_server.url)}):
+        path = download_url("https://github.com/google/tool/releases/tool.jar")
+
+    assert _read(path) == b"content"
+    assert os.listdir(pre_commit_home.strpath) == ["tool.jar"]
+
 
-    if does_file_already_exist:
-        assert not mock_requests.get.called
-    else:
-        mock_requests.get.assert_called_once_with(url, stream=True)
+def test_download_url_not_found(artifact_server, pre_commit_home):
+    with pytest.raises(requests.HTTPError):
+        download_url("{}/tool.jar".format(artifact_server.url))